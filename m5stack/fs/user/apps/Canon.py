@@ -12,10 +12,12 @@ _IRQ_GATTC_SERVICE_RESULT = const(9)
 _IRQ_GATTC_SERVICE_DONE = const(10)
 _IRQ_GATTC_CHARACTERISTIC_RESULT = const(11)
 _IRQ_GATTC_CHARACTERISTIC_DONE = const(12)
+_IRQ_CONNECTION_UPDATE = const(27)
 _IRQ_ENCRYPTION_UPDATE = const(28)
 
 # canon_remote_ble.py
 import time, json, os
+from m5ble.connparams import ConnParams, LOW_LATENCY
 
 # --- Canon BR-E1 UUIDs ---
 SERVICE_UUID   = bt.UUID("00050000-0000-1000-0000-d8492fffa821")
@@ -101,6 +103,7 @@ class CanonRemoteBLE:
         self.scan_ms = scan_ms
         self.ble=ble
         self._peer_cache = None
+        self.conn_params = ConnParams()
 
 
         # включим бондинг/Just Works (если сборка поддерживает)
@@ -166,30 +169,14 @@ class CanonRemoteBLE:
             self._init_props = 0
             self._ctrl_props = 0
             self._discovery_done = False
+            self._on_connect()
 
-            if self._mode == "pair":
-                # только в режиме pair просим шифрование
-                try:
-                    self.ble.gap_pair(self.conn)
-                    if self.verbose: print("Pairing requested...")
-                except AttributeError:
-                    if self.verbose: print("gap_pair() not available")
-                # discovery стартуем после шифрования (см. _IRQ_ENCRYPTION_UPDATE)
-            else:
-                # в show() pairing не делаем — короткая пауза + MTU → discovery
-                if not self._conn_ok():
-                    return
-                usleep_ms(200)
-                try:
-                    self.ble.gattc_exchange_mtu(self.conn)
-                    usleep_ms(100)
-                except:
-                    pass
-                if self._conn_ok():
-                    self.ble.gattc_discover_services(self.conn)
+        elif event == _IRQ_CONNECTION_UPDATE:
+            self._on_conn_update(data)
 
         elif event == _IRQ_PERIPHERAL_DISCONNECT:
             self.conn, addr_type, addr = data
+            self.conn_params.remove(self.conn)
             if self.verbose: print("Disconnected")
             if self._mode=='show':
                 self.app.set_sh(0)
@@ -263,6 +250,33 @@ class CanonRemoteBLE:
                     try: self.ble.gap_disconnect(self.conn)
                     except: pass
 
+    def _on_connect(self):
+        if self._mode == "pair":
+            # только в режиме pair просим шифрование
+            try:
+                self.ble.gap_pair(self.conn)
+                if self.verbose: print("Pairing requested...")
+            except AttributeError:
+                if self.verbose: print("gap_pair() not available")
+            # discovery стартуем после шифрования (см. _IRQ_ENCRYPTION_UPDATE)
+        else:
+            # в show() pairing не делаем — короткая пауза + MTU → discovery
+            if not self._conn_ok():
+                return
+            usleep_ms(200)
+            try:
+                self.ble.gattc_exchange_mtu(self.conn)
+                usleep_ms(100)
+            except:
+                pass
+            if self._conn_ok():
+                self.ble.gattc_discover_services(self.conn)
+
+    def _on_conn_update(self, data):
+        # интервал/латентность, которые центральное устройство реально выдало
+        self.conn_params.update(data)
+        if self.verbose: print("Conn params:", self.conn_params.get(data[0]))
+
     # ---------- helpers ----------
     def _conn_ok(self):
         return isinstance(self.conn, int) and self.connected
@@ -393,7 +407,8 @@ class CanonRemoteBLE:
             return
 
         if self.verbose: print("Connecting to", _mac_str(addr), "type", at)
-        self.ble.gap_connect(at, addr)
+        # сеанс живёт один кадр — сразу просим короткий интервал
+        LOW_LATENCY.connect(self.ble, at, addr)
         if not self._wait(lambda: self.connected, timeout_ms):
             if self.verbose: print("show(): connect timeout")
             return False
@@ -8,38 +8,148 @@ import struct
 import bluetooth
 from bluetooth import UUID
 from M5 import *  # Power, Lcd, Widgets
-import json, binascii
+from hardware import Timer
+from m5ble.connparams import LOW_LATENCY
+import json, binascii, os
 
 # === Keycodes (use PageUp/PageDown by default) ===
 KC_PGUP = const(0x4B)   # use 0x50 for ←
 KC_PGDN = const(0x4E)   # use 0x4F for →
 
+# -------- Macros ----------
+_MOD = {"CTRL": 0x01, "SHIFT": 0x02, "ALT": 0x04, "GUI": 0x08}
+_KEYS = {
+    "ENTER": 0x28, "ESC": 0x29, "BKSP": 0x2A, "TAB": 0x2B, "SPACE": 0x2C,
+    "RIGHT": 0x4F, "LEFT": 0x50, "DOWN": 0x51, "UP": 0x52,
+    "PGUP": KC_PGUP, "PGDN": KC_PGDN, "HOME": 0x4A, "END": 0x4D, "DEL": 0x4C,
+    "F1": 0x3A, "F2": 0x3B, "F3": 0x3C, "F4": 0x3D, "F5": 0x3E, "F6": 0x3F,
+    "F7": 0x40, "F8": 0x41, "F9": 0x42, "F10": 0x43, "F11": 0x44, "F12": 0x45,
+}
+# US-раскладка: символ -> код; во второй строке те же коды с Shift
+_PUNCT = "\n\t -=[]\\;'`,./"
+_PUNCT_SH = "\n\t _+{}|:\"~<>?"
+_PUNCT_KC = b"\x28\x2b\x2c\x2d\x2e\x2f\x30\x31\x33\x34\x35\x36\x37\x38"
+
+
+def _char_key(c):
+    o = ord(c)
+    if 0x61 <= o <= 0x7A:
+        return 0, 0x04 + o - 0x61
+    if 0x41 <= o <= 0x5A:
+        return 0x02, 0x04 + o - 0x41
+    if 0x31 <= o <= 0x39:
+        return 0, 0x1E + o - 0x31
+    if c == "0":
+        return 0, 0x27
+    i = "!@#$%^&*()".find(c)
+    if i >= 0:
+        return 0x02, 0x1E + i
+    i = _PUNCT.find(c)
+    if i >= 0:
+        return 0, _PUNCT_KC[i]
+    i = _PUNCT_SH.find(c)
+    if i >= 0:
+        return 0x02, _PUNCT_KC[i]
+    raise ValueError("no key for %r" % c)
+
+
+class Macro:
+    """
+    Последовательность нажатий, заранее собранная в HID-отчёты.
+      "Hello"             — текст (US-раскладка)
+      "{PGDN}", "{F5}"    — именованная клавиша
+      "{CTRL+ALT+DEL}"    — аккорд с модификаторами
+      "{RIGHT*3}"         — повтор
+      "{{"                — литерал '{'
+    Каждое нажатие — два 8-байтных отчёта (down/up) в одном bytearray,
+    memoryview на них готовы сразу, так что отправка ничего не выделяет.
+    """
+
+    def __init__(self, spec, repeat=1):
+        strokes = self._parse(spec)
+        self.keys = len(strokes)
+        self.repeat = repeat
+        self.buf = bytearray(16 * len(strokes))
+        mv = memoryview(self.buf)
+        for i, (mod, kc) in enumerate(strokes):
+            self.buf[16 * i] = mod
+            self.buf[16 * i + 2] = kc
+        self.reports = [mv[8 * i : 8 * i + 8] for i in range(2 * len(strokes))]
+
+    @staticmethod
+    def _parse(spec):
+        out = []
+        i = 0
+        n = len(spec)
+        while i < n:
+            c = spec[i]
+            if c == "{" and spec[i + 1 : i + 2] != "{":
+                j = spec.index("}", i)
+                tok = spec[i + 1 : j].upper()
+                count = 1
+                if "*" in tok:
+                    tok, count = tok.split("*")
+                    count = int(count)
+                mod = 0
+                parts = tok.split("+")
+                for m in parts[:-1]:
+                    mod |= _MOD[m]
+                name = parts[-1]
+                if name in _KEYS:
+                    kc = _KEYS[name]
+                elif name in _MOD:
+                    mod |= _MOD[name]; kc = 0
+                elif len(name) == 1:
+                    m2, kc = _char_key(name.lower())
+                    mod |= m2
+                else:
+                    raise ValueError("unknown key " + name)
+                out.extend([(mod, kc)] * count)
+                i = j + 1
+                continue
+            if c == "{":
+                i += 1
+            out.append(_char_key(c))
+            i += 1
+        return out
+
+
 # -------- Keystore (bonding) ----------
 class KeyStore(object):
+    # (type, key) -> value плюс индекс по типу: IRQ _GET_SECRET с key=None
+    # спрашивает «index-й секрет типа t», это O(1) вместо обхода всего словаря
     def __init__(self):
         self.secrets = {}
+        self._by_type = {}
 
     def add_secret(self, t, key, value):
-        self.secrets[(t, bytes(key))] = bytes(value)
+        k = (t, bytes(key))
+        if k not in self.secrets:
+            self._by_type.setdefault(t, []).append(k[1])
+        self.secrets[k] = bytes(value)
 
     def get_secret(self, t, index, key):
-        k = (t, bytes(key) if key else None)
         if key is None:
-            i = 0
-            for (tt, _k), _val in self.secrets.items():
-                if tt == t:
-                    if i == index:
-                        return _val
-                    i += 1
-            return None
-        return self.secrets.get(k, None)
+            keys = self._by_type.get(t)
+            if keys is None or index >= len(keys):
+                return None
+            return self.secrets[(t, keys[index])]
+        return self.secrets.get((t, bytes(key)), None)
 
     def remove_secret(self, t, key):
-        del self.secrets[(t, bytes(key))]
+        key = bytes(key)
+        del self.secrets[(t, key)]
+        keys = self._by_type[t]
+        keys.remove(key)
+        if not keys:
+            del self._by_type[t]
 
     def has_secret(self, t, key):
         return (t, bytes(key)) in self.secrets
 
+    def has_bond(self):
+        return bool(self.secrets)
+
     def get_json_secrets(self):
         return [
             (sec_type, binascii.b2a_base64(key, newline=False), binascii.b2a_base64(value, newline=False))
@@ -48,7 +158,7 @@ class KeyStore(object):
 
     def add_json_secrets(self, entries):
         for sec_type, key, value in entries:
-            self.secrets[sec_type, binascii.a2b_base64(key)] = binascii.a2b_base64(value)
+            self.add_secret(sec_type, binascii.a2b_base64(key), binascii.a2b_base64(value))
 
     def load_secrets(self):
         return
@@ -56,21 +166,51 @@ class KeyStore(object):
     def save_secrets(self):
         return
 
+    def schedule_save(self):
+        return
+
+    def flush(self, force=False):
+        return
+
 
 class JSONKeyStore(KeyStore):
+    PATH = "apps/clicker_keys.json"
+    # при сопряжении ключи приходят пачкой — пишем один раз после паузы
+    SAVE_DELAY_MS = 500
+
+    def __init__(self):
+        super().__init__()
+        self._dirty = False
+        self._changed_ms = 0
+
     def load_secrets(self):
         try:
-            with open("apps/clicker_keys.json", "r") as file:
+            with open(self.PATH, "r") as file:
                 self.add_json_secrets(json.load(file))
         except:
             pass
 
     def save_secrets(self):
+        # временный файл + rename: сброс питания посреди записи не портит связки
+        # флаг снимается до снимка: ключ, пришедший во время записи, снова
+        # поднимет его и будет записан следующим flush()
+        self._dirty = False
+        tmp = self.PATH + ".tmp"
         try:
-            with open("apps/clicker_keys.json", "w") as file:
+            with open(tmp, "w") as file:
                 json.dump(self.get_json_secrets(), file)
+            os.rename(tmp, self.PATH)
         except:
-            pass
+            self._dirty = True
+
+    def schedule_save(self):
+        # безопасно из IRQ: только флаг, без файловых операций
+        self._dirty = True
+        self._changed_ms = time.ticks_ms()
+
+    def flush(self, force=False):
+        if self._dirty and (force or time.ticks_diff(time.ticks_ms(), self._changed_ms) >= self.SAVE_DELAY_MS):
+            self.save_secrets()
 
 
 F_READ = bluetooth.FLAG_READ
@@ -102,6 +242,12 @@ _IRQ_PASSKEY_ACTION = const(31)
 
 _IO_CAPABILITY_NO_INPUT_OUTPUT = const(3)
 
+# HOGP: после обрыва/старта при наличии связки — быстрая реклама 30 с,
+# чтобы хост переподключился сразу, дальше обычный интервал
+_ADV_FAST_US = const(20000)
+_ADV_SLOW_US = const(100000)
+_ADV_FAST_MS = const(30000)
+
 _PASSKEY_ACTION_INPUT = const(2)
 _PASSKEY_ACTION_DISP = const(3)
 _PASSKEY_ACTION_NUMCMP = const(4)
@@ -114,10 +260,14 @@ _GATTS_ERROR_INSUFFICIENT_AUTHORIZATION = const(0x08)
 _GATTS_ERROR_INSUFFICIENT_ENCRYPTION = const(0x0f)
 
 class Advertiser:
-    def __init__(self, ble, services=(UUID(0x1812),), appearance=const(960), name="Generic HID Device"):
+    def __init__(self, ble, services=(UUID(0x1812),), appearance=const(960), name="Generic HID Device", profile=None):
         self._ble = ble
         self._payload = self._build_payload(name=name, services=services, appearance=appearance)
+        if profile is not None:
+            # подсказка хосту о желаемом интервале; не влезла — без неё
+            self._payload = profile.advertise_payload(self._payload)
         self.advertising = False
+        self.interval_us = 0
 
     def _build_payload(self, limited_disc=False, br_edr=False, name=None, services=None, appearance=0):
         payload = bytearray()
@@ -142,10 +292,11 @@ class Advertiser:
             _append(_ADV_TYPE_APPEARANCE, struct.pack("<h", appearance))
         return bytes(payload)
 
-    def start_advertising(self):
-        if not self.advertising:
-            self._ble.gap_advertise(100000, adv_data=self._payload)
+    def start_advertising(self, interval_us=_ADV_SLOW_US):
+        if not self.advertising or interval_us != self.interval_us:
+            self._ble.gap_advertise(interval_us, adv_data=self._payload)
             self.advertising = True
+            self.interval_us = interval_us
 
     def stop_advertising(self):
         if self.advertising:
@@ -230,6 +381,9 @@ class HumanInterfaceDevice(object):
     def ble_irq(self, event, data):
         if event == _IRQ_CENTRAL_CONNECT:
             self.conn_handle, _, _ = data
+            if self.adv:
+                # стек сам останавливает рекламу при подключении
+                self.adv.advertising = False
             self.set_state(HumanInterfaceDevice.DEVICE_CONNECTED)
         elif event == _IRQ_CENTRAL_DISCONNECT:
             self.conn_handle = None
@@ -277,12 +431,12 @@ class HumanInterfaceDevice(object):
             if value is None:
                 if self.secrets.has_secret(sec_type, key):
                     self.secrets.remove_secret(sec_type, key)
-                    self.secrets.save_secrets()
+                    self.secrets.schedule_save()
                     return True
                 return False
             else:
                 self.secrets.add_secret(sec_type, key, value)
-                self.secrets.save_secrets()
+                self.secrets.schedule_save()
                 return True
         elif event == _IRQ_GET_SECRET:
             sec_type, index, key = data
@@ -351,11 +505,14 @@ class HumanInterfaceDevice(object):
     def set_state_change_callback(self, cb):
         self.state_change_callback = cb
 
-    def start_advertising(self):
+    def start_advertising(self, interval_us=_ADV_SLOW_US):
         if (self.device_state is not HumanInterfaceDevice.DEVICE_STOPPED and
-            self.device_state is not HumanInterfaceDevice.DEVICE_ADVERTISING and
             self.adv):
-            self.adv.start_advertising()
+            if self.device_state is HumanInterfaceDevice.DEVICE_ADVERTISING:
+                # смена интервала без смены состояния
+                self.adv.start_advertising(interval_us)
+                return
+            self.adv.start_advertising(interval_us)
             self.set_state(HumanInterfaceDevice.DEVICE_ADVERTISING)
 
     def stop_advertising(self):
@@ -422,18 +579,36 @@ class Keyboard(HumanInterfaceDevice):
         self.h_rep = None
         self.h_repout = None
 
+        # очередь макросов: [macro, номер отчёта, осталось повторов]
+        self._jobs = []
+        self.pending = 0          # отчётов в очереди
+        self.max_pending = 0
+        self.kps = 0              # нажатий/с последней пачки
+        self._burst_keys = 0
+        self._burst_ms = 0
+        # отчёт на каждое событие соединения; 15 мс до первого CONNECTION_UPDATE
+        self.conn_interval_ms = 15
+        self._timer = None
+
     def ble_irq(self, event, data):
         if event == _IRQ_GATTS_WRITE:
             conn_handle, attr_handle = data
             if attr_handle == self.h_repout:
                 return _GATTS_NO_ERROR
+        elif event == _IRQ_CONNECTION_UPDATE:
+            conn_handle, interval, _latency, _timeout, status = data
+            if status == 0 and conn_handle == self.conn_handle:
+                # единицы по 1.25 мс
+                self.conn_interval_ms = max(8, (interval * 5 + 3) // 4)
+        elif event == _IRQ_CENTRAL_DISCONNECT:
+            self.cancel()
         return super(Keyboard, self).ble_irq(event, data)
 
     def start(self):
         super(Keyboard, self).start()
         handles = self._ble.gatts_register_services([self.DIS, self.BAS, self.DID, self.HIDS])
         self.save_service_characteristics(handles)
-        self.adv = Advertiser(self._ble, (UUID(0x1812), UUID(0x180F)), self.device_appearance, self.device_name)
+        self.adv = Advertiser(self._ble, (UUID(0x1812), UUID(0x180F)), self.device_appearance, self.device_name, LOW_LATENCY)
 
     def save_service_characteristics(self, handles):
         super(Keyboard, self).save_service_characteristics(handles)
@@ -465,6 +640,64 @@ class Keyboard(HumanInterfaceDevice):
     def set_kb_callback(self, kb_callback):
         pass
 
+    # --- очередь отчётов ---
+    MAX_JOBS = 8
+
+    def send(self, macro, repeat=None):
+        """Поставить макрос в очередь; False, если не подключены или очередь полна."""
+        if not self.is_connected() or len(self._jobs) >= self.MAX_JOBS:
+            return False
+        n = macro.repeat if repeat is None else repeat
+        if n <= 0 or not macro.reports:
+            return True
+        self._jobs.append([macro, 0, n])
+        self.pending += len(macro.reports) * n
+        if self.pending > self.max_pending:
+            self.max_pending = self.pending
+        if self._timer is None:
+            self._burst_keys = 0
+            self._burst_ms = time.ticks_ms()
+            self._timer = Timer(2)
+            self._timer.init(mode=Timer.PERIODIC, period=self.conn_interval_ms, callback=self._pump)
+        return True
+
+    def cancel(self):
+        self._jobs = []
+        self.pending = 0
+        self._stop_timer()
+
+    def _stop_timer(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def _pump(self, _t=None):
+        jobs = self._jobs
+        if not jobs or not self.is_connected():
+            self.cancel()
+            return
+        job = jobs[0]
+        macro = job[0]
+        i = job[1]
+        try:
+            self._ble.gatts_notify(self.conn_handle, self.h_rep, macro.reports[i])
+        except OSError:
+            return  # буфер стека занят — повторим на следующем тике
+        self.pending -= 1
+        i += 1
+        if i == len(macro.reports):
+            i = 0
+            self._burst_keys += macro.keys
+            job[2] -= 1
+            if job[2] == 0:
+                jobs.pop(0)
+        job[1] = i
+        if not jobs:
+            ms = time.ticks_diff(time.ticks_ms(), self._burst_ms)
+            if ms > 0:
+                self.kps = self._burst_keys * 1000 // ms
+            self._stop_timer()
+
 
 # ======= Device (M5StickC Plus2) with BAS notifications + STATUS callbacks =======
 class Device:
@@ -480,16 +713,28 @@ class Device:
         self._batt_period_ms = 30000                # раз в 30 сек; подгони как нужно
         self._next_batt_ms = time.ticks_ms()        # первый опрос сразу
 
+        self._fast_adv_until = None
+
         # Стартуем рекламу и показываем "waiting"
+        self._advertise()
+        if self.on_status:
+            self.on_status('waiting')
+
+    def _advertise(self):
+        # есть связка — быстро зовём знакомый хост, иначе обычная реклама
         try:
-            self.keyboard.start_advertising()
+            if self.keyboard.secrets.has_bond():
+                self._fast_adv_until = time.ticks_add(time.ticks_ms(), _ADV_FAST_MS)
+                self.keyboard.start_advertising(_ADV_FAST_US)
+            else:
+                self._fast_adv_until = None
+                self.keyboard.start_advertising()
         except:
             pass
-        if self.on_status:
-            self.on_status('waiting')
 
     def keyboard_state_callback(self):
         if self.keyboard.is_connected():
+            self._fast_adv_until = None
             # сразу отправим текущий уровень
             self._push_battery(True)
             # и через 2 сек запланируем регулярный опрос
@@ -498,10 +743,8 @@ class Device:
                 self.on_status('connected')
         else:
             # ушли в idle/disconnected → снова рекламируемся
-            try:
-                self.keyboard.start_advertising()
-            except:
-                pass
+            if self.keyboard.device_state is not HumanInterfaceDevice.DEVICE_ADVERTISING:
+                self._advertise()
             if self.on_status:
                 self.on_status('waiting')
 
@@ -529,23 +772,27 @@ class Device:
 
     def tick(self):
         # вызывать из главного цикла (app.loop_callback)
+        self.keyboard.secrets.flush()
+        now = time.ticks_ms()
         if not self.keyboard.is_connected():
+            if self._fast_adv_until is not None and time.ticks_diff(now, self._fast_adv_until) >= 0:
+                self._fast_adv_until = None
+                try:
+                    self.keyboard.start_advertising(_ADV_SLOW_US)
+                except:
+                    pass
             return
-        now = time.ticks_ms()
         if time.ticks_diff(now, self._next_batt_ms) >= 0:
             self._push_battery(False)
             self._next_batt_ms = time.ticks_add(now, self._batt_period_ms)
 
-    def _tap(self, keycode, hold_ms=35):
-        if self.keyboard.is_connected():
-            self.keyboard.set_keys(keycode)
-            self.keyboard.set_modifiers()
-            self.keyboard.notify_hid_report()
-            time.sleep_ms(hold_ms)
-            self.keyboard.set_keys()
-            self.keyboard.set_modifiers()
-            self.keyboard.notify_hid_report()
-            time.sleep_ms(hold_ms)
+    def send(self, macro, repeat=None):
+        # не блокирует: отчёты уходят по таймеру с шагом интервала соединения
+        return self.keyboard.send(macro, repeat)
+
+    def stats(self):
+        kb = self.keyboard
+        return kb.kps, kb.pending, kb.max_pending
 
 
 # ======= Simple App wrapper with on-screen status =======
@@ -577,10 +824,18 @@ class App:
         Lcd.fillCircle(int(Lcd.width()/2), 180, 30, 0x00ff00 if state=='connected' else 0xff0000)
 
     def up(self):
-        self.dev._tap(KC_PGUP)
+        self.dev.send(self._m_up)
 
     def down(self):
-        self.dev._tap(KC_PGDN)
+        self.dev.send(self._m_down)
+
+    def _draw_stats(self):
+        st = self.dev.stats()
+        if st == self._stats:
+            return
+        self._stats = st
+        self._clear_line(125)
+        self._draw_centered("%d k/s  q %d/%d" % st, 125)
 
     def start(self, app):
         self.app = app
@@ -591,6 +846,9 @@ class App:
 
         bt_name = self.app.config['name']
         self.dev = Device(name=bt_name, on_status=self.set_status)
+        self._m_up = Macro("{PGUP}")
+        self._m_down = Macro("{PGDN}")
+        self._stats = None
 
         self.app.callback_table['ok'] = self.down
         self.app.callback_table_long['ok'] = self.up
@@ -611,9 +869,15 @@ class App:
     def loop(self):
         try:
             self.dev.tick()
+            self._draw_stats()
         except:
             pass
 
     def stop(self):
         self.app.loop_callback = None
+        try:
+            self.dev.keyboard.cancel()
+            self.dev.keyboard.secrets.flush(True)
+        except:
+            pass
         self.app.stop_app()
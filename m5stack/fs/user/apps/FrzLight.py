@@ -1,17 +1,18 @@
-import network, socket, time
-import struct, json
+import time
+import json
 import machine
 import os
+import asyncio
 from M5 import *
+from portal import CaptivePortal
 from apps.canon import CanonRemoteBLE
 import gc
+from array import array
 from driver.neopixel import NeoPixel
+from driver.neopixel.parallel import NeoPixelParallel
 
 
 
-def _ip2bytes(ip: str) -> bytes:
-    return struct.pack("!BBBB", *[int(x) for x in ip.split(".")])
-
 # ===== helpers =====
 
 def _ensure_dir(path: str):
@@ -26,225 +27,135 @@ def _ensure_dir(path: str):
     except:
         pass
 
-# --------------------------- DNS ---------------------------
-
-class _DNSServer:
-    def __init__(self, ip="192.168.4.1", port=53):
-        self.ip_bytes = _ip2bytes(ip)
-        self.port = port
-        self.sock = None
+# до 4 лент параллельно, по одному каналу RMT на ленту
+MAX_STRIPS = 4
+# светодиоды линейны по яркости, картинка — в sRGB
+LED_GAMMA = 2.2
 
-    def start(self):
-        if self.sock:
-            return
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.bind(("0.0.0.0", self.port))
-        s.setblocking(False)
-        self.sock = s
-
-    def stop(self):
-        try:
-            if self.sock:
-                self.sock.close()
-        finally:
-            self.sock = None
-
-    def _build_resp(self, req):
-        try:
-            txid = req[0:2]
-            # найти конец QNAME
-            i = 12
-            while i < len(req) and req[i] != 0:
-                i += 1 + req[i]
-            q_end = i + 5  # 0x00 + QTYPE(2) + QCLASS(2)
-
-            # header: response, no error; QDCOUNT=1, ANCOUNT=1
-            header = txid + b"\x81\x80" + b"\x00\x01" + b"\x00\x01" + b"\x00\x00" + b"\x00\x00"
-            question = req[12:q_end]  # важно: без +1
-
-            # answer: pointer to name @0x0c, TYPE=A, CLASS=IN, TTL=60, RDLENGTH=4
-            answer = b"\xc0\x0c" + b"\x00\x01" + b"\x00\x01" + b"\x00\x00\x00\x3c" + b"\x00\x04" + self.ip_bytes
-            return header + question + answer
-        except:
-            return None
+def _load_settings(default=None):
+    try:
+        with open("apps/led_settings.json", "r") as f:
+            return json.loads(f.read() or "{}")
+    except:
+        return default if default is not None else {}
+
+# --------------------------- Portal routes ---------------------------
+
+class _LedRoutes:
+    """Маршруты FrzLight поверх общего portal.CaptivePortal: /img и /settings."""
+    # один блок LittleFS: тело пишется на flash кусками этого размера
+    BUF_SIZE = 4096
+
+    def __init__(self, portal):
+        # общий буфер приёма: JSON и блоки картинки; выделяется один раз
+        self._buf = bytearray(self.BUF_SIZE)
+        self._mv = memoryview(self._buf)
+        self._lock = asyncio.Lock()
+        portal.route(b"/img", self.post_img, (b"POST",))
+        portal.route(b"/settings", self.settings, (b"GET", b"HEAD", b"POST"))
+
+    async def post_img(self, req, resp):
+        """/img — потоково сохранить P16 в apps/led.ppm.
+
+        Тело принимается в один преаллоцированный буфер (readinto), на flash
+        пишутся целые блоки BUF_SIZE. Заголовок P16 проверяется по первому
+        блоку, до записи: если размер не сходится с Content-Length — 400.
+        Пишем во временный файл, старая картинка заменяется только при успехе.
+        """
+        if b"content-length" not in req.headers:
+            await resp.text(b"411 Length Required", b"Length Required"); return
+        total = req.content_length
+
+        async with self._lock:
+            mv = self._mv
+            size = self.BUF_SIZE
+            t0 = time.ticks_ms()
+
+            # --- первый блок: дочитываем хотя бы до конца заголовка P16 ---
+            fill = 0
+            probe = 32 if total > 32 else total
+            while fill < probe:
+                n = await req.readinto(mv[fill:size])
+                if not n:
+                    break
+                fill += n
+            nl = bytes(mv[:probe]).find(b"\n")
+            if nl < 0:
+                await resp.text(b"400 Bad Request", b"Bad P16 header"); return
+            try:
+                w, h = P16Reader.parse_header(bytes(mv[:nl + 1]))
+            except ValueError:
+                await resp.text(b"400 Bad Request", b"Bad P16 header"); return
+            if total != nl + 1 + 2 * w * h:
+                await resp.text(b"400 Bad Request", b"P16 size mismatch"); return
+
+            out_path = "apps/led.ppm"
+            tmp_path = "apps/led.tmp"
+            written = 0
+            try:
+                with open(tmp_path, "wb") as f:
+                    while True:
+                        # пишем только полными блоками (кроме последнего)
+                        if fill == size or written + fill == total:
+                            f.write(mv[:fill])
+                            written += fill
+                            fill = 0
+                            if written == total:
+                                break
+                        n = await req.readinto(mv[fill:size])
+                        if not n:
+                            break
+                        fill += n
+            except OSError:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                await resp.text(b"400 Bad Request", b"Write error"); return
 
-    def poll(self):
-        if not self.sock:
-            return
-        try:
-            data, addr = self.sock.recvfrom(512)
-        except:
-            return
-        resp = self._build_resp(data)
-        if resp:
+            if written != total:
+                try:
+                    os.remove(tmp_path)
+                except:
+                    pass
+                await resp.text(b"400 Bad Request", b"Incomplete body")
+                return
             try:
-                self.sock.sendto(resp, addr)
+                os.remove(out_path)
             except:
                 pass
+            os.rename(tmp_path, out_path)
 
-# --------------------------- HTTP ---------------------------
-
-class _HTTPServer:
-    CAPTIVE_PATHS = (
-        b"/generate_204", b"/gen_204",
-        b"/hotspot-detect.html", b"/ncsi.txt", b"/connecttest.txt"
-    )
-
-    def __init__(self, ip="192.168.4.1", port=80, html_path="apps/settings.html", fallback_html=None):
-        self.ip = ip
-        self.port = port
-        self.html_path = html_path
-        self.fallback_html = fallback_html or (
-            "<!doctype html><meta charset='utf-8'>"
-            "<title>Captive Portal</title>"
-            "<style>body{font-family:system-ui;background:#000;color:#fff;padding:24px}</style>"
-            "<h2>Captive Portal</h2>"
-            "<p>File not found: {path}</p>"
-            "<p>Create <code>{path}</code> on the device.</p>"
-        )
-        self.sock = None
-
-    # --- file helpers ---
-
-    def _read_file(self):
-        try:
-            with open(self.html_path, "rb") as f:
-                return f.read()
-        except:
-            html = self.fallback_html.replace("{path}", self.html_path)
-            return html.encode()
-
-    # --- send helpers ---
-
-    def _send_raw(self, conn, status=b"200 OK", body=b"", mime=b"text/html; charset=utf-8"):
-        try:
-            hdr = (
-                b"HTTP/1.1 " + status + b"\r\n"
-                b"Content-Type: " + mime + b"\r\n"
-                b"Cache-Control: no-store\r\n"
-                b"Connection: close\r\n"
-                b"Content-Length: " + str(len(body)).encode() + b"\r\n"
-                b"\r\n"
-            )
-            conn.sendall(hdr)
-            if body and not status.startswith(b"204"):
-                conn.sendall(body)
-        except:
-            pass
-
-    def _send_200(self, conn, body: bytes, mime=b"text/html; charset=utf-8"):
-        self._send_raw(conn, b"200 OK", body, mime)
-
-    def _send_json(self, conn, obj: dict):
-        try:
-            body = json.dumps(obj).encode()
-        except:
-            body = b"{}"
-        self._send_200(conn, body, mime=b"application/json")
-
-    def _send_400(self, conn, msg=b"Bad Request"):
-        self._send_raw(conn, b"400 Bad Request", msg, b"text/plain; charset=utf-8")
-
-    def _send_404(self, conn):
-        self._send_raw(conn, b"404 Not Found", b"Not Found", b"text/plain; charset=utf-8")
-
-    def _send_411(self, conn):
-        self._send_raw(conn, b"411 Length Required", b"Length Required", b"text/plain; charset=utf-8")
-
-    # --- request parsing ---
+        dt = time.ticks_diff(time.ticks_ms(), t0) or 1
+        kbps = written * 1000 // dt // 1024
+        print("led.ppm: %dx%d, %d bytes in %d ms (%d KiB/s)" % (w, h, written, dt, kbps))
+        await resp.json({"ok": True, "bytes": written, "ms": dt, "kbps": kbps})
 
-    def _read_headers(self, conn):
-        """Читает заголовки до CRLFCRLF; возвращает (method, path, qs, headers:dict, rest_body:bytes)"""
-        try:
-            conn.settimeout(5)
-        except:
-            pass
-        buf = b""
-        head_limit = 8192
-        while b"\r\n\r\n" not in buf and len(buf) < head_limit:
-            chunk = conn.recv(1024)
-            if not chunk:
-                break
-            buf += chunk
-        head, sep, rest = buf.partition(b"\r\n\r\n")
-        if not sep:
-            return None, None, None, {}, b""
-        lines = head.split(b"\r\n")
-        req_line = lines[0] if lines else b"GET / HTTP/1.1"
-        parts = req_line.split()
-        method = parts[0] if len(parts) >= 1 else b"GET"
-        raw_path = parts[1] if len(parts) >= 2 else b"/"
-        path, _, qs = raw_path.partition(b"?")
-        headers = {}
-        for ln in lines[1:]:
-            if b":" in ln:
-                k, v = ln.split(b":", 1)
-                headers[k.strip().lower()] = v.strip()
-        return method, path, qs, headers, rest
-
-    # --- handlers ---
-
-    def _handle_post_img(self, conn, headers, rest):
-        """/img — сохранить поток PPM в app/led.ppm (потоково, без буферизации всего файла)."""
-        cl = headers.get(b"content-length", None)
-        if not cl:
-            self._send_411(conn); return
-        try:
-            total = int(cl)
-        except:
-            self._send_400(conn, b"Invalid Content-Length"); return
-
-        out_path = "apps/led.ppm"
-        written = 0
-        print('start write led')
-        try:
-            os.remove(out_path)
-        except:pass
-        if 1:
-            with open(out_path, "wb") as f:
-                if rest:
-                    f.write(rest)
-                    written += len(rest)
-                # дочитываем тело по кускам
-                print(written,total)
-                while written < total:
-                    chunk = conn.recv(min(1024, total - written))
-                    
-                    if not chunk:
-                        break
-                    f.write(chunk)
-                    written += len(chunk)
-            if written != total:
-                self._send_400(conn, b"Incomplete body")
-                return
-        #except:
-        #    self._send_400(conn, b"Write error")
-        #    return
-
-        self._send_json(conn, {"ok": True, "bytes": written})
+    async def settings(self, req, resp):
+        if req.method == b"POST":
+            await self._post_settings(req, resp)
+        else:
+            await self._get_settings(req, resp)
 
-    def _handle_post_settings(self, conn, headers, rest):
+    async def _post_settings(self, req, resp):
         """/settings — принять JSON и сохранить в apps/led_settings.json"""
-        cl = headers.get(b"content-length", b"0")
-        try:
-            total = int(cl)
-        except:
-            total = 0
-        body = rest or b""
-        while len(body) < total:
-            chunk = conn.recv(min(512, total - len(body)))
-            if not chunk:
-                break
-            body += chunk
-        try:
-            data = json.loads(body or b"{}")
-        except:
-            self._send_400(conn, b"Invalid JSON"); return
+        async with self._lock:
+            try:
+                n = await req.read_body(self._mv)
+            except ValueError:
+                await resp.text(b"400 Bad Request", b"Body too large"); return
+            try:
+                data = json.loads(bytes(self._mv[:n]) or b"{}")
+            except:
+                await resp.text(b"400 Bad Request", b"Invalid JSON"); return
 
+        # пины лент: форма их не присылает — сохраняем те, что уже в файле
+        pins = data.get("pins", _load_settings().get("pins", [26]))
         cfg = {
             "pxCount": max(1, int(data.get("pxCount", 64))),
             "canonMode": bool(data.get("canonMode", False)),
             "startPause": max(0, int(data.get("startPause", 0))),
+            "pins": [int(p) for p in pins][:MAX_STRIPS] or [26],
         }
         try:
             out_path = "apps/led_settings.json"
@@ -252,162 +163,13 @@ class _HTTPServer:
             with open(out_path, "w") as f:
                 f.write(json.dumps(cfg))
         except:
-            self._send_400(conn, b"Settings write error"); return
+            await resp.text(b"400 Bad Request", b"Settings write error"); return
 
-        self._send_json(conn, {"ok": True})
+        await resp.json({"ok": True})
 
-    def _handle_get_settings(self, conn):
+    async def _get_settings(self, req, resp):
         """Необязательно: GET /settings — вернуть текущие настройки (удобно для отладки)."""
-        try:
-            with open("apps/led_settings.json", "r") as f:
-                cfg = json.loads(f.read() or "{}")
-        except:
-            cfg = {"pxCount": 64, "canonMode": False, "startPause": 0}
-        self._send_json(conn, cfg)
-
-    # --- connection ---
-
-    def _handle_conn(self, conn):
-        try:
-            method, path, qs, headers, rest = self._read_headers(conn)
-            if method is None:
-                self._send_400(conn, b"Bad request")
-                return
-
-            # captive paths
-            if path in self.CAPTIVE_PATHS:
-                if method == b"HEAD":
-                    self._send_raw(conn, b"200 OK", b"")
-                else:
-                    self._send_200(conn, self._read_file())
-                return
-
-            if path == b"/img" and method == b"POST":
-                self._handle_post_img(conn, headers, rest)
-                return
-
-            if path == b"/settings":
-                if method == b"POST":
-                    self._handle_post_settings(conn, headers, rest)
-                    return
-                elif method in (b"GET", b"HEAD"):
-                    # опционально — можно убрать при желании
-                    self._handle_get_settings(conn)
-                    return
-
-            # default: отдать страницу
-            if method == b"HEAD":
-                self._send_raw(conn, b"200 OK", b"")
-            else:
-                self._send_200(conn, self._read_file())
-
-        finally:
-            try:
-                conn.close()
-            except:
-                pass
-
-    # --- lifecycle ---
-
-    def start(self):
-        if self.sock:
-            return
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        try:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        except:
-            pass
-        s.bind(("0.0.0.0", self.port))
-        s.listen(8)
-        s.setblocking(False)
-        self.sock = s
-
-    def stop(self):
-        try:
-            if self.sock:
-                self.sock.close()
-        finally:
-            self.sock = None
-
-    def poll(self):
-        if not self.sock:
-            return
-        try:
-            conn, addr = self.sock.accept()
-        except:
-            return
-        self._handle_conn(conn)
-
-# --------------------------- Facade ---------------------------
-
-class CaptivePortal:
-    def __init__(self, ssid="Camera-Setup", ip="192.168.4.1", mask="255.255.255.0",
-                 gw="192.168.4.1", html_path="apps/settings.html"):
-        self.ap = network.WLAN(network.AP_IF)
-        self.ap.active(True)
-        self.ssid = ssid
-        self.ip = ip
-        self.mask = mask
-        self.gw = gw
-        self.html_path = html_path
-
-        self.dns = _DNSServer(ip=ip, port=53)
-        self.http = _HTTPServer(ip=ip, port=80, html_path=html_path)
-
-        self._running = False
-
-    def _setup_ap(self):
-        self.ap.active(True)
-        try:
-            self.ap.config(essid=self.ssid, authmode=network.AUTH_OPEN)  # открытая сеть
-        except:
-            self.ap.config(essid=self.ssid)
-        try:
-            self.ap.ifconfig((self.ip, self.mask, self.gw, self.gw))
-        except:
-            pass
-
-        for _ in range(30):
-            if self.ap.active():
-                break
-            time.sleep_ms(100)
-
-        print("AP started:", self.ap.config("essid"), self.ap.ifconfig())
-
-    def start(self, run_forever=True):
-        if self._running:
-            return
-        self._setup_ap()
-        self.dns.start()
-        self.http.start()
-        self._running = True
-        print("CaptivePortal ready on http://%s/  (file: %s)" % (self.ip, self.html_path))
-
-        if run_forever:
-            try:
-                while self._running:
-                    self.poll()
-                    time.sleep_ms(5)
-            except KeyboardInterrupt:
-                print("Stopping by KeyboardInterrupt")
-                self.stop()
-
-    def poll(self):
-        if not self._running:
-            return
-        self.dns.poll()
-        self.http.poll()
-
-    def stop(self):
-        self._running = False
-        self.dns.stop()
-        self.http.stop()
-        try:
-            if self.ap:
-                self.ap.active(False)
-        except:
-            pass
-        print("CaptivePortal stopped")
+        await resp.json(_load_settings({"pxCount": 64, "canonMode": False, "startPause": 0, "pins": [26]}))
 
 # --------------------------- App wrapper ---------------------------
 
@@ -447,6 +209,7 @@ class App:
             return
         self.app.ble.active(False)
         self.portal = CaptivePortal(ssid="FrzLight "+self.app.config['name'], html_path="apps/freezlight.html")
+        _LedRoutes(self.portal)
         self.portal_running=True
         self.draw()
 
@@ -531,13 +294,14 @@ class App:
         if self.portal_running:
             self.stop()
             return
-        try:
-            sets=json.loads(open('apps/led_settings.json').read())
-        except:
-            sets={"startPause": 0, "pxCount": 144, "canonMode": true}
+        sets=_load_settings({"startPause": 0, "pxCount": 144, "canonMode": True})
+        pins=sets.get('pins', [26])
             
-            
-        np = NeoPixel(machine.Pin(26), sets['pxCount'])
+        # pxCount — пикселей на одну ленту; строка картинки делится между лентами
+        if len(pins) > 1:
+            np = NeoPixelParallel(pins, sets['pxCount'])
+        else:
+            np = NeoPixel(machine.Pin(pins[0]), sets['pxCount'])
         
         if sets['startPause']:
             for x in range(sets['startPause']):
@@ -554,14 +318,20 @@ class App:
         self.app.play_tone(330,500)
         Widgets.setBrightness(0)
         t0=time.time()
-        with P16Reader("apps/led.ppm", level=self.lightness, order="GRB") as r:
+        with P16Reader("apps/led.ppm", level=self.lightness, order="GRB", gamma=LED_GAMMA, dither=True) as r:
             print(r.width, r.height)
             while True:
                 row=r.load_next()
                 if row is None: break
-                np.buf=row
-                np.write()
+                if len(pins) > 1:
+                    np.write(row)   # не ждёт: пока ленты светят, читаем следующую строку
+                else:
+                    np.buf=row
+                    np.write()
                 time.sleep_ms(self.wait_ms)
+        if len(pins) > 1:
+            np.wait()
+            np.deinit()
                 
         self.last_time=time.time()-t0
         self.app.play_tone(330,50)
@@ -595,13 +365,24 @@ class P16Reader:
       P16 <w> <h>\\n
       затем h блоков по 2*w байт (RGB565), БЕЗ '\\n' между строками.
 
-    __init__(path, order='GRB', level=100)
-      level — множитель яркости в процентах (0..100).
+    __init__(path, order='GRB', level=100, gamma=1.0, dither=False)
+      level  — множитель яркости в процентах (0..100).
+      gamma  — показатель гамма-коррекции (1.0 — без коррекции);
+               при gamma != 1.0 дизеринг включается всегда.
+      dither — временной дизеринг: таблицы считаются с точностью 8.8,
+               дробный остаток каждого канала каждого светодиода
+               переносится на следующую строку, поэтому на малой
+               яркости в среднем получаются промежуточные уровни
+               вместо ступенек.
 
     load_next() -> memoryview длиной 3*w (GRB или RGB), либо None при конце.
     """
 
-    def __init__(self, path: str, order: str = "GRB", level: int = 100):
+    # 4x4 Байер: стартовые остатки, чтобы соседние диоды не щёлкали разом
+    _BAYER = (0, 8, 2, 10, 12, 4, 14, 6, 3, 11, 1, 9, 15, 7, 13, 5)
+
+    def __init__(self, path: str, order: str = "GRB", level: int = 100,
+                 gamma: float = 1.0, dither: bool = False):
         if order not in ("GRB", "RGB"):
             raise ValueError("order must be 'GRB' or 'RGB'")
         self._order_grb = (order == "GRB")
@@ -614,13 +395,11 @@ class P16Reader:
         self._f = open(path, "rb")
 
         # --- заголовок ---
-        header = self._readline_exact(self._f)
-        parts = header.strip().split()
-        if len(parts) != 3 or parts[0] != b"P16":
+        try:
+            self.width, self.height = self.parse_header(self._readline_exact(self._f))
+        except:
             self._f.close()
-            raise ValueError("Bad P16 header")
-        self.width  = int(parts[1])
-        self.height = int(parts[2])
+            raise
 
         # размеры/буферы
         self._data_off      = self._f.tell()
@@ -629,6 +408,12 @@ class P16Reader:
         self._row_in  = bytearray(self._row_in_bytes)
         self._row_out = bytearray(self._row_out_bytes)
 
+        self._dither = bool(dither) or gamma != 1.0
+        if self._dither:
+            self._init_dither(gamma)
+            self.row_index = 0
+            return
+
         # Базовые таблицы расширения до 8 бит
         base5 = [(v << 3) | (v >> 2) for v in range(32)]   # 5 -> 8
         base6 = [(v << 2) | (v >> 4) for v in range(64)]   # 6 -> 8
@@ -647,7 +432,34 @@ class P16Reader:
 
         self.row_index = 0
 
+    def _init_dither(self, gamma):
+        # значения 8.8: старший байт — выход, младший — остаток (<= 0xFF00)
+        k = self._level * 0xFF00 / 100
+        self._t5 = array("H", (int((v / 31) ** gamma * k + 0.5) for v in range(32)))
+        self._t6 = array("H", (int((v / 63) ** gamma * k + 0.5) for v in range(64)))
+        self._err = bytearray(self._row_out_bytes)
+        self.reset_dither()
+
+    def reset_dither(self):
+        """Сбросить накопленные остатки к начальному узору."""
+        if not self._dither:
+            return
+        e = self._err; bayer = self._BAYER
+        for j in range(len(e)):
+            e[j] = bayer[(j // 3) & 15] * 16 + 8
+
     # --- utils ---
+    @staticmethod
+    def parse_header(line: bytes):
+        """b"P16 <w> <h>\\n" -> (w, h); ValueError, если заголовок битый."""
+        parts = line.strip().split()
+        if len(parts) != 3 or parts[0] != b"P16":
+            raise ValueError("Bad P16 header")
+        w = int(parts[1]); h = int(parts[2])
+        if w <= 0 or h <= 0:
+            raise ValueError("Bad P16 header")
+        return w, h
+
     @staticmethod
     def _readline_exact(f):
         buf = bytearray()
@@ -696,6 +508,29 @@ class P16Reader:
                 d[j]   = R; d[j+1] = G; d[j+2] = B
             j += 3
 
+    @micropython.native
+    def _convert_row_dither(self, src_mv, dst_mv, w, t5, t6, err, order_grb):
+        # как _convert_row, но таблицы 8.8 и остаток копится в err
+        s = src_mv; d = dst_mv; e = err
+        _t5 = t5; _t6 = t6
+        j = 0
+        si = 0
+        for _ in range(w):
+            hi = s[si]; lo = s[si+1]
+            si += 2
+            r16 = _t5[hi >> 3]
+            g16 = _t6[((hi & 7) << 3) | (lo >> 5)]
+            b16 = _t5[lo & 31]
+            if order_grb:
+                a = g16 + e[j]; b = r16 + e[j+1]
+            else:
+                a = r16 + e[j]; b = g16 + e[j+1]
+            c = b16 + e[j+2]
+            d[j] = a >> 8; e[j] = a & 255
+            d[j+1] = b >> 8; e[j+1] = b & 255
+            d[j+2] = c >> 8; e[j+2] = c & 255
+            j += 3
+
     # --- API ---
     def load_next(self):
         """Вернуть следующую строку (memoryview длиной 3*w) или None при конце."""
@@ -704,7 +539,10 @@ class P16Reader:
         mv_in  = memoryview(self._row_in)
         mv_out = memoryview(self._row_out)
         self._readinto_exact(self._f, mv_in, self._row_in_bytes)
-        self._convert_row(mv_in, mv_out, self.width, self._t5, self._t6, self._order_grb)
+        if self._dither:
+            self._convert_row_dither(mv_in, mv_out, self.width, self._t5, self._t6, self._err, self._order_grb)
+        else:
+            self._convert_row(mv_in, mv_out, self.width, self._t5, self._t6, self._order_grb)
         self.row_index += 1
         return mv_out
 
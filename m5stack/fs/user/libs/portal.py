@@ -0,0 +1,612 @@
+import network, socket, struct, json, time, os
+import asyncio
+
+# Общий captive-портал для приложений (FrzLight, Settings):
+#   DNSServer   — отвечает на любой A-запрос адресом точки доступа
+#   HTTPServer  — asyncio, HTTP/1.1 keep-alive, параллельные соединения,
+#                 подключаемые обработчики маршрутов
+#   CaptivePortal — фасад: поднимает AP, DNS и HTTP; poll() крутит цикл
+#                 asyncio короткими порциями из главного цикла лаунчера
+#
+# Обработчик маршрута: async def handler(req, resp), где req — Request,
+# resp — Response. Тело запроса читается через req.readinto()/req.read_body().
+#
+# Статика: рядом с <file> могут лежать <file>.gz и <file>.etag, их готовит
+# tools/web_assets.py при сборке образа. Тогда файл отдаётся сжатым
+# (Content-Encoding: gzip), повторный запрос с If-None-Match получает 304.
+
+
+def _ip2bytes(ip: str) -> bytes:
+    return struct.pack("!BBBB", *[int(x) for x in ip.split(".")])
+
+
+def _urldecode(bts: bytes) -> str:
+    out = bytearray()
+    i = 0
+    n = len(bts)
+    while i < n:
+        c = bts[i]
+        if c == 37 and i + 2 < n:  # '%'
+            try:
+                out.append(int(bts[i + 1 : i + 3].decode(), 16))
+                i += 3
+                continue
+            except:
+                pass
+        if c == 43:  # '+'
+            out.append(32)
+            i += 1
+            continue
+        out.append(c)
+        i += 1
+    return out.decode()
+
+
+def parse_qs(qs: bytes) -> dict:
+    params = {}
+    if not qs:
+        return params
+    for part in qs.split(b"&"):
+        if not part:
+            continue
+        if b"=" in part:
+            k, v = part.split(b"=", 1)
+        else:
+            k, v = part, b""
+        params[_urldecode(k)] = _urldecode(v)
+    return params
+
+
+# --------------------------- DNS ---------------------------
+
+
+class DNSServer:
+    POLL_S = 0.02  # UDP в asyncio не ждётся — опрашиваем неблокирующий сокет
+
+    def __init__(self, ip="192.168.4.1", port=53):
+        self.ip_bytes = _ip2bytes(ip)
+        self.port = port
+        self.sock = None
+
+    def start(self):
+        if self.sock:
+            return
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(("0.0.0.0", self.port))
+        s.setblocking(False)
+        self.sock = s
+
+    def stop(self):
+        try:
+            if self.sock:
+                self.sock.close()
+        finally:
+            self.sock = None
+
+    def _build_resp(self, req):
+        try:
+            txid = req[0:2]
+            # найти конец QNAME
+            i = 12
+            while i < len(req) and req[i] != 0:
+                i += 1 + req[i]
+            q_end = i + 5  # 0x00 + QTYPE(2) + QCLASS(2)
+
+            # header: response, no error; QDCOUNT=1, ANCOUNT=1
+            header = txid + b"\x81\x80" + b"\x00\x01" + b"\x00\x01" + b"\x00\x00" + b"\x00\x00"
+            question = req[12:q_end]  # важно: без +1
+
+            # answer: pointer to name @0x0c, TYPE=A, CLASS=IN, TTL=60, RDLENGTH=4
+            answer = (
+                b"\xc0\x0c"
+                + b"\x00\x01"
+                + b"\x00\x01"
+                + b"\x00\x00\x00\x3c"
+                + b"\x00\x04"
+                + self.ip_bytes
+            )
+            return header + question + answer
+        except:
+            return None
+
+    def poll(self):
+        """Обработать все ждущие запросы; True, если что-то пришло."""
+        if not self.sock:
+            return False
+        got = False
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(512)
+            except:
+                return got
+            got = True
+            resp = self._build_resp(data)
+            if resp:
+                try:
+                    self.sock.sendto(resp, addr)
+                except:
+                    pass
+
+    async def serve(self):
+        while self.sock:
+            if not self.poll():
+                await asyncio.sleep(self.POLL_S)
+            else:
+                await asyncio.sleep(0)
+
+
+# --------------------------- HTTP ---------------------------
+
+
+class Request:
+    def __init__(self, reader, method, path, qs, headers, timeout):
+        self.reader = reader
+        self.method = method
+        self.path = path
+        self.qs = qs
+        self.headers = headers
+        self._timeout = timeout
+        try:
+            self.content_length = int(headers.get(b"content-length", b"0"))
+        except:
+            self.content_length = -1
+        # сколько байт тела ещё не прочитано обработчиком
+        self.remaining = self.content_length if self.content_length > 0 else 0
+
+    def query(self) -> dict:
+        return parse_qs(self.qs)
+
+    async def readinto(self, mv) -> int:
+        """Прочитать часть тела прямо в mv (не больше остатка); 0 — конец тела."""
+        n = len(mv)
+        if n > self.remaining:
+            n = self.remaining
+        if not n:
+            return 0
+        r = self.reader
+        if hasattr(r, "readinto"):
+            got = await asyncio.wait_for(r.readinto(mv[:n]), self._timeout)
+        else:
+            data = await asyncio.wait_for(r.read(n), self._timeout)
+            got = len(data)
+            mv[:got] = data
+        got = got or 0
+        self.remaining -= got
+        if not got:
+            self.remaining = 0
+        return got
+
+    async def read_body(self, mv) -> int:
+        """Дочитать всё тело в mv; вернуть длину. Тело длиннее mv — ValueError."""
+        if self.remaining > len(mv):
+            raise ValueError("body too large")
+        fill = 0
+        while self.remaining:
+            n = await self.readinto(mv[fill:])
+            if not n:
+                break
+            fill += n
+        return fill
+
+
+class Response:
+    def __init__(self, writer, keep_alive=True, head=False, req=None):
+        self.writer = writer
+        self.keep_alive = keep_alive
+        self.head = head
+        self.req = req
+        self.sent = False
+
+    def begin(self, status, mime, length, headers=b"", cache=b"no-store"):
+        """Записать строку статуса и заголовки; тело (length байт) шлёт вызывающий."""
+        self.sent = True
+        if self.req is not None and self.req.remaining:
+            # ответ до конца тела (ошибка) — остаток не дочитываем, закрываем
+            self.keep_alive = False
+        self.writer.write(
+            b"HTTP/1.1 " + status + b"\r\n"
+            b"Content-Type: " + mime + b"\r\n"
+            b"Cache-Control: "
+            + cache
+            + b"\r\n"
+            + (b"Connection: keep-alive\r\n" if self.keep_alive else b"Connection: close\r\n")
+            + headers
+            + b"Content-Length: "
+            + str(length).encode()
+            + b"\r\n"
+            b"\r\n"
+        )
+
+    async def send(
+        self, status=b"200 OK", body=b"", mime=b"text/html; charset=utf-8", headers=b""
+    ):
+        self.begin(status, mime, len(body), headers)
+        if body and not self.head and not status.startswith(b"204"):
+            self.writer.write(body)
+        await self.writer.drain()
+
+    async def json(self, obj):
+        try:
+            body = json.dumps(obj).encode()
+        except:
+            body = b"{}"
+        await self.send(b"200 OK", body, b"application/json")
+
+    async def text(self, status, msg):
+        await self.send(status, msg, b"text/plain; charset=utf-8")
+
+    async def redirect(self, location=b"/"):
+        await self.send(b"302 Found", b"", headers=b"Location: " + location + b"\r\n")
+
+
+class HTTPServer:
+    CAPTIVE_PATHS = (
+        b"/generate_204",
+        b"/gen_204",
+        b"/hotspot-detect.html",
+        b"/ncsi.txt",
+        b"/connecttest.txt",
+    )
+    KEEPALIVE_S = 5  # сколько держим простаивающее keep-alive соединение
+    REQUEST_S = 10  # таймаут на заголовки и каждый кусок тела
+    MAX_CLIENTS = 6  # сокетов в lwIP мало, телефон открывает 4-6 сразу
+    HEAD_LIMIT = 2048  # заголовки длиннее — соединение закрывается
+    CHUNK = 1024  # буфер отдачи файлов с flash
+    MIME = {
+        "html": b"text/html; charset=utf-8",
+        "js": b"application/javascript",
+        "css": b"text/css",
+        "json": b"application/json",
+        "png": b"image/png",
+        "bmp": b"image/bmp",
+        "ico": b"image/x-icon",
+    }
+
+    def __init__(
+        self, ip="192.168.4.1", port=80, html_path="apps/settings.html", fallback_html=None
+    ):
+        self.ip = ip
+        self.port = port
+        self.html_path = html_path
+        self.fallback_html = fallback_html or (
+            "<!doctype html><meta charset='utf-8'>"
+            "<title>Captive Portal</title>"
+            "<style>body{font-family:system-ui;background:#000;color:#fff;padding:24px}</style>"
+            "<h2>Captive Portal</h2>"
+            "<p>File not found: {path}</p>"
+            "<p>Create <code>{path}</code> on the device.</p>"
+        )
+        self.routes = {}
+        self.server = None
+        self._clients = {}
+        # сколько запросов сейчас передают тело — CaptivePortal.poll() крутит цикл дольше
+        self.busy = 0
+        # общий на все соединения: между readinto и write нет await,
+        # а write копирует данные в буфер потока
+        self._out = bytearray(self.CHUNK)
+        self._out_mv = memoryview(self._out)
+        self.requests = 0
+
+    # --- routes ---
+
+    def route(self, path: bytes, handler, methods=(b"GET", b"HEAD")):
+        """Повесить async handler(req, resp) на path для указанных методов."""
+        self.routes[path] = (methods, handler)
+
+    # --- file helpers ---
+
+    def _read_file(self):
+        try:
+            with open(self.html_path, "rb") as f:
+                return f.read()
+        except:
+            html = self.fallback_html.replace("{path}", self.html_path)
+            return html.encode()
+
+    async def _serve_page(self, req, resp):
+        if not await self.send_file(req, resp, self.html_path):
+            await resp.send(b"200 OK", b"" if resp.head else self._read_file())
+
+    def static(self, path: bytes, fs_path: str):
+        """Повесить на path отдачу файла fs_path (со сжатием и ETag, если есть)."""
+
+        async def handler(req, resp):
+            if not await self.send_file(req, resp, fs_path):
+                await resp.text(b"404 Not Found", b"Not Found")
+
+        self.route(path, handler)
+
+    async def send_file(self, req, resp, path: str) -> bool:
+        """Отдать файл с flash кусками по CHUNK байт; False, если файла нет.
+
+        <path>.gz отдаётся вместо оригинала, если клиент принимает gzip;
+        <path>.etag включает ETag/If-None-Match -> 304. Если оригинал новее
+        .gz (правили на flash, не перезапустив tools/web_assets.py), .gz и
+        .etag устарели — отдаётся оригинал без ETag.
+        """
+        mime = self.MIME.get(path.rsplit(".", 1)[-1].lower(), b"application/octet-stream")
+        headers = b""
+        fpath = path
+        gz = False
+        stale = False
+        try:
+            gz_mtime = os.stat(path + ".gz")[8]
+            try:
+                stale = os.stat(path)[8] > gz_mtime
+            except OSError:
+                pass  # на flash только .gz
+            gz = not stale and b"gzip" in req.headers.get(b"accept-encoding", b"")
+        except OSError:
+            pass
+        if gz:
+            fpath = path + ".gz"
+            headers = b"Content-Encoding: gzip\r\n"
+        try:
+            size = os.stat(fpath)[6]
+            f = open(fpath, "rb")
+        except OSError:
+            return False
+        try:
+            etag = None
+            if not stale:
+                try:
+                    with open(path + ".etag", "rb") as ef:
+                        etag = ef.read().strip()
+                    if not gz:
+                        # ETag посчитан по .gz; несжатый вариант — другое представление
+                        etag = etag[:-1] + b'-id"'
+                except OSError:
+                    pass
+            cache = b"no-store"
+            if etag:
+                headers += b"ETag: " + etag + b"\r\nVary: Accept-Encoding\r\n"
+                cache = b"no-cache"  # кэшировать можно, но каждый раз сверять ETag
+                if req.headers.get(b"if-none-match") == etag:
+                    resp.begin(b"304 Not Modified", mime, 0, headers, cache)
+                    await resp.writer.drain()
+                    return True
+            resp.begin(b"200 OK", mime, size, headers, cache)
+            if not resp.head:
+                buf = self._out
+                mv = self._out_mv
+                w = resp.writer
+                while True:
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    w.write(mv[:n])
+                    await w.drain()
+            await resp.writer.drain()
+        finally:
+            f.close()
+        return True
+
+    # --- request parsing ---
+
+    async def _read_request(self, reader, idle_timeout):
+        line = await asyncio.wait_for(reader.readline(), idle_timeout)
+        if not line:
+            return None
+        parts = line.split()
+        if len(parts) < 2:
+            raise ValueError("bad request line")
+        method = parts[0]
+        path, _, qs = parts[1].partition(b"?")
+        headers = {}
+        size = len(line)
+        while True:
+            ln = await asyncio.wait_for(reader.readline(), self.REQUEST_S)
+            size += len(ln)
+            if size > self.HEAD_LIMIT:
+                raise ValueError("headers too large")
+            if not ln or ln == b"\r\n" or ln == b"\n":
+                break
+            if b":" in ln:
+                k, v = ln.split(b":", 1)
+                headers[k.strip().lower()] = v.strip()
+        keep_alive = (
+            headers.get(b"connection", b"").lower() != b"close" and parts[-1] != b"HTTP/1.0"
+        )
+        return Request(reader, method, path, qs, headers, self.REQUEST_S), keep_alive
+
+    # --- connection ---
+
+    async def _client(self, reader, writer):
+        key = id(writer)
+        if len(self._clients) >= self.MAX_CLIENTS:
+            try:
+                await Response(writer, keep_alive=False).text(b"503 Service Unavailable", b"Busy")
+            except:
+                pass
+            await self._close(writer)
+            return
+        self._clients[key] = asyncio.current_task()
+        try:
+            idle = self.REQUEST_S
+            while True:
+                try:
+                    r = await self._read_request(reader, idle)
+                except (ValueError, asyncio.TimeoutError):
+                    break
+                if r is None:
+                    break
+                req, keep_alive = r
+                resp = Response(writer, keep_alive, head=req.method == b"HEAD", req=req)
+                if req.content_length < 0:
+                    resp.keep_alive = False
+                    await resp.text(b"400 Bad Request", b"Invalid Content-Length")
+                    break
+                self.requests += 1
+                await self._dispatch(req, resp)
+                # необработанный остаток тела сломает следующий запрос
+                if req.remaining or not resp.keep_alive:
+                    break
+                idle = self.KEEPALIVE_S
+        except OSError:
+            pass
+        finally:
+            self._clients.pop(key, None)
+            await self._close(writer)
+
+    async def _dispatch(self, req, resp):
+        path = req.path
+        handler = self._serve_page  # default: отдать страницу
+        if path not in self.CAPTIVE_PATHS:
+            r = self.routes.get(path)
+            if r and req.method in r[0]:
+                handler = r[1]
+        body = req.remaining > 0
+        if body:
+            self.busy += 1
+        try:
+            await handler(req, resp)
+        except asyncio.TimeoutError:
+            resp.keep_alive = False
+            if not resp.sent:
+                await resp.text(b"408 Request Timeout", b"Request Timeout")
+        except Exception as e:
+            print("portal:", path, e)
+            resp.keep_alive = False
+            if not resp.sent:
+                await resp.text(b"500 Internal Server Error", b"Internal Server Error")
+        finally:
+            if body:
+                self.busy -= 1
+
+    @staticmethod
+    async def _close(writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except:
+            pass
+
+    # --- lifecycle ---
+
+    async def start(self):
+        if self.server:
+            return
+        self.server = await asyncio.start_server(self._client, "0.0.0.0", self.port, backlog=8)
+
+    def stop(self):
+        for t in list(self._clients.values()):
+            try:
+                t.cancel()
+            except:
+                pass
+        self._clients = {}
+        try:
+            if self.server:
+                self.server.close()
+        finally:
+            self.server = None
+
+
+# --------------------------- Facade ---------------------------
+
+
+async def _yield():
+    # на MicroPython asyncio.sleep() — не корутина, run_until_complete() её не примет
+    await asyncio.sleep(0)
+
+
+class CaptivePortal:
+    # poll() отдаёт циклу asyncio не больше этого времени, пока идёт приём тела
+    POLL_BUDGET_MS = 20
+
+    def __init__(
+        self,
+        ssid="Camera-Setup",
+        ip="192.168.4.1",
+        mask="255.255.255.0",
+        gw="192.168.4.1",
+        html_path="apps/settings.html",
+    ):
+        self.ap = network.WLAN(network.AP_IF)
+        self.ap.active(True)
+        self.ssid = ssid
+        self.ip = ip
+        self.mask = mask
+        self.gw = gw
+        self.html_path = html_path
+
+        self.dns = DNSServer(ip=ip, port=53)
+        self.http = HTTPServer(ip=ip, port=80, html_path=html_path)
+        self.route = self.http.route
+
+        self._loop = None
+        self._dns_task = None
+        self._running = False
+
+    def _setup_ap(self):
+        self.ap.active(True)
+        try:
+            self.ap.config(essid=self.ssid, authmode=network.AUTH_OPEN)  # открытая сеть
+        except:
+            self.ap.config(essid=self.ssid)
+        try:
+            self.ap.ifconfig((self.ip, self.mask, self.gw, self.gw))
+        except:
+            pass
+
+        for _ in range(30):
+            if self.ap.active():
+                break
+            time.sleep_ms(100)
+
+        print("AP started:", self.ap.config("essid"), self.ap.ifconfig())
+
+    async def _start(self):
+        self.dns.start()
+        self._dns_task = asyncio.create_task(self.dns.serve())
+        await self.http.start()
+
+    def start(self, run_forever=True):
+        if self._running:
+            return
+        self._setup_ap()
+        self._loop = asyncio.get_event_loop()
+        self._loop.run_until_complete(self._start())
+        self._running = True
+        print("CaptivePortal ready on http://%s/  (file: %s)" % (self.ip, self.html_path))
+
+        if run_forever:
+            try:
+                self._loop.run_forever()
+            except KeyboardInterrupt:
+                print("Stopping by KeyboardInterrupt")
+                self.stop()
+
+    def _tick(self):
+        # один проход планировщика: готовые задачи + опрос сокетов без ожидания
+        self._loop.run_until_complete(_yield())
+
+    def poll(self):
+        """Вызывается из главного цикла; не блокирует дольше POLL_BUDGET_MS."""
+        if not self._running:
+            return
+        t0 = time.ticks_ms()
+        self._tick()
+        while self.http.busy and time.ticks_diff(time.ticks_ms(), t0) < self.POLL_BUDGET_MS:
+            self._tick()
+
+    def stop(self):
+        self._running = False
+        if self._loop:
+            self._loop.stop()  # если крутились в run_forever()
+        self.http.stop()
+        if self._dns_task:
+            self._dns_task.cancel()
+            self._dns_task = None
+        self.dns.stop()
+        try:
+            # дать отменённым задачам закрыть сокеты
+            self._tick()
+        except:
+            pass
+        try:
+            if self.ap:
+                self.ap.active(False)
+        except:
+            pass
+        print("CaptivePortal stopped")
@@ -3,6 +3,7 @@
 import bluetooth
 from micropython import const
 from .ble_advertising import decode_services, decode_name
+from m5ble.connparams import ConnParams
 
 _IRQ_CENTRAL_CONNECT = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2)
@@ -23,6 +24,7 @@ _IRQ_GATTC_READ_DONE = const(16)
 _IRQ_GATTC_WRITE_DONE = const(17)
 _IRQ_GATTC_NOTIFY = const(18)
 _IRQ_GATTC_INDICATE = const(19)
+_IRQ_CONNECTION_UPDATE = const(27)
 
 _ADV_IND = const(0x00)
 _ADV_DIRECT_IND = const(0x01)
@@ -53,6 +55,8 @@ class BLEUARTClient:
         self._ble.active(True)
         self._ble.irq(self._irq)
         self._rx_buffer = bytearray()
+        self._profile = None
+        self.conn_params = ConnParams()
         self._reset()
 
     def _reset(self):
@@ -104,7 +108,10 @@ class BLEUARTClient:
                 # Found a device during the scan (and the scan was explicitly stopped).
                 # self._scan_callback(self._addr_type, self._addr, self._name)
                 # self._scan_callback = None
-                self._ble.gap_connect(self._addr_type, self._addr)
+                if self._profile is None:
+                    self._ble.gap_connect(self._addr_type, self._addr)
+                else:
+                    self._profile.connect(self._ble, self._addr_type, self._addr)
             else:
                 # Scan timed out.
                 # self._scan_callback(None, None, None)
@@ -120,10 +127,14 @@ class BLEUARTClient:
         elif event == _IRQ_PERIPHERAL_DISCONNECT:
             # Disconnect (either initiated by us or the remote end).
             conn_handle, _, _ = data
+            self.conn_params.remove(conn_handle)
             if conn_handle == self._conn_handle:
                 # If it was initiated by us, it'll already be reset.
                 self._reset()
 
+        elif event == _IRQ_CONNECTION_UPDATE:
+            self.conn_params.update(data)
+
         elif event == _IRQ_GATTC_SERVICE_RESULT:
             self._verbose and print("GATTC service result")
             # Connected device returned a service.
@@ -205,8 +216,9 @@ class BLEUARTClient:
     #     self._ble.gap_connect(self._addr_type, self._addr)
     #     return True
 
-    def connect(self, name, timeout=2000):
+    def connect(self, name, timeout=2000, profile=None):
         self._name = name
+        self._profile = profile
         self._addr_type = None
         self._addr = None
         self._ble.gap_scan(timeout, 30000, 30000)
@@ -240,6 +252,10 @@ class BLEUARTClient:
             return
         self._ble.gattc_write(self._conn_handle, self._rx_handle, data)
 
+    # (interval_ms, latency, timeout_ms) granted by the server, None until known.
+    def get_conn_params(self):
+        return self.conn_params.get(self._conn_handle)
+
     # Disconnect from current device.
     def close(self):
         if not self._conn_handle:
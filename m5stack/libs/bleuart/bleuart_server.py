@@ -2,12 +2,14 @@
 
 import bluetooth
 from .ble_advertising import advertising_payload
+from m5ble.connparams import ConnParams
 
 from micropython import const
 
 _IRQ_CENTRAL_CONNECT = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2)
 _IRQ_GATTS_WRITE = const(3)
+_IRQ_CONNECTION_UPDATE = const(27)
 
 _FLAG_WRITE = const(0x0008)
 _FLAG_NOTIFY = const(0x0010)
@@ -31,7 +33,7 @@ _ADV_APPEARANCE_GENERIC_COMPUTER = const(128)
 
 
 class BLEUARTServer:
-    def __init__(self, name="", rxbuf=100, verbose=False):
+    def __init__(self, name="", rxbuf=100, verbose=False, profile=None):
         self._verbose = verbose
         self._ble = self._ble = bluetooth.BLE()
         self._ble.active(True)
@@ -47,6 +49,10 @@ class BLEUARTServer:
         #     name=name, services=[_UART_UUID], appearance=_ADV_APPEARANCE_GENERIC_COMPUTER
         # )
         self._payload = advertising_payload(name=name, appearance=_ADV_APPEARANCE_GENERIC_COMPUTER)
+        if profile is not None:
+            # preferred interval hint for the central, dropped if it does not fit
+            self._payload = profile.advertise_payload(self._payload)
+        self.conn_params = ConnParams()
         self._advertise()
 
     def irq(self, handler):
@@ -62,6 +68,7 @@ class BLEUARTServer:
             conn_handle, _, _ = data
             if conn_handle in self._connections:
                 self._connections.remove(conn_handle)
+            self.conn_params.remove(conn_handle)
             # Start advertising again to allow a new connection.
             self._advertise()
         elif event == _IRQ_GATTS_WRITE:
@@ -70,6 +77,8 @@ class BLEUARTServer:
                 self._rx_buffer += self._ble.gatts_read(self._rx_handle)
                 if self._handler:
                     self._handler()
+        elif event == _IRQ_CONNECTION_UPDATE:
+            self.conn_params.update(data)
 
     def any(self):
         return len(self._rx_buffer)
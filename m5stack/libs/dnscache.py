@@ -0,0 +1,129 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Process-wide cache in front of getaddrinfo().
+#
+# getaddrinfo() on lwIP or a cellular modem does not report the record TTL,
+# so entries live for a fixed time (TTL seconds). Failed lookups are cached
+# for NEGATIVE_TTL seconds so a dead name does not stall every reconnect.
+# Pinned hosts never expire and never hit the network.
+
+import socket
+import time
+
+TTL = 300
+NEGATIVE_TTL = 10
+MAX_ENTRIES = 32
+
+# (host, port, af, type, proto, resolver) -> (expires_ms, result or OSError)
+_cache = {}
+# host -> ip
+_pinned = {}
+
+hits = 0
+misses = 0
+negative_hits = 0
+
+
+def _is_ip(host):
+    parts = host.split(".")
+    if len(parts) != 4:
+        return ":" in host  # IPv6 literal
+    for p in parts:
+        if not p.isdigit():
+            return False
+    return True
+
+
+def _evict(now):
+    for k in [k for k, v in _cache.items() if time.ticks_diff(v[0], now) <= 0]:
+        del _cache[k]
+    while len(_cache) >= MAX_ENTRIES:
+        # drop the entry closest to expiry
+        oldest = None
+        for k, v in _cache.items():
+            if oldest is None or time.ticks_diff(v[0], _cache[oldest][0]) < 0:
+                oldest = k
+        del _cache[oldest]
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0, resolver=None):
+    """Drop-in for socket.getaddrinfo() with caching.
+
+    ``resolver`` replaces socket.getaddrinfo, e.g. a SIMCom modem's
+    getaddrinfo, so its lookups are cached the same way. Results are kept
+    per resolver: the modem and the Wi-Fi stack may see different networks.
+    """
+    global hits, misses, negative_hits
+    # a bound method is a new object on every access: key on its instance
+    owner = None if resolver is None else getattr(resolver, "__self__", resolver)
+    if resolver is None:
+        resolver = socket.getaddrinfo
+    if host in _pinned:
+        hits += 1
+        return resolver(_pinned[host], port, af, type, proto, flags)
+    if _is_ip(host):
+        return resolver(host, port, af, type, proto, flags)
+
+    key = (host, port, af, type, proto, owner)
+    now = time.ticks_ms()
+    entry = _cache.get(key)
+    if entry is not None and time.ticks_diff(entry[0], now) > 0:
+        res = entry[1]
+        if isinstance(res, OSError):
+            negative_hits += 1
+            raise res
+        hits += 1
+        return res
+
+    misses += 1
+    try:
+        res = resolver(host, port, af, type, proto, flags)
+    except OSError as e:
+        _evict(now)
+        _cache[key] = (time.ticks_add(now, int(NEGATIVE_TTL * 1000)), e)
+        raise
+    if res:
+        _evict(now)
+        _cache[key] = (time.ticks_add(now, int(TTL * 1000)), res)
+    return res
+
+
+def pin(host, ip):
+    """Resolve ``host`` to ``ip`` without any lookup until unpin()."""
+    _pinned[host] = ip
+    invalidate(host)
+
+
+def unpin(host):
+    _pinned.pop(host, None)
+
+
+def invalidate(host=None):
+    """Forget cached results for ``host``, or everything if None."""
+    if host is None:
+        _cache.clear()
+        return
+    for k in [k for k in _cache if k[0] == host]:
+        del _cache[k]
+
+
+def configure(ttl=None, negative_ttl=None, max_entries=None):
+    global TTL, NEGATIVE_TTL, MAX_ENTRIES
+    if ttl is not None:
+        TTL = ttl
+    if negative_ttl is not None:
+        NEGATIVE_TTL = negative_ttl
+    if max_entries is not None:
+        MAX_ENTRIES = max_entries
+
+
+def stats():
+    return {
+        "hits": hits,
+        "misses": misses,
+        "negative_hits": negative_hits,
+        "entries": len(_cache),
+        "pinned": len(_pinned),
+    }
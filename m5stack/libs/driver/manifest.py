@@ -35,6 +35,7 @@ package(
         "modbus/master/uFunctions.py",
         "modbus/master/uSerial.py",
         "neopixel/__init__.py",
+        "neopixel/parallel.py",
         "neopixel/sk6812.py",
         "neopixel/ws2812.py",
         "qrcode/__init__.py",
@@ -0,0 +1,162 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Several NeoPixel strips driven concurrently, one RMT channel per strip
+from . import NeoPixel
+from machine import Pin
+from esp32 import RMT
+import micropython
+
+# RMT clock: 80 MHz APB / 2 -> 25 ns per tick
+_CLOCK_DIV = 2
+_TICK_NS = 25
+# low time appended after the last bit so the strip latches the frame
+_RESET_US = 300
+# upper bound for one strip to drain; wait_done() needs a positive timeout
+_WAIT_MS = 1000
+
+
+@micropython.native
+def _encode(src, dst, lut, n: int):
+    # every byte -> 16 durations (high, low) x 8 bits, MSB first
+    j = 0
+    for i in range(n):
+        b = src[i]
+        dst[j : j + 8] = lut[b >> 4]
+        dst[j + 8 : j + 16] = lut[b & 15]
+        j += 16
+
+
+class NeoPixelParallel(NeoPixel):
+    """
+    note:
+        en: NeoPixelParallel drives two or more WS2812/SK6812 strips on separate pins at the same time. Each strip
+            gets its own RMT channel, so write() only starts the transfers and returns; wait() blocks until all
+            strips have latched. Pixels are addressed as one long strip: strip 0 first, then strip 1, and so on.
+
+    details:
+        link: https://docs.m5stack.com/en/unit/neopixel
+        image: https://static-cdn.m5stack.com/resource/docs/products/unit/neopixel/neopixel_01.webp
+        category: Unit
+    """
+
+    def __init__(
+        self, pins: list, n, bpp: int = 3, timing: int = 1, channels: list = None
+    ) -> None:
+        """
+        note:
+            en: Initialize the strips with their pins and lengths.
+
+        params:
+            pins:
+                note: A list of Pin objects or pin numbers, one per strip.
+            n:
+                note: Number of LEDs per strip, either one int for all strips or a list with one length per strip.
+            bpp:
+                note: The number of bytes per pixel (3 for RGB, 4 for RGBW). Default is 3.
+            timing:
+                note: 1 for 800kHz, 0 for 400kHz, or custom (T0H, T0L, T1H, T1L) timing in ns. Default is 1.
+            channels:
+                note: RMT channels to use, one per strip. Default is 0, 1, 2, ...
+        """
+        pins = [p if isinstance(p, Pin) else Pin(p) for p in pins]
+        lens = list(n) if isinstance(n, (list, tuple)) else [n] * len(pins)
+        if len(lens) != len(pins):
+            raise ValueError("need one length per pin")
+        if channels is None:
+            channels = range(len(pins))
+        self.pins = pins
+        self.lens = lens
+        self.n = sum(lens)
+        self.bpp = bpp
+        self.br = 1.0
+        self.buf = bytearray(self.n * bpp)
+        self.timing = (
+            ((400, 850, 800, 450) if timing else (800, 1700, 1600, 900))
+            if isinstance(timing, int)
+            else timing
+        )
+        t0h, t0l, t1h, t1l = [t // _TICK_NS for t in self.timing]
+        # nibble -> 8 durations; two lookups per byte keep the table small
+        self._lut = tuple(
+            tuple(
+                d for k in range(3, -1, -1) for d in ((t1h, t1l) if (v >> k) & 1 else (t0h, t0l))
+            )
+            for v in range(16)
+        )
+        self._reset = _RESET_US * 1000 // _TICK_NS
+        self._rmt = []
+        self._pulses = []
+        for i, pin in enumerate(pins):
+            self._rmt.append(RMT(channels[i], pin=pin, clock_div=_CLOCK_DIV, idle_level=False))
+            # preallocated once and handed to write_pulses() as is (it takes only a
+            # list or tuple); write() only overwrites it
+            self._pulses.append([0] * (lens[i] * bpp * 16))
+
+    def deinit(self) -> None:
+        """
+        note:
+            en: Release the RMT channels.
+        """
+        for rmt in self._rmt:
+            try:
+                rmt.deinit()
+            except Exception:
+                pass
+        self._rmt = []
+
+    def write(self, buf=None) -> None:
+        """
+        note:
+            en: Start sending the buffer to all strips and return without waiting. Each strip waits only for its
+                own previous transfer, so the next frame can be prepared while the current one is on the wire.
+
+        params:
+            buf:
+                note: Optional source buffer in strip order (for example a row of an image); its bytes are split
+                    across the strips by their lengths. Default is the object's own buffer.
+        """
+        src = memoryview(self.buf if buf is None else buf)
+        lut = self._lut
+        off = 0
+        for i, rmt in enumerate(self._rmt):
+            size = self.lens[i] * self.bpp
+            part = src[off : off + size]
+            off += size
+            pulses = self._pulses[i]
+            rmt.wait_done(timeout=_WAIT_MS)
+            _encode(part, pulses, lut, len(part))
+            end = len(part) * 16
+            if end:
+                last = pulses[end - 1]
+                pulses[end - 1] = last + self._reset
+                rmt.write_pulses(pulses if end == len(pulses) else pulses[:end], True)
+                pulses[end - 1] = last
+
+    def wait(self, timeout: int = _WAIT_MS) -> bool:
+        """
+        note:
+            en: Wait until every strip has finished its transfer.
+
+        params:
+            timeout:
+                note: Maximum time to wait in milliseconds for each strip. Default is 1000.
+
+        returns:
+            note: True if all strips are idle.
+        """
+        done = True
+        for rmt in self._rmt:
+            done = rmt.wait_done(timeout=timeout) and done
+        return done
+
+    def busy(self) -> bool:
+        """
+        note:
+            en: Return True while any strip is still transmitting.
+        """
+        for rmt in self._rmt:
+            if not rmt.wait_done():
+                return True
+        return False
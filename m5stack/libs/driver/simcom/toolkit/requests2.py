@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: MIT
 
 import socket
+import dnscache
 
 
 class Response:
@@ -78,7 +79,7 @@ def _request(
         host, port = host.split(":", 1)
         port = int(port)
 
-    ai = modem.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    ai = dnscache.getaddrinfo(host, port, 0, socket.SOCK_STREAM, resolver=modem.getaddrinfo)
     ai = ai[0]
 
     resp_d = None
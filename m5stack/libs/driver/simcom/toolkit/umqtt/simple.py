@@ -4,6 +4,7 @@
 
 import socket
 import struct
+import dnscache
 
 
 class MQTTException(Exception):
@@ -69,7 +70,7 @@ class MQTTClient:
 
     def connect(self, clean_session=True):
         self.sock = self.modem.socket()
-        addr = self.modem.getaddrinfo(self.server, self.port)[0][-1]
+        addr = dnscache.getaddrinfo(self.server, self.port, resolver=self.modem.getaddrinfo)[0][-1]
         self.sock.connect(addr)
         if self.ssl:
             import ssl
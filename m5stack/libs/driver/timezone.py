@@ -3,11 +3,12 @@
 # SPDX-License-Identifier: MIT
 
 from time import localtime
-from socket import socket, getaddrinfo, AF_INET, SOCK_DGRAM
+from socket import socket, AF_INET, SOCK_DGRAM
 from struct import unpack
 from errno import ETIMEDOUT
 from machine import RTC
 import network
+import dnscache
 
 wlan_sta = network.WLAN(network.STA_IF)
 
@@ -61,7 +62,7 @@ class TZONE(object):
             raise OSError("Wifi Not Started")
 
         try:
-            addr = getaddrinfo(self.host, 123)[0][-1]
+            addr = dnscache.getaddrinfo(self.host, 123)[0][-1]
         except OSError:  # as exc:
             #  if exc.args[0] == -2:
             print("Connect NTP Server: Error resolving pool NTP")
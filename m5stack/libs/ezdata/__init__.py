@@ -90,6 +90,7 @@ class EzData:
         except OSError:
             return
         from .multi import MultiPartForm
+        import requests2
 
         form = MultiPartForm()
         form.add_field("dataType", "file")
@@ -102,7 +103,8 @@ class EzData:
         headers["Content-Type"] = str(form.content_type())
         url = "{0}/{1}/uploadFile".format(_server, self._device_token)
         try:
-            rsp = requests.post(url, headers=headers, data=form.content())
+            # streamed from flash, so the file never has to fit in RAM
+            rsp = requests2.post(url, headers=headers, data=form.body())
             if rsp.status_code == 200:
                 rsp_data = json.loads(rsp.text)
                 rsp.close()
@@ -7,6 +7,7 @@ package(
     (
         "__init__.py",
         "multi.py",
+        "sync.py",
     ),
     base_path="..",
     opt=0,
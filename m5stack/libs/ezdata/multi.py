@@ -24,15 +24,11 @@ class MultiPartForm:
             mimetype = "application/octet-stream"
         self.files.append((field, filename, mimetype, file_size))
 
-    def content_length(self):
-        res = 0
+    def _parts(self):
+        # the body in order: bytes, and (path, size) where a file goes
         part_boundary = ("--" + self.boundary).encode()
         needs_clrf = False
         for name, value in self.fields:
-            if needs_clrf:
-                res += len(b"\r\n")
-            needs_clrf = True
-
             block = [
                 part_boundary,
                 ('Content-Disposition: form-data; name="%s"' % name).encode(),
@@ -40,13 +36,10 @@ class MultiPartForm:
                 b"",
                 value.encode(),
             ]
-            res += len(b"\r\n".join(block))
-
-        for field, filename, content_type, file_size in self.files:
-            if needs_clrf:
-                res += len(b"\r\n")
+            yield (b"\r\n" if needs_clrf else b"") + b"\r\n".join(block)
             needs_clrf = True
 
+        for field, filename, content_type, file_size in self.files:
             block = [
                 part_boundary,
                 (
@@ -55,56 +48,86 @@ class MultiPartForm:
                 ("Content-Type: %s" % content_type).encode(),
                 b"",
             ]
+            yield (b"\r\n" if needs_clrf else b"") + b"\r\n".join(block) + b"\r\n"
+            needs_clrf = True
+            yield (filename, file_size)
 
-            res += len(b"\r\n".join(block))
-            res += len(b"\r\n")
-            res += file_size
-        res += len("\r\n--" + self.boundary + "--\r\n")
+        yield ("\r\n--" + self.boundary + "--\r\n").encode()
+
+    def content_length(self):
+        res = 0
+        for part in self._parts():
+            res += part[1] if isinstance(part, tuple) else len(part)
         return res
 
     def content(self):
         data = b""
-        part_boundary = ("--" + self.boundary).encode()
-
-        needs_clrf = False
-        for name, value in self.fields:
-            if needs_clrf:
-                data += b"\r\n"
-            needs_clrf = True
-
-            block = [
-                part_boundary,
-                ('Content-Disposition: form-data; name="%s"' % name).encode(),
-                b"Content-Type: multipart/form-data",
-                b"",
-                value.encode(),
-            ]
-
-            data += b"\r\n".join(block)
-
-        for field, filename, content_type, _ in self.files:
-            if needs_clrf:
-                data += b"\r\n"
-            needs_clrf = True
-
-            block = [
-                part_boundary,
-                (
-                    'Content-Disposition: form-data; name="%s"; filename="%s"' % (field, filename)
-                ).encode(),
-                ("Content-Type: %s" % content_type).encode(),
-                b"",
-            ]
-
-            data += b"\r\n".join(block)
-            data += b"\r\n"
-
-            with open(filename, "rb") as f:
-                while True:
-                    ch = f.read(1024)
-                    if not ch:
-                        break
-                    data += ch
-
-        data += ("\r\n--" + self.boundary + "--\r\n").encode()
+        for part in self._parts():
+            if isinstance(part, tuple):
+                with open(part[0], "rb") as f:
+                    while True:
+                        ch = f.read(1024)
+                        if not ch:
+                            break
+                        data += ch
+            else:
+                data += part
         return data
+
+    def body(self):
+        """The body as a stream for requests2: ``data=form.body()``.
+
+        Files are read from flash while the request is sent, so memory use
+        does not depend on their size.
+        """
+        return _FormBody(self)
+
+
+class _FormBody:
+    def __init__(self, form) -> None:
+        self._len = form.content_length()
+        self._parts = form._parts()
+        self._cur = None
+        self._file = None
+        self._off = 0
+
+    def __len__(self):
+        return self._len
+
+    def readinto(self, buf):
+        mv = memoryview(buf)
+        size = len(buf)
+        n = 0
+        while n < size:
+            if self._file is not None:
+                k = self._file.readinto(mv[n:])
+                if not k:
+                    self._file.close()
+                    self._file = None
+                    continue
+                n += k
+                continue
+            cur = self._cur
+            if cur is None:
+                try:
+                    part = next(self._parts)
+                except StopIteration:
+                    break
+                if isinstance(part, tuple):
+                    self._file = open(part[0], "rb")
+                    continue
+                cur = self._cur = part
+                self._off = 0
+            k = min(len(cur) - self._off, size - n)
+            mv[n : n + k] = cur[self._off : self._off + k]
+            self._off += k
+            n += k
+            if self._off == len(cur):
+                self._cur = None
+        return n
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._cur = None
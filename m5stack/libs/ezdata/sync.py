@@ -0,0 +1,204 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Batched, delta-aware ezdata client.
+#
+#   from ezdata.sync import EzDataSync
+#
+#   ez = EzDataSync(period=5000)
+#   ez.watch("setpoint", lambda key, value: print(key, value))
+#   ez.start()
+#   ...
+#   ez.set("temp", 21.5)  # uploaded with the next cycle, if it changed
+#
+# A cycle uploads the keys whose value changed since the last upload (the
+# API takes one key per /add, so writes to the same key in between collapse
+# into one request), then reads every key with one /list request,
+# revalidated with If-None-Match / If-Modified-Since. All requests of a
+# cycle share one keep-alive connection, so the TLS handshake is paid once.
+
+import json
+from requests2 import Session
+from requests2 import cache
+from driver import soft_timer
+from . import _server, _data_types, _get_token
+
+
+class EzDataSync:
+    def __init__(self, token=None, period=5000, session=None) -> None:
+        self._device_token = token if token else _get_token()
+        self.period = period
+        self._session = (
+            session if session is not None else Session(max_per_host=1, idle_timeout=60)
+        )
+        # key -> [value, update_time]
+        self._mirror = {}
+        # key -> value waiting for upload
+        self._dirty = {}
+        # key -> callback(key, value)
+        self._watch = {}
+        self._list = cache.Validators()
+        self._tim = None
+        self.uploads = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.polls = 0
+        self.not_modified = 0
+        self.changes = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def set(self, key, value):
+        """Queue ``value`` for upload unless the mirror already holds it."""
+        m = self._mirror.get(key)
+        if key in self._dirty:
+            self.coalesced += 1
+            if m is not None and m[0] == value:
+                # changed back before it was sent
+                del self._dirty[key]
+                return
+        elif m is not None and m[0] == value:
+            self.skipped += 1
+            return
+        self._dirty[key] = value
+
+    def get(self, key, default=None):
+        """The latest value: a pending upload, else the last one read."""
+        if key in self._dirty:
+            return self._dirty[key]
+        m = self._mirror.get(key)
+        return default if m is None else m[0]
+
+    def get_update_time(self, key):
+        m = self._mirror.get(key)
+        return 0 if m is None else m[1]
+
+    def keys(self):
+        return list(self._mirror)
+
+    def watch(self, key, callback):
+        """Call ``callback(key, value)`` when a poll finds a new value for ``key``."""
+        if callback is None:
+            self._watch.pop(key, None)
+        else:
+            self._watch[key] = callback
+
+    def _url(self, path):
+        return "{0}/{1}/{2}".format(_server, self._device_token, path)
+
+    def _upload(self):
+        url = self._url("add")
+        headers = {"Content-Type": "application/json"}
+        for key, value in list(self._dirty.items()):
+            body = json.dumps(
+                {
+                    "dataType": _data_types.get(type(value), ""),
+                    "name": key,
+                    "permissions": "1",
+                    "value": value,
+                }
+            ).encode()
+            rsp = self._session.post(url, data=body, headers=headers)
+            self.bytes_sent += len(body)
+            content = rsp.content
+            self.bytes_received += len(content)
+            if rsp.status_code != 200 or json.loads(content)["code"] != 200:
+                self.errors += 1
+                continue
+            self.uploads += 1
+            m = self._mirror.get(key)
+            if m is None:
+                self._mirror[key] = [value, 0]
+            else:
+                m[0] = value
+            # a newer set() may have replaced it meanwhile
+            if key in self._dirty and self._dirty[key] == value:
+                del self._dirty[key]
+
+    def _poll(self):
+        self.polls += 1
+        rsp = cache.get(self._url("list"), self._list, self._session)
+        if rsp.status_code == 304:
+            rsp.close()
+            self.not_modified += 1
+            return
+        content = rsp.content
+        self.bytes_received += len(content)
+        if rsp.status_code != 200:
+            self.errors += 1
+            self._list.clear()
+            return
+        data = json.loads(content)
+        if data["code"] != 200:
+            self.errors += 1
+            self._list.clear()
+            return
+        for row in data["data"]["rows"]:
+            key = row["name"]
+            if key in self._dirty:
+                # the local write is newer; it goes up next cycle
+                continue
+            value = row["value"]
+            t = int(row.get("updateTime", 0))
+            m = self._mirror.get(key)
+            if m is None:
+                self._mirror[key] = [value, t]
+            else:
+                if m[0] == value:
+                    m[1] = t
+                    continue
+                m[0] = value
+                m[1] = t
+            self.changes += 1
+            cb = self._watch.get(key)
+            if cb is not None:
+                cb(key, value)
+
+    def sync(self):
+        """Run one cycle: upload changed keys, then poll; returns False on a network error."""
+        try:
+            self._upload()
+            self._poll()
+            return True
+        except (OSError, ValueError, KeyError):
+            self.errors += 1
+            return False
+
+    def _cb(self, tim):
+        self.sync()
+        if self._tim is tim:
+            tim.init(mode=soft_timer.SoftTimer.ONE_SHOT, period=self.period, callback=self._cb)
+
+    def start(self, period=None):
+        """Sync every ``period`` milliseconds from one soft timer."""
+        if period is not None:
+            self.period = period
+        self.stop()
+        self._tim = soft_timer.SoftTimer(
+            mode=soft_timer.SoftTimer.ONE_SHOT, period=self.period, callback=self._cb
+        )
+
+    def stop(self):
+        if self._tim is not None:
+            tim = self._tim
+            self._tim = None
+            tim.deinit()
+
+    def stats(self):
+        s = self._session.stats()
+        return {
+            "requests": s["requests"],
+            "handshakes": s["handshakes"],
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "uploads": self.uploads,
+            "skipped": self.skipped,
+            "coalesced": self.coalesced,
+            "pending": len(self._dirty),
+            "polls": self.polls,
+            "not_modified": self.not_modified,
+            "changes": self.changes,
+            "errors": self.errors,
+        }
@@ -3,11 +3,7 @@
 # SPDX-License-Identifier: MIT
 
 from M5 import Widgets
-
-try:
-    import urequests as requests
-except ImportError:
-    import requests
+from requests2 import cache
 import _thread
 import time
 import micropython
@@ -35,17 +31,20 @@ class ImagePlus(Widgets.Image):
 
     def _draw(self):
         try:
-            rsp = requests.get(self._url)
-            if rsp.status_code == 200:
-                with open(self._path, "wb") as f:
-                    f.write(rsp.content)
+            # 304: the file on flash is current, skip the download and redraw
+            status = cache.fetch(self._url, self._path)
+            if status == 200:
                 self._valid = True
                 super().setImage(self._path)
                 self.last_time = time.ticks_ms()
+            elif status == 304:
+                if not self._valid:
+                    self._valid = True
+                    super().setImage(self._path)
+                self.last_time = time.ticks_ms()
             else:
                 self._valid = False
                 super().setImage(self._default_img)
-            rsp.close()
         except OSError:
             self._valid = False
             super().setImage(self._default_img)
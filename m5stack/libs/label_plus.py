@@ -3,7 +3,7 @@
 # SPDX-License-Identifier: MIT
 
 from M5 import Widgets
-import requests
+from requests2 import cache
 
 from driver import soft_timer
 
@@ -68,6 +68,8 @@ class LabelPlus(Widgets.Label):
         super(LabelPlus, self).__init__(text, x, y, size, text_color, bg_color, font)
 
         self._data = error_msg
+        # ETag / Last-Modified of the data on screen
+        self._validators = cache.Validators()
         self._update()
         self._init_timer()
 
@@ -186,12 +188,16 @@ class LabelPlus(Widgets.Label):
 
     def set_url(self, url):
         self._url = url
+        self._validators.clear()
 
     def _update(self):
         r = None
         try:
-            r = requests.get(self._url)
-            if r.status_code == 200:
+            r = cache.get(self._url, self._validators)
+            if r.status_code == 304:
+                # unchanged since the last 200: keep the text on screen
+                pass
+            elif r.status_code == 200:
                 if self._key is None:
                     self._data = r.content
                     self._show(str(r.content))
@@ -232,10 +238,14 @@ class LabelPlus(Widgets.Label):
     def show_value_of_key(self, key):
         self._tim.deinit()
         self._key = key
+        # the body has to be parsed again for the new key
+        self._validators.clear()
         self._update()
         self._init_timer()
 
     def _show_error(self, error_msg):
+        # a later 304 must not leave the error on screen
+        self._validators.clear()
         super().setColor(self._error_msg_color)
         if self._error_msg is None:
             self._data = error_msg
@@ -0,0 +1,166 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Connection parameter profiles for both BLE roles.
+#
+# MicroPython has no call to renegotiate parameters on a live link, so a
+# profile is applied where the API allows it:
+#   central:    gap_connect(..., min_conn_interval_us, max_conn_interval_us)
+#   peripheral: "Slave Connection Interval Range" AD field (0x12) in the
+#               advertising payload, a hint the central may honour.
+# Apps that need to switch (e.g. low latency for a shot, low power after)
+# connect per session with the matching profile. What the peer actually
+# granted arrives with _IRQ_CONNECTION_UPDATE and is kept by ConnParams.
+
+from micropython import const
+import struct
+
+_ADV_TYPE_CONN_INTERVAL = const(0x12)
+_ADV_MAX_LEN = const(31)
+
+
+def strip_adv_field(payload, adv_type) -> bytes:
+    """
+    note:
+        en: Return an advertising payload without the AD structures of the given type.
+    """
+    out = bytearray()
+    i = 0
+    while i < len(payload):
+        n = payload[i]
+        if n == 0:
+            break
+        if i + 1 < len(payload) and payload[i + 1] != adv_type:
+            out += payload[i : i + n + 1]
+        i += n + 1
+    return bytes(out)
+
+
+class ConnProfile:
+    """
+    note:
+        en: A named set of connection parameters. Intervals are in milliseconds (7.5 - 4000, 1.25 ms steps),
+            latency is the number of connection events the peripheral may skip and timeout is the supervision
+            timeout in milliseconds.
+    """
+
+    def __init__(self, name, interval_min_ms, interval_max_ms, latency=0, timeout_ms=4000) -> None:
+        if not 7.5 <= interval_min_ms <= interval_max_ms <= 4000:
+            raise ValueError("interval out of range")
+        if not 0 <= latency <= 499:
+            raise ValueError("latency out of range")
+        # the link must survive the peripheral skipping `latency` events
+        if not 100 <= timeout_ms <= 32000 or timeout_ms <= (1 + latency) * interval_max_ms * 2:
+            raise ValueError("timeout too short")
+        self.name = name
+        self.interval_min_ms = interval_min_ms
+        self.interval_max_ms = interval_max_ms
+        self.latency = latency
+        self.timeout_ms = timeout_ms
+
+    def __repr__(self) -> str:
+        return "<ConnProfile %s %s-%sms lat=%d to=%dms>" % (
+            self.name,
+            self.interval_min_ms,
+            self.interval_max_ms,
+            self.latency,
+            self.timeout_ms,
+        )
+
+    def connect(self, ble, addr_type, addr, scan_duration_ms=2000) -> bool:
+        """
+        note:
+            en: Start a central connection asking for this profile's interval. Falls back to the stack defaults
+                when the port rejects the interval arguments.
+
+        returns:
+            note: True if the interval was passed to the stack, False if the plain connect was used.
+        """
+        try:
+            ble.gap_connect(
+                addr_type,
+                addr,
+                scan_duration_ms,
+                int(self.interval_min_ms * 1000),
+                int(self.interval_max_ms * 1000),
+            )
+            return True
+        except (TypeError, ValueError):
+            ble.gap_connect(addr_type, addr, scan_duration_ms)
+            return False
+
+    def adv_field(self) -> bytes:
+        """
+        note:
+            en: Return the Slave Connection Interval Range AD structure for an advertising payload.
+        """
+        return struct.pack(
+            "<BBHH",
+            5,
+            _ADV_TYPE_CONN_INTERVAL,
+            int(self.interval_min_ms * 4 / 5),
+            int(self.interval_max_ms * 4 / 5),
+        )
+
+    def advertise_payload(self, payload) -> bytes:
+        """
+        note:
+            en: Put the interval hint into an advertising payload, replacing one already there, if it fits in
+                31 bytes; otherwise return the payload without a hint.
+        """
+        payload = strip_adv_field(payload, _ADV_TYPE_CONN_INTERVAL)
+        field = self.adv_field()
+        if len(payload) + len(field) > _ADV_MAX_LEN:
+            return payload
+        return payload + field
+
+    def satisfied_by(self, params) -> bool:
+        """
+        note:
+            en: Check whether granted parameters (interval_ms, latency, timeout_ms) fall inside this profile.
+        """
+        if params is None:
+            return False
+        interval_ms, latency, _timeout_ms = params
+        return (
+            self.interval_min_ms <= interval_ms <= self.interval_max_ms and latency <= self.latency
+        )
+
+
+# shutter / keypress: answer on the next connection event
+LOW_LATENCY = ConnProfile("low-latency", 7.5, 15, 0, 2000)
+# file or log transfer: short interval, no skipped events
+BULK = ConnProfile("bulk", 15, 30, 0, 4000)
+# idle link kept alive cheaply
+LOW_POWER = ConnProfile("low-power", 100, 200, 4, 6000)
+
+
+class ConnParams:
+    """
+    note:
+        en: Track the parameters granted for each connection from _IRQ_CONNECTION_UPDATE.
+    """
+
+    def __init__(self) -> None:
+        self._links = {}
+
+    def update(self, data) -> None:
+        """
+        note:
+            en: Feed the data tuple of _IRQ_CONNECTION_UPDATE.
+        """
+        conn_handle, interval, latency, timeout, status = data
+        if status == 0:
+            # interval in 1.25 ms units, supervision timeout in 10 ms units
+            self._links[conn_handle] = (interval * 5 / 4, latency, timeout * 10)
+
+    def get(self, conn_handle):
+        """
+        note:
+            en: Return (interval_ms, latency, timeout_ms) for the connection, or None before the first update.
+        """
+        return self._links.get(conn_handle)
+
+    def remove(self, conn_handle) -> None:
+        self._links.pop(conn_handle, None)
@@ -7,6 +7,7 @@ from micropython import const, schedule
 import struct
 import gc
 import time
+from .connparams import ConnParams
 
 _ADV_APPEARANCE_GENERIC_COMPUTER = const(128)
 _IRQ_CENTRAL_CONNECT = const(1)
@@ -175,7 +176,10 @@ class Server:
         self._parent = parent
         self._connected_devices = set()
         self._rx_buffer = bytearray()
-        self._payload = advertising_payload(name=name, appearance=_ADV_APPEARANCE_GENERIC_COMPUTER)
+        self._adv_payload = advertising_payload(
+            name=name, appearance=_ADV_APPEARANCE_GENERIC_COMPUTER
+        )
+        self._payload = self._adv_payload
         self._buf_size = buf_size
         self._services = []
         self._value_handles = ()
@@ -198,7 +202,11 @@ class Server:
             + bluetooth.FLAG_NOTIFY * notify,
         )
 
-    def start(self, interval_us=500000):
+    def start(self, interval_us=500000, profile=None):
+        # built from the plain payload each time, so repeated starts don't stack hints
+        self._payload = self._adv_payload
+        if profile is not None:
+            self._payload = profile.advertise_payload(self._adv_payload)
         self._verbose and print(self._services)
         self._value_handles = self._ble.gatts_register_services(self._services)
 
@@ -354,10 +362,13 @@ class Client:
         self._scan_results = []
         self._ble.gap_scan(timeout, 30000, 30000)
 
-    def connect(self, addr_type, addr):
+    def connect(self, addr_type, addr, profile=None):
         self._server_addr_type = addr_type
         self._server_addr = bytes(addr)
-        self._ble.gap_connect(addr_type, addr)
+        if profile is None:
+            self._ble.gap_connect(addr_type, addr)
+        else:
+            profile.connect(self._ble, addr_type, addr)
 
     def _extract_uuid_items(self, original_dict):
         extracted_items = {}
@@ -566,6 +577,7 @@ class Device:
         self.server = Server(self, name, buf_size, verbose)
         self._ble.active(True)
         self._mtu = self._ble.config("mtu")
+        self.conn_params = ConnParams()
         self._ble.irq(self._ble_irq)
 
     def _ble_irq(self, event, data):
@@ -577,13 +589,22 @@ class Device:
             self._verbose and print("MTU exchanged: %d" % mtu)
             self._mtu = mtu
 
+        elif event == _IRQ_CONNECTION_UPDATE:
+            self.conn_params.update(data)
+            self._verbose and print("Connection params:", self.conn_params.get(data[0]))
+
         else:
+            if event in (_IRQ_CENTRAL_DISCONNECT, _IRQ_PERIPHERAL_DISCONNECT):
+                self.conn_params.remove(data[0])
             self.server._irq(event, data)
             self.client._irq(event, data)
 
     def get_mtu(self):
         return self._mtu
 
+    def get_conn_params(self, conn_handle):
+        return self.conn_params.get(conn_handle)
+
     def deinit(self):
         self._ble.active(False)
 
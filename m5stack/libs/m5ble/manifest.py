@@ -6,6 +6,7 @@ package(
     "m5ble",
     (
         "__init__.py",
+        "connparams.py",
         "m5ble.py",
     ),
     base_path="..",
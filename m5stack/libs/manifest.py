@@ -23,6 +23,7 @@ include("utility/manifest.py")
 # freeze("$(MPY_DIR)/../m5stack/libs/unit")
 module("boot_option.py")
 module("color_conv.py")
+module("dnscache.py")
 module("attitude_estimator.py")
 module("label_plus.py")
 module("m5camera.py")
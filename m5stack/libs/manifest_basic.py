@@ -18,6 +18,7 @@ include("unit/manifest.py")
 include("utility/manifest.py")
 module("boot_option.py")
 module("color_conv.py")
+module("dnscache.py")
 module("attitude_estimator.py")
 module("label_plus.py")
 module("pid.py")
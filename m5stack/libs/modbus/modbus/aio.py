@@ -0,0 +1,249 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# asyncio Modbus TCP server.
+#
+#   from modbus.aio import AsyncModbusTCPServer
+#
+#   srv = AsyncModbusTCPServer("0.0.0.0", 502, context={...})
+#   srv.add_holding_register(100, 0x1234)
+#   asyncio.run(srv.run_async())
+#
+# Every client connection gets its own task. Requests are framed by the
+# MBAP length field, so several requests in one segment, or one request
+# split over several, are handled; all complete requests found in what was
+# read are answered before a single drain, which keeps a pipelining client
+# (several transactions in flight) from paying a round trip per request.
+# A connection that sends nothing for `idle_timeout` seconds is closed.
+
+import asyncio
+import time
+from .slave import ModbusSlave
+from .codec import decode_pdu, write_pdu
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+
+# MBAP header (7 bytes) and the largest PDU (253 bytes)
+_MBAP = 7
+_MAX_ADU = 260
+
+
+class TCPFrame:
+    def __init__(self) -> None:
+        """A decoded Modbus TCP request, with the attributes of ModbusTCPFrame"""
+        self.type = "request"
+        self.transaction_id = 0
+        self.unit_id = 0
+        self.func_code = 0
+        self.register = None
+        self.length = None
+        self.data = None
+        self.error_code = None
+
+
+class _Client:
+    def __init__(self, peer, writer) -> None:
+        self.peer = peer
+        self.writer = writer
+        self.since = ticks_ms()
+        self.last = self.since
+        self.requests = 0
+        self.errors = 0
+
+
+class AsyncModbusTCPServer(ModbusSlave):
+    READ_SIZE = 512
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 502,
+        idle_timeout: int = 60,
+        max_clients: int = 8,
+        verbose: bool = False,
+        *args,
+        **kwargs,
+    ) -> None:
+        """Init an asyncio modbus TCP server
+
+        :param str host: Server host address
+        :param int port: Server port number, 0 for any free port
+        :param int idle_timeout: Seconds without a request before a client is dropped
+        :param int max_clients: Connections beyond this are closed at once
+        :param bool verbose: If True, print debug messages
+        """
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self._verbose = verbose
+        super(AsyncModbusTCPServer, self).__init__(
+            sl_type="tcp",
+            context=kwargs.get("context", None),
+            ignore_unit_id=kwargs.get("ignore_unit_id", False),
+            device_address=kwargs.get("device_address", 1),
+        )
+        self.clients = []
+        self.requests = 0
+        self.ignored = 0
+        self.rejected = 0
+        self._server = None
+        self._frame = TCPFrame()
+        self._tx = bytearray(_MAX_ADU)
+        self._txv = memoryview(self._tx)
+
+    async def start(self):
+        """Start listening; returns the asyncio server"""
+        self.stopped = False
+        self._server = await asyncio.start_server(
+            self._serve, self.host, self.port, backlog=self.max_clients
+        )
+        return self._server
+
+    async def run_async(self):
+        """Serve until :meth:`stop` is called
+
+        :returns: None
+        """
+        if self._server is None:
+            await self.start()
+        self._verbose and print("starting async tcp server on port {}".format(self.port))
+        while not self.stopped:
+            await asyncio.sleep(0.1)
+        self.close()
+
+    def close(self) -> None:
+        """Stop listening and drop every client"""
+        self.stopped = True
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for c in self.clients:
+            c.writer.close()
+
+    async def _serve(self, reader, writer):
+        if len(self.clients) >= self.max_clients or self.stopped:
+            self.rejected += 1
+            writer.close()
+            return
+        c = _Client(writer.get_extra_info("peername"), writer)
+        self.clients.append(c)
+        self._verbose and print("new connection from {}".format(c.peer))
+        buf = b""
+        try:
+            while not self.stopped:
+                data = await asyncio.wait_for(reader.read(self.READ_SIZE), self.idle_timeout)
+                if not data:
+                    break
+                buf = buf + data if buf else data
+                pos = self._frames(c, buf)
+                if pos < 0:
+                    self._verbose and print("bad MBAP header from {}".format(c.peer))
+                    break
+                buf = buf[pos:]
+                await writer.drain()
+        except asyncio.TimeoutError:
+            self._verbose and print("idle timeout {}".format(c.peer))
+        except OSError:
+            c.errors += 1
+        finally:
+            self.clients.remove(c)
+            writer.close()
+
+    def _frames(self, c, buf) -> int:
+        # answer every complete ADU in buf; returns the bytes used, -1 if the stream is broken
+        pos = 0
+        n = len(buf)
+        while n - pos >= _MBAP + 1:
+            length = buf[pos + 4] << 8 | buf[pos + 5]
+            if buf[pos + 2] or buf[pos + 3] or not 2 <= length <= _MAX_ADU - 6:
+                return -1
+            end = pos + 6 + length
+            if end > n:
+                break
+            rsp = self._request(c, buf, pos, end)
+            if rsp is not None:
+                c.writer.write(rsp)
+            pos = end
+        return pos
+
+    def _encode(self, tid: int, unit: int, rsp):
+        tx = self._tx
+        n = write_pdu(rsp, tx, _MBAP)
+        tx[0] = tid >> 8
+        tx[1] = tid & 0xFF
+        tx[2] = 0
+        tx[3] = 0
+        tx[4] = (n - 6) >> 8
+        tx[5] = (n - 6) & 0xFF
+        tx[6] = unit
+        return self._txv[:n]
+
+    def _exception(self, tid: int, unit: int, func_code: int, code: int):
+        f = self._frame
+        f.func_code = 0x80 | func_code
+        f.error_code = code
+        return self._encode(tid, unit, f)
+
+    def _request(self, c, buf, start: int, end: int):
+        """Answer the ADU in ``buf[start:end]``; returns the response or None"""
+        c.requests += 1
+        c.last = ticks_ms()
+        self.requests += 1
+        tid = buf[start] << 8 | buf[start + 1]
+        unit = buf[start + 6]
+        if self.ignore_unit_id is not True and unit != self._device_address:
+            self.ignored += 1
+            return None
+        f = self._frame
+        fc = buf[start + _MBAP]
+        if fc not in self._FUNCTION_MAP:
+            c.errors += 1
+            return self._exception(tid, unit, fc & 0x7F, 0x01)
+        if not decode_pdu(f, buf, start + _MBAP, end):
+            c.errors += 1
+            return self._exception(tid, unit, fc, 0x03)
+        f.transaction_id = tid
+        f.unit_id = unit
+        rsp = self.handle_message(f)
+        if rsp is None:
+            return None
+        if rsp.func_code & 0x80:
+            c.errors += 1
+        else:
+            cb = self.cb[fc]
+            if cb is not None:
+                db = self._FUNCTION_MAP[fc]
+                if fc in [5, 6]:
+                    cb(self, f.register, self._get_data(f.register, 1, self.context[db])[0])
+                else:
+                    cb(self, f.register, self._get_data(f.register, f.length, self.context[db]))
+        return self._encode(tid, unit, rsp)
+
+    def stats(self) -> list:
+        """Per client: peer, connected seconds, requests, errors and requests per second"""
+        now = ticks_ms()
+        out = []
+        for c in self.clients:
+            ms = max(ticks_diff(now, c.since), 1)
+            out.append(
+                {
+                    "peer": c.peer,
+                    "seconds": ms // 1000,
+                    "requests": c.requests,
+                    "errors": c.errors,
+                    "rate": c.requests * 1000 / ms,
+                    "idle": ticks_diff(now, c.last) // 1000,
+                }
+            )
+        return out
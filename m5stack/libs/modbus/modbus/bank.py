@@ -0,0 +1,316 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Register storage for ModbusSlave.
+#
+# A bank holds the registers of one table (coils, discrete inputs, holding
+# or input registers) as sorted, non-overlapping blocks of consecutive
+# addresses. Looking up an address is a binary search over the block start
+# addresses, so the cost of a request does not grow with the size of the
+# map. Each block is a bytearray already in PDU layout: registers as big
+# endian 16 bit words, coils and discrete inputs one bit each, LSB first.
+# Read responses are copied out of it with one slice assignment, and
+# aligned bit reads need no per-bit work.
+#
+# For compatibility a bank still looks like the old context list:
+#
+#   bank = RegisterBank(False, [{"register": 100, "value": [1, 2, 3]}])
+#   bank[0]  # -> {"register": 100, "value": [1, 2, 3]}
+#   bank == [{"register": 100, "value": [1, 2, 3]}]  # -> True
+
+
+def _bisect(a, x):
+    # index of the first item in sorted list a that is greater than x
+    lo = 0
+    hi = len(a)
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if x < a[mid]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+class RegisterBank:
+    def __init__(self, bits: bool = False, regs: list = None) -> None:
+        """Sorted blocks of registers of one type.
+
+        :param bool bits: True for coils and discrete inputs, False for 16 bit registers
+        :param list regs: Initial blocks as ``[{"register": n, "value": [...]}, ...]``
+        """
+        self.bits = bits
+        # start address, number of registers and data of each block, by address
+        self._starts = []
+        self._counts = []
+        self._data = []
+        if regs:
+            for reg in regs:
+                self.add_block(reg["register"], reg["value"])
+
+    def _pack(self, values) -> bytearray:
+        if self.bits:
+            data = bytearray((len(values) + 7) >> 3)
+            for i, v in enumerate(values):
+                if v:
+                    data[i >> 3] |= 1 << (i & 7)
+            return data
+        data = bytearray(len(values) * 2)
+        for i, v in enumerate(values):
+            data[2 * i] = v >> 8 & 0xFF
+            data[2 * i + 1] = v & 0xFF
+        return data
+
+    def _unpack(self, i: int, off: int = 0, length: int = None) -> list:
+        data = self._data[i]
+        end = self._counts[i] if length is None else min(off + length, self._counts[i])
+        if self.bits:
+            return [bool(data[j >> 3] >> (j & 7) & 1) for j in range(off, end)]
+        return [data[2 * j] << 8 | data[2 * j + 1] for j in range(off, end)]
+
+    def _put(self, i: int, start: int, values) -> None:
+        # replace block i, or insert a new one when i == len(self._starts)
+        if i == len(self._starts):
+            self._starts.append(start)
+            self._counts.append(len(values))
+            self._data.append(self._pack(values))
+        else:
+            self._starts[i] = start
+            self._counts[i] = len(values)
+            self._data[i] = self._pack(values)
+
+    def _insert(self, i: int, start: int, values) -> None:
+        self._starts.insert(i, start)
+        self._counts.insert(i, len(values))
+        self._data.insert(i, self._pack(values))
+
+    def _delete(self, i: int) -> None:
+        del self._starts[i]
+        del self._counts[i]
+        del self._data[i]
+
+    def _find(self, register: int) -> int:
+        """Index of the block holding ``register``, or -1"""
+        i = _bisect(self._starts, register) - 1
+        if i >= 0 and register < self._starts[i] + self._counts[i]:
+            return i
+        return -1
+
+    def _append(self, i: int, value) -> None:
+        n = self._counts[i]
+        data = self._data[i]
+        if self.bits:
+            if n & 7 == 0:
+                data.append(0)
+            if value:
+                data[n >> 3] |= 1 << (n & 7)
+        else:
+            data.append(value >> 8 & 0xFF)
+            data.append(value & 0xFF)
+        self._counts[i] = n + 1
+
+    def _merge_next(self, i: int) -> None:
+        # join block i + 1 onto block i when they became contiguous
+        if i + 1 >= len(self._starts):
+            return
+        if self._starts[i] + self._counts[i] != self._starts[i + 1]:
+            return
+        if self.bits and self._counts[i] & 7:
+            self._put(i, self._starts[i], self._unpack(i) + self._unpack(i + 1))
+        else:
+            self._data[i].extend(self._data[i + 1])
+            self._counts[i] += self._counts[i + 1]
+        self._delete(i + 1)
+
+    def add(self, register: int, value) -> None:
+        """Set ``register``, creating it (and merging blocks) if needed
+
+        :param int register: Register address
+        :param value: bool for bits, 0x0000 to 0xFFFF for registers
+        """
+        i = _bisect(self._starts, register) - 1
+        if i >= 0:
+            end = self._starts[i] + self._counts[i]
+            if register < end:
+                self._set(i, register - self._starts[i], value)
+                return
+            if register == end:
+                self._append(i, value)
+                self._merge_next(i)
+                return
+        if i + 1 < len(self._starts) and self._starts[i + 1] == register + 1:
+            self._put(i + 1, register, [value] + self._unpack(i + 1))
+            return
+        self._insert(i + 1, register, [value])
+
+    def add_block(self, register: int, values) -> None:
+        """Add consecutive registers starting at ``register``
+
+        :param int register: Address of the first value
+        :param list values: Values to add
+        """
+        if not values:
+            return
+        n = len(self._starts)
+        if n == 0 or register > self._starts[-1] + self._counts[-1]:
+            # the usual case when loading a map: a new block past the last one
+            self._put(n, register, values)
+            return
+        for v in values:
+            self.add(register, v)
+            register += 1
+
+    def remove(self, register: int) -> None:
+        """Remove ``register``, splitting its block if needed; unknown addresses are ignored
+
+        :param int register: Register address
+        """
+        i = self._find(register)
+        if i < 0:
+            return
+        start = self._starts[i]
+        n = self._counts[i]
+        off = register - start
+        if n == 1:
+            self._delete(i)
+        elif off == n - 1 and not self.bits:
+            self._counts[i] = n - 1
+            self._data[i] = self._data[i][: 2 * off]
+        elif off == 0 and not self.bits:
+            self._starts[i] = start + 1
+            self._counts[i] = n - 1
+            self._data[i] = self._data[i][2:]
+        else:
+            values = self._unpack(i)
+            if off == 0:
+                self._put(i, start + 1, values[1:])
+            elif off == n - 1:
+                self._put(i, start, values[:-1])
+            else:
+                self._put(i, start, values[:off])
+                self._insert(i + 1, register + 1, values[off + 1 :])
+
+    def _set(self, i: int, off: int, value) -> None:
+        data = self._data[i]
+        if self.bits:
+            if value:
+                data[off >> 3] |= 1 << (off & 7)
+            else:
+                data[off >> 3] &= ~(1 << (off & 7)) & 0xFF
+        else:
+            data[2 * off] = value >> 8 & 0xFF
+            data[2 * off + 1] = value & 0xFF
+
+    def get(self, register: int):
+        """Value of ``register``
+
+        :raises: KeyError if the register is not in the bank
+        """
+        i = self._find(register)
+        if i < 0:
+            raise KeyError("Register {} not found in context".format(register))
+        off = register - self._starts[i]
+        data = self._data[i]
+        if self.bits:
+            return bool(data[off >> 3] >> (off & 7) & 1)
+        return data[2 * off] << 8 | data[2 * off + 1]
+
+    def set(self, register: int, value) -> None:
+        """Set an existing register
+
+        :raises: KeyError if the register is not in the bank
+        """
+        i = self._find(register)
+        if i < 0:
+            raise KeyError("Register {} not found in context".format(register))
+        self._set(i, register - self._starts[i], value)
+
+    def set_block(self, register: int, values) -> None:
+        """Set consecutive registers; values past the end of the block are dropped
+
+        :raises: KeyError if ``register`` is not in the bank
+        """
+        i = self._find(register)
+        if i < 0:
+            raise KeyError("Register {} not found in context".format(register))
+        off = register - self._starts[i]
+        for k in range(min(len(values), self._counts[i] - off)):
+            self._set(i, off + k, values[k])
+
+    def check(self, register: int, length: int) -> bool:
+        """True if ``length`` registers from ``register`` all lie in one block"""
+        i = self._find(register)
+        return i >= 0 and register + length <= self._starts[i] + self._counts[i]
+
+    def values(self, register: int, length: int) -> list:
+        """Values of up to ``length`` registers from ``register``, or None"""
+        i = self._find(register)
+        if i < 0:
+            return None
+        return self._unpack(i, register - self._starts[i], length)
+
+    def read_into(self, register: int, length: int, buf, offset: int = 0) -> int:
+        """Write ``length`` registers in PDU layout to ``buf`` at ``offset``
+
+        The range must have passed :meth:`check`.
+
+        :returns: Number of bytes written
+        """
+        i = self._find(register)
+        off = register - self._starts[i]
+        data = self._data[i]
+        if not self.bits:
+            n = length * 2
+            memoryview(buf)[offset : offset + n] = memoryview(data)[2 * off : 2 * off + n]
+            return n
+        n = (length + 7) >> 3
+        j = off >> 3
+        shift = off & 7
+        if shift == 0:
+            memoryview(buf)[offset : offset + n] = memoryview(data)[j : j + n]
+        else:
+            last = len(data) - 1
+            for k in range(n):
+                b = data[j + k] >> shift
+                if j + k < last:
+                    b |= data[j + k + 1] << (8 - shift) & 0xFF
+                buf[offset + k] = b
+        if length & 7:
+            buf[offset + n - 1] &= (1 << (length & 7)) - 1
+        return n
+
+    def write_from(self, register: int, length: int, buf, offset: int = 0) -> None:
+        """Set ``length`` registers from PDU layout data in ``buf`` at ``offset``
+
+        The range must have passed :meth:`check`.
+        """
+        i = self._find(register)
+        off = register - self._starts[i]
+        data = self._data[i]
+        if not self.bits:
+            n = length * 2
+            memoryview(data)[2 * off : 2 * off + n] = memoryview(buf)[offset : offset + n]
+            return
+        for k in range(length):
+            self._set(i, off + k, buf[offset + (k >> 3)] >> (k & 7) & 1)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += len(self._starts)
+        return {"register": self._starts[i], "value": self._unpack(i)}
+
+    def __iter__(self):
+        for i in range(len(self._starts)):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, RegisterBank)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
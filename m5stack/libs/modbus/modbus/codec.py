@@ -0,0 +1,290 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Modbus RTU framing without per-frame allocations.
+#
+# crc16() looks up one 256-entry table per byte instead of shifting eight
+# times, and on MicroPython the loop is compiled with viper. RTUCodec
+# decodes into one reused RTUFrame whose data is a memoryview into the
+# receive buffer, and encodes into one transmit buffer:
+#
+#   codec = RTUCodec()
+#   n = uart.readinto(rx)
+#   frame = codec.decode(rx, n)  # None until a whole, valid frame arrived
+#   if frame is not None:
+#       uart.write(codec.encode(slave.handle_message(frame)))
+#
+# The RTUFrame returned by decode() and the memoryview returned by encode()
+# are only valid until the next call.
+
+import sys
+from array import array
+
+
+def _make_table():
+    table = array("H", [0] * 256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+        table[i] = crc
+    return table
+
+
+# CRC-16/MODBUS (poly 0xA001 reflected, init 0xFFFF) for every byte value
+CRC16_TABLE = _make_table()
+
+_viper = None
+if sys.implementation.name == "micropython":
+    try:
+        import micropython
+
+        @micropython.viper
+        def _viper(data: ptr8, n: int, table: ptr16) -> int:  # noqa: F821
+            crc = 0xFFFF
+            i = 0
+            while i < n:
+                crc = (crc >> 8) ^ table[(crc ^ data[i]) & 0xFF]
+                i += 1
+            return crc
+
+    except Exception:
+        _viper = None
+
+
+def crc16(data, start: int = 0, end: int = None) -> int:
+    """CRC-16/MODBUS of ``data[start:end]``
+
+    :param data: bytes, bytearray or memoryview
+    :param int start: first byte
+    :param int end: end of the range, defaults to ``len(data)``
+    :returns: CRC, sent low byte first
+    :rtype: int
+    """
+    if end is None:
+        end = len(data)
+    if _viper is not None:
+        if start:
+            data = memoryview(data)[start:end]
+            end -= start
+        return _viper(data, end, CRC16_TABLE)
+    table = CRC16_TABLE
+    crc = 0xFFFF
+    for i in range(start, end):
+        crc = (crc >> 8) ^ table[(crc ^ data[i]) & 0xFF]
+    return crc
+
+
+def frame_length(buf, n: int, response: bool = False) -> int:
+    """Size of the RTU frame at the start of ``buf``
+
+    :param buf: received bytes
+    :param int n: number of valid bytes in ``buf``
+    :param bool response: True to read ``buf`` as a response, False as a request
+    :returns: frame size in bytes, or 0 while too few bytes arrived to tell
+    :rtype: int
+    """
+    if n < 2:
+        return 0
+    fc = buf[1]
+    if fc & 0x80:
+        return 5
+    if response:
+        if fc <= 4:
+            return 5 + buf[2] if n >= 3 else 0
+        return 8
+    if fc in (0x0F, 0x10):
+        return 9 + buf[6] if n >= 7 else 0
+    return 8
+
+
+def pdu_size(f) -> int:
+    """Size of the PDU of a ModbusFrame (or RTUFrame)"""
+    fc = f.func_code
+    if fc & 0x80:
+        return 2
+    if f.type == "request":
+        if fc in (0x0F, 0x10):
+            return 6 + len(f.data)
+        return 5
+    if fc <= 4:
+        return 2 + len(f.data)
+    if fc in (0x05, 0x06):
+        return 3 + len(f.data)
+    return 5
+
+
+def write_pdu(f, buf, off: int) -> int:
+    """Serialise the PDU of ``f`` into ``buf`` at ``off``
+
+    :returns: Offset after the PDU
+    :rtype: int
+    """
+    fc = f.func_code
+    buf[off] = fc
+    off += 1
+    if fc & 0x80:
+        buf[off] = f.error_code
+        return off + 1
+    if f.type == "request" or fc not in (0x01, 0x02, 0x03, 0x04):
+        buf[off] = f.register >> 8
+        buf[off + 1] = f.register & 0xFF
+        off += 2
+        if fc in (0x05, 0x06):
+            n = len(f.data)
+            buf[off : off + n] = f.data
+            return off + n
+        buf[off] = f.length >> 8
+        buf[off + 1] = f.length & 0xFF
+        off += 2
+        if f.type == "response" or fc not in (0x0F, 0x10):
+            return off
+    n = len(f.data)
+    buf[off] = n
+    buf[off + 1 : off + 1 + n] = f.data
+    return off + 1 + n
+
+
+def decode_pdu(f, buf, start: int, end: int, response: bool = False) -> bool:
+    """Fill a frame object from the PDU in ``buf[start:end]``
+
+    ``f.data`` becomes a memoryview into ``buf``. The function code is not
+    checked against the supported ones.
+
+    :returns: False if the PDU size does not match its function code
+    :rtype: bool
+    """
+    n = end - start
+    fc = buf[start]
+    f.type = "response" if response else "request"
+    f.func_code = fc
+    f.register = None
+    f.length = None
+    f.data = None
+    f.error_code = None
+    if fc & 0x80:
+        f.error_code = buf[start + 1] if n == 2 else None
+        return n == 2
+    if response and fc <= 4:
+        if n < 2 or n != 2 + buf[start + 1]:
+            return False
+        f.data = memoryview(buf)[start + 2 : end]
+        return True
+    if n < 5:
+        return False
+    f.register = buf[start + 1] << 8 | buf[start + 2]
+    if fc in (0x05, 0x06):
+        f.data = memoryview(buf)[start + 3 : end]
+        return n == 5
+    f.length = buf[start + 3] << 8 | buf[start + 4]
+    if not response and fc in (0x0F, 0x10):
+        if n < 6 or n != 6 + buf[start + 5]:
+            return False
+        f.data = memoryview(buf)[start + 6 : end]
+        return True
+    return n == 5
+
+
+class RTUFrame:
+    def __init__(self) -> None:
+        """A decoded RTU frame, with the attributes of ModbusRTUFrame
+
+        ``data`` is a memoryview into the buffer it was decoded from.
+        """
+        self.type = "request"
+        self.device_addr = 0
+        self.func_code = 0
+        self.register = None
+        self.length = None
+        self.data = None
+        self.error_code = None
+        self.size = 0
+
+
+class RTUCodec:
+    def __init__(self, size: int = 256) -> None:
+        """Reusable RTU frame encoder and decoder
+
+        :param int size: Transmit buffer size; 256 holds any RTU frame
+        """
+        self.tx = bytearray(size)
+        self._tx = memoryview(self.tx)
+        self.frame = RTUFrame()
+
+    def decode(self, buf, n: int = None, response: bool = False):
+        """Decode the frame at the start of ``buf``
+
+        :param buf: received bytes
+        :param int n: number of valid bytes, defaults to ``len(buf)``
+        :param bool response: True to decode a response, False a request
+        :returns: The codec's RTUFrame, or None if the frame is incomplete,
+                  has a bad CRC or an unknown function code. ``frame.size``
+                  is the number of bytes it used.
+        """
+        if n is None:
+            n = len(buf)
+        size = frame_length(buf, n, response)
+        if size == 0 or size > n:
+            return None
+        if crc16(buf, 0, size - 2) != buf[size - 2] | buf[size - 1] << 8:
+            return None
+        fc = buf[1]
+        if fc & 0x7F not in (0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x0F, 0x10):
+            return None
+        f = self.frame
+        if not decode_pdu(f, buf, 1, size - 2, response):
+            return None
+        f.device_addr = buf[0]
+        f.size = size
+        return f
+
+    def _finish(self, n: int):
+        tx = self.tx
+        crc = crc16(tx, 0, n)
+        tx[n] = crc & 0xFF
+        tx[n + 1] = crc >> 8
+        return self._tx[: n + 2]
+
+    def encode(self, f, device_addr: int = None):
+        """Serialise a ModbusFrame or RTUFrame into the transmit buffer
+
+        :param f: frame to send
+        :param int device_addr: address to use instead of ``f.device_addr``
+        :returns: memoryview of the encoded frame
+        """
+        self.tx[0] = f.device_addr if device_addr is None else device_addr
+        return self._finish(write_pdu(f, self.tx, 1))
+
+    def wrap(self, device_addr: int, pdu):
+        """Frame a raw PDU (e.g. from a Modbus TCP request) for the RTU bus
+
+        :returns: memoryview of the encoded frame
+        """
+        n = len(pdu)
+        self.tx[0] = device_addr
+        self._tx[1 : 1 + n] = pdu
+        return self._finish(1 + n)
+
+    def request(self, device_addr: int, func_code: int, register: int, value: int, data=None):
+        """Encode a request: ``value`` is the quantity, or the value for 0x05 / 0x06
+
+        :returns: memoryview of the encoded frame
+        """
+        tx = self.tx
+        tx[0] = device_addr
+        tx[1] = func_code
+        tx[2] = register >> 8
+        tx[3] = register & 0xFF
+        tx[4] = value >> 8 & 0xFF
+        tx[5] = value & 0xFF
+        n = 6
+        if func_code in (0x0F, 0x10):
+            k = len(data)
+            tx[6] = k
+            self._tx[7 : 7 + k] = data
+            n = 7 + k
+        return self._finish(n)
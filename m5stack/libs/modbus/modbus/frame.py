@@ -3,6 +3,8 @@
 #
 # SPDX-License-Identifier: MIT
 
+from .codec import crc16, pdu_size, write_pdu
+
 
 class ModbusFrame:
     def __init__(
@@ -165,10 +167,14 @@ class ModbusRTUFrame(ModbusFrame):
         self.frame = None
 
     def _create_frame(self) -> None:
-        self._create_pdu()
-        self.frame = bytearray([self.device_addr]) + self.pdu
-        crc = ModbusRTUFrame._crc16(self.frame)
-        self.frame += bytearray([crc & 0xFF, crc >> 8])
+        n = pdu_size(self) + 1
+        frame = bytearray(n + 2)
+        frame[0] = self.device_addr
+        write_pdu(self, frame, 1)
+        crc = crc16(frame, 0, n)
+        frame[n] = crc & 0xFF
+        frame[n + 1] = crc >> 8
+        self.frame = frame
 
     def __str__(self) -> str:
         return "<ModbusRTUFrame ({}): device: {}, func_code: {}, frame:{}>".format(
@@ -180,19 +186,9 @@ class ModbusRTUFrame(ModbusFrame):
 
     @classmethod
     def _crc16(cls, data: bytearray) -> int:
-        offset = 0
-        length = len(data)
-        if data is None or offset < 0 or offset > len(data) - 1 and offset + length > len(data):
+        if not data:
             return 0
-        crc = 0xFFFF
-        for i in range(0, length):
-            crc ^= data[offset + i]
-            for j in range(0, 8):
-                if (crc & 1) > 0:
-                    crc = (crc >> 1) ^ 0xA001
-                else:
-                    crc = crc >> 1
-        return crc
+        return crc16(data)
 
     @classmethod
     def parse_frame(
@@ -279,7 +275,7 @@ class ModbusRTUFrame(ModbusFrame):
                 )
 
             if f is not None:
-                print(f)
+                verbose and print(f)
                 return f
 
         # raise ValueError("Could not parse Frame " + " ".join(["{:02x}".format(x) for x in frame]))
@@ -298,7 +294,7 @@ class ModbusRTUFrame(ModbusFrame):
             func_code = frame[1]
             if func_code not in [0x05, 0x06]:
                 return False
-            return cls._crc16(frame[0:6]) == (frame[7] << 8) + frame[6]
+            return crc16(frame, 0, 6) == (frame[7] << 8) + frame[6]
         except:
             return False
 
@@ -314,11 +310,11 @@ class ModbusRTUFrame(ModbusFrame):
         try:
             func_code = frame[1]
             if func_code in [0x01, 0x02, 0x03, 0x04]:
-                return cls._crc16(frame[0:6]) == (frame[7] << 8) + frame[6]
+                return crc16(frame, 0, 6) == (frame[7] << 8) + frame[6]
             if func_code in [0x10, 0x0F]:
                 bc = frame[6]
                 if len(frame) >= 8 + bc:
-                    return cls._crc16(frame[0 : 7 + bc]) == (frame[8 + bc] << 8) + frame[7 + bc]
+                    return crc16(frame, 0, 7 + bc) == (frame[8 + bc] << 8) + frame[7 + bc]
                 else:
                     return False
         except:
@@ -338,11 +334,11 @@ class ModbusRTUFrame(ModbusFrame):
             if func_code in [0x01, 0x02, 0x03, 0x04]:
                 bc = frame[2]
                 if len(frame) >= bc + 5:
-                    return cls._crc16(frame[0 : 3 + bc]) == (frame[4 + bc] << 8) + frame[3 + bc]
+                    return crc16(frame, 0, 3 + bc) == (frame[4 + bc] << 8) + frame[3 + bc]
             if func_code in [0x10, 0x0F]:
-                return cls._crc16(frame[0:6]) == (frame[7] << 8) + frame[6]
+                return crc16(frame, 0, 6) == (frame[7] << 8) + frame[6]
             if func_code in [0x81, 0x82, 0x83, 0x84, 0x85, 0x86, 0x8F, 0x90]:
-                return cls._crc16(frame[0:3]) == (frame[4] << 8) + frame[3]
+                return crc16(frame, 0, 3) == (frame[4] << 8) + frame[3]
         except:
             return False
 
@@ -0,0 +1,332 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Modbus TCP to RTU gateway.
+#
+#   from machine import UART
+#   from modbus.gateway import ModbusGateway, RTUBus
+#
+#   bus = RTUBus.from_uart(UART(1, 9600, tx=17, rx=18), 9600, cache_ttl=200)
+#   gw = ModbusGateway("0.0.0.0", 502, timeout=1000)
+#   gw.add_route(1, bus)          # unit id 1 -> RTU address 1
+#   gw.add_route(10, bus, 2)      # unit id 10 -> RTU address 2
+#   asyncio.run(gw.run_async())
+#
+# Requests from any number of TCP clients are queued per bus and sent one
+# at a time. A queued request carries the client and transaction id it came
+# from, so answers go back to the right connection under the right id even
+# when several clients pipeline. Writes are sent before reads; a request
+# still queued or unanswered after `timeout` ms is answered with exception
+# 0x0B (target device failed to respond). With `cache_ttl`, a read that was
+# answered less than `cache_ttl` ms ago, or that is already queued, is
+# answered from that one bus transaction; a write to an address drops the
+# cached reads of that address.
+#
+# Unit ids without a route are answered from the gateway's own context if
+# they match its device address, and with exception 0x0A otherwise.
+
+import asyncio
+import heapq
+import time
+from .aio import AsyncModbusTCPServer
+from .codec import RTUCodec, decode_pdu, frame_length
+
+try:
+    from time import ticks_ms, ticks_diff, ticks_add
+except ImportError:
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+    def ticks_add(a, b):
+        return a + b
+
+
+_MBAP = 7
+_FUNCTION_CODES = (0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x0F, 0x10)
+
+
+class _Job:
+    def __init__(self, address, pdu, deadline, key) -> None:
+        self.address = address
+        self.pdu = pdu
+        self.deadline = deadline
+        self.key = key
+        self.waiters = []
+
+
+class RTUBus:
+    def __init__(
+        self,
+        reader,
+        writer,
+        baudrate: int = 9600,
+        cache_ttl: int = 0,
+        max_queue: int = 32,
+        verbose: bool = False,
+    ) -> None:
+        """One RTU line, driven by asyncio streams
+
+        :param reader: asyncio stream the responses are read from
+        :param writer: asyncio stream the requests are written to
+        :param int baudrate: Line speed, for the 3.5 character gap between frames
+        :param int cache_ttl: Milliseconds a read response is reused, 0 to disable
+        :param int max_queue: Requests that may wait for the bus
+        :param bool verbose: If True, print debug messages
+        """
+        self.reader = reader
+        self.writer = writer
+        self.cache_ttl = cache_ttl
+        self.max_queue = max_queue
+        self._verbose = verbose
+        self._gap = max(1, 38500 // baudrate) if baudrate <= 19200 else 2
+        self._codec = RTUCodec()
+        self._rx = bytearray(256)
+        self._queue = []
+        self._seq = 0
+        self._pending = {}
+        self._cache = {}
+        self._event = asyncio.Event()
+        self._stale = False
+        self.transactions = 0
+        self.timeouts = 0
+        self.hits = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_uart(cls, uart, baudrate: int = 9600, **kwargs) -> "RTUBus":
+        """Bus on a machine.UART"""
+        return cls(asyncio.StreamReader(uart), asyncio.StreamWriter(uart, {}), baudrate, **kwargs)
+
+    def request(
+        self, address: int, pdu: bytes, cb, priority: int = 1, timeout: int = 1000
+    ) -> bool:
+        """Queue ``pdu`` for ``address``; ``cb(response_pdu)`` is called with the answer
+
+        :param int priority: Lower goes first, equal priorities in order
+        :param int timeout: Milliseconds until the request is answered with 0x0B
+        :returns: False if the queue is full
+        """
+        key = None
+        if pdu[0] <= 0x04:
+            key = (address, pdu)
+            if self.cache_ttl:
+                hit = self._cache.get(key)
+                if hit is not None and ticks_diff(ticks_ms(), hit[1]) < self.cache_ttl:
+                    self.hits += 1
+                    cb(hit[0])
+                    return True
+                job = self._pending.get(key)
+                if job is not None:
+                    self.hits += 1
+                    job.waiters.append(cb)
+                    return True
+        else:
+            self._invalidate(address)
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return False
+        job = _Job(address, pdu, ticks_add(ticks_ms(), timeout), key)
+        job.waiters.append(cb)
+        if key is not None and self.cache_ttl:
+            self._pending[key] = job
+        self._seq += 1
+        heapq.heappush(self._queue, (priority, self._seq, job))
+        self._event.set()
+        return True
+
+    def _invalidate(self, address: int) -> None:
+        if self._cache:
+            for key in [k for k in self._cache if k[0] == address]:
+                del self._cache[key]
+
+    def _done(self, job, rsp) -> None:
+        if job.key is not None and self._pending.get(job.key) is job:
+            del self._pending[job.key]
+        for cb in job.waiters:
+            cb(rsp)
+
+    async def run(self):
+        """Send the queued requests one at a time, until cancelled"""
+        while True:
+            if not self._queue:
+                self._event.clear()
+                await self._event.wait()
+                continue
+            job = heapq.heappop(self._queue)[2]
+            remaining = ticks_diff(job.deadline, ticks_ms())
+            rsp = None
+            if remaining > 0:
+                try:
+                    rsp = await self._transact(job, remaining)
+                except (OSError, asyncio.TimeoutError):
+                    self._stale = True
+                await asyncio.sleep(self._gap / 1000)
+            if rsp is None:
+                self.timeouts += 1
+                self._verbose and print("[GATEWAY] no answer from {}".format(job.address))
+                rsp = bytes((job.pdu[0] | 0x80, 0x0B))
+            elif job.key is not None and self.cache_ttl and not rsp[0] & 0x80:
+                self._cache[job.key] = (rsp, ticks_ms())
+            self._done(job, rsp)
+
+    async def _flush(self):
+        # drop a late answer to a request that timed out
+        try:
+            while await asyncio.wait_for(self.reader.read(256), self._gap / 1000):
+                pass
+        except asyncio.TimeoutError:
+            pass
+        self._stale = False
+
+    async def _transact(self, job, timeout: int):
+        if self._stale:
+            await self._flush()
+        self.transactions += 1
+        self.writer.write(self._codec.wrap(job.address, job.pdu))
+        await self.writer.drain()
+        rx = self._rx
+        n = 0
+        deadline = ticks_add(ticks_ms(), timeout)
+        while True:
+            size = frame_length(rx, n, True)
+            if size and n >= size:
+                break
+            remaining = ticks_diff(deadline, ticks_ms())
+            if remaining <= 0:
+                self._stale = True
+                return None
+            data = await asyncio.wait_for(self.reader.read(len(rx) - n), remaining / 1000)
+            if not data:
+                raise OSError("bus closed")
+            rx[n : n + len(data)] = data
+            n += len(data)
+        f = self._codec.decode(rx, n, response=True)
+        if f is None or f.device_addr != job.address or f.func_code & 0x7F != job.pdu[0]:
+            self._stale = True
+            return None
+        return bytes(rx[1 : f.size - 2])
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._queue),
+            "transactions": self.transactions,
+            "timeouts": self.timeouts,
+            "hits": self.hits,
+            "dropped": self.dropped,
+        }
+
+
+class ModbusGateway(AsyncModbusTCPServer):
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 502,
+        idle_timeout: int = 60,
+        max_clients: int = 8,
+        verbose: bool = False,
+        timeout: int = 1000,
+        *args,
+        **kwargs,
+    ) -> None:
+        """Init a Modbus TCP to RTU gateway
+
+        :param str host: Server host address
+        :param int port: Server port number, 0 for any free port
+        :param int idle_timeout: Seconds without a request before a client is dropped
+        :param int max_clients: Connections beyond this are closed at once
+        :param bool verbose: If True, print debug messages
+        :param int timeout: Milliseconds a forwarded request may take, queueing included
+        """
+        super(ModbusGateway, self).__init__(
+            host, port, idle_timeout, max_clients, verbose, *args, **kwargs
+        )
+        self.timeout = timeout
+        self.routes = {}
+        self.buses = []
+        self._tasks = []
+
+    def add_route(
+        self, unit_id: int, bus: RTUBus, address: int = None, priority: int = 1, timeout=None
+    ) -> None:
+        """Forward requests for ``unit_id`` to RTU ``address`` (default: the same) on ``bus``
+
+        :param int priority: Lower is served first when several routes share a bus
+        :param int timeout: Milliseconds, instead of the gateway's timeout
+        """
+        if bus not in self.buses:
+            self.buses.append(bus)
+            if self._server is not None:
+                self._tasks.append(asyncio.create_task(bus.run()))
+        self.routes[unit_id] = (
+            bus,
+            unit_id if address is None else address,
+            priority,
+            self.timeout if timeout is None else timeout,
+        )
+
+    async def start(self):
+        server = await super(ModbusGateway, self).start()
+        for bus in self.buses:
+            self._tasks.append(asyncio.create_task(bus.run()))
+        return server
+
+    def close(self) -> None:
+        super(ModbusGateway, self).close()
+        for t in self._tasks:
+            t.cancel()
+        self._tasks = []
+
+    def _request(self, c, buf, start: int, end: int):
+        unit = buf[start + 6]
+        route = self.routes.get(unit)
+        if route is None:
+            if self.ignore_unit_id is True or unit == self._device_address:
+                return super(ModbusGateway, self)._request(c, buf, start, end)
+            c.requests += 1
+            c.errors += 1
+            self.requests += 1
+            return self._exception(
+                buf[start] << 8 | buf[start + 1], unit, buf[start + _MBAP], 0x0A
+            )
+        c.requests += 1
+        c.last = ticks_ms()
+        self.requests += 1
+        tid = buf[start] << 8 | buf[start + 1]
+        fc = buf[start + _MBAP]
+        if fc not in _FUNCTION_CODES:
+            c.errors += 1
+            return self._exception(tid, unit, fc & 0x7F, 0x01)
+        if not decode_pdu(self._frame, buf, start + _MBAP, end):
+            c.errors += 1
+            return self._exception(tid, unit, fc, 0x03)
+        bus, address, priority, timeout = route
+
+        def reply(pdu):
+            self._reply(c, tid, unit, pdu)
+
+        # writes before reads of the same priority
+        priority = priority * 2 + (fc <= 0x04)
+        if not bus.request(address, bytes(buf[start + _MBAP : end]), reply, priority, timeout):
+            c.errors += 1
+            return self._exception(tid, unit, fc, 0x06)
+        return None
+
+    def _reply(self, c, tid: int, unit: int, pdu) -> None:
+        if c not in self.clients:
+            return
+        if pdu[0] & 0x80:
+            c.errors += 1
+        n = len(pdu) + 1
+        c.writer.write(bytes((tid >> 8, tid & 0xFF, 0, 0, n >> 8, n & 0xFF, unit)) + pdu)
+        asyncio.create_task(self._drain(c))
+
+    async def _drain(self, c):
+        try:
+            await c.writer.drain()
+        except OSError:
+            c.errors += 1
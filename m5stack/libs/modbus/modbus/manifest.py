@@ -6,8 +6,13 @@ package(
     "modbus",
     (
         "__init__.py",
+        "aio.py",
+        "bank.py",
+        "codec.py",
         "frame.py",
+        "gateway.py",
         "master.py",
+        "planner.py",
         "slave.py",
     ),
     base_path="..",
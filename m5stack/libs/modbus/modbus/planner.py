@@ -0,0 +1,249 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Poll many scattered points with few Modbus transactions.
+#
+#   from modbus import ModbusTCPClient
+#   from modbus.planner import PollPlanner
+#
+#   planner = PollPlanner(ModbusTCPClient("192.168.1.10"), max_gap=8)
+#   planner.add("temp", 1, "input_registers", 30, "int16", period=1000)
+#   planner.add("energy", 1, "input_registers", 40, "uint32", period=1000)
+#   planner.add("pump", 2, "coils", 5, "bool", period=200)
+#   while True:
+#       planner.poll()
+#       print(planner.get("temp"))
+#
+# Points of one device, table and period are sorted by address and merged
+# into reads of at most 125 registers (2000 bits). A gap of up to `max_gap`
+# unused registers (16 times that in bits) is read along rather than paid
+# for with another round trip. Each read runs when its period is due.
+
+import struct
+from .master import ModbusMaster
+
+try:
+    from time import ticks_ms, ticks_diff, ticks_add
+except ImportError:
+    import time
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+    def ticks_add(a, b):
+        return a + b
+
+
+# table -> function code
+_TABLES = {
+    "coils": 1,
+    "discrete_inputs": 2,
+    "holding_registers": 3,
+    "input_registers": 4,
+}
+
+# type -> (struct format, size in registers)
+_TYPES = {
+    "bool": (None, 1),
+    "uint16": (">H", 1),
+    "int16": (">h", 1),
+    "uint32": (">I", 2),
+    "int32": (">i", 2),
+    "float32": (">f", 2),
+}
+
+MAX_REGISTERS = 125
+MAX_BITS = 2000
+
+
+class Point:
+    def __init__(self, name, device, table, address, dtype, period) -> None:
+        self.name = name
+        self.device = device
+        self.table = table
+        self.address = address
+        self.type = dtype
+        self.period = period
+        self.size = _TYPES[dtype][1]
+        self.value = None
+        self.time = None
+
+
+class Read:
+    def __init__(self, device, table, start, period) -> None:
+        """One transaction of a plan: ``count`` registers of ``table`` from ``start``"""
+        self.device = device
+        self.table = table
+        self.start = start
+        self.count = 0
+        self.period = period
+        self.points = []
+        self.due = None
+
+    def __repr__(self) -> str:
+        return "<Read dev={} {} {}+{} every {}ms, {} points>".format(
+            self.device, self.table, self.start, self.count, self.period, len(self.points)
+        )
+
+
+class PollPlanner:
+    def __init__(
+        self,
+        master: ModbusMaster,
+        max_gap: int = 8,
+        max_registers: int = MAX_REGISTERS,
+        max_bits: int = MAX_BITS,
+        timeout: int = 2000,
+    ) -> None:
+        """Coalescing poll scheduler on top of a ModbusMaster
+
+        :param master: ModbusTCPClient or ModbusRTUMaster
+        :param int max_gap: Unused registers a read may span to join two points
+        :param int max_registers: Largest register read (at most 125)
+        :param int max_bits: Largest coil / discrete input read (at most 2000)
+        :param int timeout: Timeout of each transaction in milliseconds
+        """
+        self.master = master
+        self.max_gap = max_gap
+        self.max_registers = min(max_registers, MAX_REGISTERS)
+        self.max_bits = min(max_bits, MAX_BITS)
+        self.timeout = timeout
+        self.on_change = None
+        self._points = {}
+        self._plan = None
+        self.transactions = 0
+        self.naive = 0
+        self.errors = 0
+
+    def add(self, name, device: int, table: str, address: int, dtype="uint16", period=1000):
+        """Declare a point to poll
+
+        :param name: Key of the value in :meth:`get`
+        :param int device: Slave address / unit id
+        :param str table: coils, discrete_inputs, holding_registers or input_registers
+        :param int address: Register address
+        :param str dtype: bool, uint16, int16, uint32, int32 or float32 (high word first)
+        :param int period: Poll period in milliseconds
+        :raises: ValueError for an unknown table or type
+        """
+        if table not in _TABLES:
+            raise ValueError("unknown table {}".format(table))
+        if dtype not in _TYPES:
+            raise ValueError("unknown type {}".format(dtype))
+        if (dtype == "bool") != (table in ("coils", "discrete_inputs")):
+            raise ValueError("type {} does not fit {}".format(dtype, table))
+        self._points[name] = Point(name, device, table, address, dtype, period)
+        self._plan = None
+
+    def remove(self, name) -> None:
+        self._points.pop(name, None)
+        self._plan = None
+
+    def plan(self) -> list:
+        """The reads the points are merged into, built again after add() / remove()"""
+        if self._plan is not None:
+            return self._plan
+        groups = {}
+        for p in self._points.values():
+            groups.setdefault((p.device, p.table, p.period), []).append(p)
+        reads = []
+        for key in sorted(groups):
+            device, table, period = key
+            bits = table in ("coils", "discrete_inputs")
+            limit = self.max_bits if bits else self.max_registers
+            gap = self.max_gap * 16 if bits else self.max_gap
+            read = None
+            for p in sorted(groups[key], key=lambda p: p.address):
+                end = p.address + p.size
+                if (
+                    read is None
+                    or p.address - (read.start + read.count) > gap
+                    or end - read.start > limit
+                ):
+                    read = Read(device, table, p.address, period)
+                    reads.append(read)
+                read.count = max(read.count, end - read.start)
+                read.points.append(p)
+        self._plan = reads
+        return reads
+
+    def _due(self, now) -> list:
+        due = []
+        for r in self.plan():
+            if r.due is None or ticks_diff(now, r.due) >= 0:
+                r.due = ticks_add(now, r.period)
+                due.append(r)
+        return due
+
+    def _publish(self, r, data, now) -> None:
+        self.transactions += 1
+        self.naive += len(r.points)
+        if data is None:
+            self.errors += 1
+            return
+        for p in r.points:
+            off = p.address - r.start
+            if p.type == "bool":
+                value = bool(data[off >> 3] >> (off & 7) & 1)
+            else:
+                value = struct.unpack_from(_TYPES[p.type][0], data, off * 2)[0]
+            p.time = now
+            if value != p.value:
+                p.value = value
+                if self.on_change is not None:
+                    self.on_change(p.name, value)
+
+    def poll(self, now=None) -> int:
+        """Run the reads that are due; returns how many were made"""
+        if now is None:
+            now = ticks_ms()
+        due = self._due(now)
+        for r in due:
+            try:
+                data = self.master._read_registers(
+                    r.device, r.start, r.count, _TABLES[r.table], timeout=self.timeout
+                )
+            except (OSError, AttributeError, ValueError):
+                data = None
+            self._publish(r, data, now)
+        return len(due)
+
+    async def poll_async(self, now=None) -> int:
+        """Run the reads that are due (async); returns how many were made"""
+        if now is None:
+            now = ticks_ms()
+        due = self._due(now)
+        for r in due:
+            try:
+                data = await self.master._read_registers_async(
+                    r.device, r.start, r.count, _TABLES[r.table], timeout=self.timeout
+                )
+            except (OSError, AttributeError, ValueError):
+                data = None
+            self._publish(r, data, now)
+        return len(due)
+
+    def get(self, name, default=None):
+        """Last value read for a point"""
+        p = self._points.get(name)
+        if p is None or p.value is None:
+            return default
+        return p.value
+
+    def values(self) -> dict:
+        return {name: p.value for name, p in self._points.items()}
+
+    def stats(self) -> dict:
+        """Transactions made, the one-per-point count they replaced, and the difference"""
+        return {
+            "points": len(self._points),
+            "reads": len(self.plan()),
+            "transactions": self.transactions,
+            "naive": self.naive,
+            "saved": self.naive - self.transactions,
+            "errors": self.errors,
+        }
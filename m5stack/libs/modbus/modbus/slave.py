@@ -9,8 +9,8 @@
 # - documentation
 
 from .frame import ModbusRTUFrame, ModbusTCPFrame
+from .bank import RegisterBank
 import socket
-import math
 import asyncio
 import sys
 import struct
@@ -58,18 +58,24 @@ class ModbusSlave:
         :param int device_address: Device address for RTU mode
         """
         self.sl_type = sl_type
-        self.context = context
         self.ignore_unit_id = ignore_unit_id
         self._device_address = device_address
         self.forward_message = None
         self.stopped = False
         if context is None:
-            self.context = {
+            context = {
                 "discrete_inputs": [],
                 "coils": [],
                 "input_registers": [],
                 "holding_registers": [],
             }
+        # register type -> RegisterBank, which also compares equal to the
+        # [{"register": n, "value": [...]}, ...] lists it is built from
+        self.context = {}
+        for reg_type, regs in context.items():
+            if not isinstance(regs, RegisterBank):
+                regs = RegisterBank(reg_type in ("coils", "discrete_inputs"), regs)
+            self.context[reg_type] = regs
         self.cb = {
             0x02: None,  # Read Discrete Inputs
             0x01: None,  # Read Coils
@@ -109,34 +115,7 @@ class ModbusSlave:
                 )
             )
 
-        added = False
-        for reg in self.context[reg_type]:
-            if reg["register"] <= register < reg["register"] + len(reg["value"]):
-                # if register exists in the context
-                idx = register - reg["register"]
-                reg["value"][idx] = value
-                added = True
-            elif reg["register"] + 1 == register:
-                # if register is at the end of the context
-                reg["value"].append(value)
-                added = True
-
-        if not added:
-            # if register is not in the context
-            self.context[reg_type].append({"register": register, "value": [value]})
-
-        # sort the registers in the context
-        regs = self.context[reg_type]
-        for i in range(len(regs)):
-            for j in range(len(regs)):
-                if regs[i]["register"] < regs[j]["register"]:
-                    regs[i], regs[j] = regs[j], regs[i]
-
-        # Merge registers with consecutive addresses
-        for i in range(len(regs) - 1, -1, -1):
-            if regs[i]["register"] == regs[i - 1]["register"] + len(regs[i - 1]["value"]):
-                regs[i - 1]["value"].extend(regs[i]["value"])
-                regs.pop(i)
+        self.context[reg_type].add(register, value)
 
     def _remove_register_from_context(self, reg_type, register):
         """Remove a register from the context
@@ -152,37 +131,7 @@ class ModbusSlave:
                 )
             )
 
-        new_regs = []
-        regs = self.context[reg_type]
-        for i in range(len(regs) - 1, -1, -1):
-            quantity = len(regs[i]["value"])
-            if regs[i]["register"] <= register < regs[i]["register"] + quantity:
-                idx = register - regs[i]["register"]
-                if quantity == 1:
-                    del regs[i]
-                elif idx == 0:
-                    regs[i]["register"] += 1
-                    regs[i]["value"].pop(0)
-                elif idx == quantity - 1:
-                    regs[i]["value"].pop(-1)
-                elif 0 < idx < quantity - 1:
-                    new_regs.append(
-                        {"register": regs[i]["register"], "value": regs[i]["value"][0:idx]}
-                    )
-                    new_regs.append(
-                        {
-                            "register": regs[i]["register"] + idx + 1,
-                            "value": regs[i]["value"][idx + 1 :],
-                        }
-                    )
-                    del regs[i]
-
-        regs.extend(new_regs)
-        # sort the registers in the context
-        for i in range(len(regs)):
-            for j in range(len(regs)):
-                if regs[i]["register"] < regs[j]["register"]:
-                    regs[i], regs[j] = regs[j], regs[i]
+        self.context[reg_type].remove(register)
 
     def add_coil(self, register: int, value: bool) -> None:
         """Add a coil to the modbus register dictionary
@@ -259,12 +208,7 @@ class ModbusSlave:
                 )
             )
 
-        for reg in self.context[reg_type]:
-            if reg["register"] <= register < reg["register"] + len(reg["value"]):
-                idx = register - reg["register"]
-                return reg["value"][idx]
-
-        raise KeyError("Register {} not found in context".format(register))
+        return self.context[reg_type].get(register)
 
     def _set_reg_data(self, reg_type, register, value):
         """Set register data in context
@@ -281,13 +225,7 @@ class ModbusSlave:
                 )
             )
 
-        for reg in self.context[reg_type]:
-            if reg["register"] <= register < reg["register"] + len(reg["value"]):
-                idx = register - reg["register"]
-                reg["value"][idx] = value
-                return
-
-        raise KeyError("Register {} not found in context".format(register))
+        self.context[reg_type].set(register, value)
 
     def _set_reg_datablock(self, reg_type: str, register: int, block: list):
         """Set multiple register data in context
@@ -304,17 +242,7 @@ class ModbusSlave:
                 )
             )
 
-        for reg in self.context[reg_type]:
-            if reg["register"] <= register < reg["register"] + len(reg["value"]):
-                idx = register - reg["register"]
-                for i in range(idx, idx + len(block)):
-                    reg["value"][i] = block[i - idx]
-                # for new_value in block:
-                #     reg["value"][idx] = new_value
-                #     idx += 1
-                return
-
-        raise KeyError("Register {} not found in context".format(register))
+        self.context[reg_type].set_block(register, block)
 
     def get_coil(self, register: int) -> bool:
         """Get the coil value
@@ -471,17 +399,11 @@ class ModbusSlave:
                         error_code=0x03,
                     )
             if self._check_register(frame.register, frame.length, self.context[db]):
-                data = self._get_data(frame.register, frame.length, self.context[db])
-                res = None
                 if frame.func_code in [1, 2]:
-                    res = bytearray([0x00] * math.ceil(frame.length / 8))
-                    for i in range(frame.length):
-                        if data[i] is True or data[i] == 0x01:
-                            res[i // 8] |= 0x01 << (i % 8)
+                    res = bytearray((frame.length + 7) >> 3)
                 else:
                     res = bytearray(frame.length * 2)
-                    for i in range(frame.length):
-                        struct.pack_into(">H", res, i * 2, data[i])
+                self.context[db].read_into(frame.register, frame.length, res)
                 if self.sl_type == "tcp":
                     return ModbusTCPFrame(
                         transaction_id=frame.transaction_id,
@@ -640,9 +562,7 @@ class ModbusSlave:
                             error_code=0x03,
                         )
                 if self._check_register(frame.register, length, self.context[db]):
-                    self.set_multi_holding_register(
-                        frame.register, struct.unpack(">" + "H" * frame.length, data)
-                    )
+                    self.context[db].write_from(frame.register, length, data)
                 else:
                     # No: Starting Address == OK AND Starting Address + Quantity of Outputs == OK
                     if self.sl_type == "tcp":
@@ -704,31 +624,22 @@ class ModbusSlave:
 
         :param int register: Starting register address
         :param int length: Number of registers
-        :param list regs: Register context
+        :param RegisterBank regs: Register context
         :returns: True if valid, False otherwise
         :rtype: bool
         """
-        for reg in regs:
-            quantity = len(reg["value"])
-            if reg["register"] <= register < reg["register"] + quantity:
-                if reg["register"] + quantity >= register + length:
-                    return True
-        return False
+        return regs.check(register, length)
 
     def _get_data(self, register, length, regs):
         """Get data from register context
 
         :param int register: Starting register address
         :param int length: Number of registers
-        :param list regs: Register context
+        :param RegisterBank regs: Register context
         :returns: List of register values
         :rtype: list
         """
-        for reg in regs:
-            if reg["register"] <= register < reg["register"] + len(reg["value"]):
-                return reg["value"][
-                    (register - reg["register"]) : (register - reg["register"] + length)
-                ]
+        return regs.values(register, length)
 
     def _set_data(self, register, length, data_Block, data):
         """Set data in register block
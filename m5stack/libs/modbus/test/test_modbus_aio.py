@@ -0,0 +1,150 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import sys
+
+if sys.implementation.name == "cpython":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import unittest
+import asyncio
+import struct
+from modbus.aio import AsyncModbusTCPServer
+
+
+def adu(tid, unit, pdu):
+    return struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + pdu
+
+
+def read_req(tid, func_code, register, quantity, unit=1):
+    return adu(tid, unit, struct.pack(">BHH", func_code, register, quantity))
+
+
+async def read_adu(reader):
+    head = await reader.readexactly(7)
+    tid, _, length, unit = struct.unpack(">HHHB", head)
+    return tid, unit, await reader.readexactly(length - 1)
+
+
+class Test(unittest.TestCase):
+    def run_server(self, client, **kwargs):
+        srv = AsyncModbusTCPServer(
+            "127.0.0.1",
+            0,
+            context={
+                "coils": [{"register": 0, "value": [True, False] * 8}],
+                "holding_registers": [{"register": 100, "value": list(range(200))}],
+            },
+            **kwargs,
+        )
+
+        async def main():
+            server = await srv.start()
+            port = server.sockets[0].getsockname()[1]
+            try:
+                await asyncio.wait_for(client(srv, port), 10)
+            finally:
+                srv.close()
+                # let the client tasks see the connections close
+                await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+        return srv
+
+    def test_pipelined_and_split(self):
+        async def client(srv, port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            # three requests in one segment, a fourth split across two
+            writer.write(read_req(1, 3, 100, 2) + read_req(2, 3, 102, 1) + read_req(3, 1, 0, 4))
+            fourth = read_req(4, 3, 299, 1)
+            writer.write(fourth[:5])
+            await writer.drain()
+            await asyncio.sleep(0.05)
+            writer.write(fourth[5:])
+            rsps = {}
+            for _ in range(4):
+                tid, unit, pdu = await read_adu(reader)
+                rsps[tid] = pdu
+            self.assertEqual(rsps[1], bytes([3, 4, 0, 0, 0, 1]))
+            self.assertEqual(rsps[2], bytes([3, 2, 0, 2]))
+            self.assertEqual(rsps[3], bytes([1, 1, 0b0101]))
+            self.assertEqual(rsps[4], bytes([3, 2, 0, 199]))
+            self.assertEqual(srv.stats()[0]["requests"], 4)
+            writer.close()
+
+        self.run_server(client)
+
+    def test_concurrent_clients(self):
+        async def one(port, k):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for i in range(20):
+                writer.write(read_req(i, 3, 100 + k, 1))
+                tid, unit, pdu = await read_adu(reader)
+                self.assertEqual((tid, pdu), (i, bytes([3, 2, 0, k])))
+            return writer
+
+        async def client(srv, port):
+            writers = await asyncio.gather(*[one(port, k) for k in range(5)])
+            stats = srv.stats()
+            self.assertEqual(len(stats), 5)
+            self.assertEqual([s["requests"] for s in stats], [20] * 5)
+            self.assertTrue(all(s["rate"] > 0 for s in stats))
+            for w in writers:
+                w.close()
+
+        srv = self.run_server(client)
+        self.assertEqual(srv.requests, 100)
+
+    def test_write_then_read(self):
+        async def client(srv, port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(adu(1, 1, struct.pack(">BHHBHH", 16, 110, 2, 4, 0xBEEF, 0x0102)))
+            writer.write(adu(2, 1, struct.pack(">BHH", 5, 1, 0xFF00)))
+            writer.write(read_req(3, 3, 110, 2))
+            self.assertEqual((await read_adu(reader))[2], bytes([16, 0, 110, 0, 2]))
+            self.assertEqual((await read_adu(reader))[2], bytes([5, 0, 1, 0xFF, 0]))
+            self.assertEqual((await read_adu(reader))[2], bytes([3, 4, 0xBE, 0xEF, 1, 2]))
+            self.assertTrue(srv.get_coil(1))
+            writer.close()
+
+        self.run_server(client)
+
+    def test_exceptions(self):
+        async def client(srv, port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            # unsupported function, missing table, out of range, other unit id
+            writer.write(adu(1, 1, bytes([0x2B, 0x0E, 0x01, 0x00])))
+            writer.write(read_req(2, 4, 0, 1))
+            writer.write(read_req(3, 3, 295, 10))
+            writer.write(read_req(4, 3, 100, 1, unit=9))
+            writer.write(read_req(5, 3, 100, 1))
+            self.assertEqual(await read_adu(reader), (1, 1, bytes([0xAB, 0x01])))
+            self.assertEqual(await read_adu(reader), (2, 1, bytes([0x84, 0x01])))
+            self.assertEqual(await read_adu(reader), (3, 1, bytes([0x83, 0x02])))
+            self.assertEqual(await read_adu(reader), (5, 1, bytes([3, 2, 0, 0])))
+            self.assertEqual(srv.ignored, 1)
+            # a broken MBAP header closes the connection
+            writer.write(struct.pack(">HHHB", 6, 7, 6, 1) + bytes(5))
+            self.assertEqual(await reader.read(10), b"")
+            writer.close()
+
+        self.run_server(client)
+
+    def test_idle_timeout_and_max_clients(self):
+        async def client(srv, port):
+            r1, w1 = await asyncio.open_connection("127.0.0.1", port)
+            await asyncio.sleep(0.05)
+            r2, w2 = await asyncio.open_connection("127.0.0.1", port)
+            self.assertEqual(await r2.read(10), b"")
+            self.assertEqual(srv.rejected, 1)
+            self.assertEqual(await asyncio.wait_for(r1.read(10), 2), b"")
+            self.assertEqual(srv.clients, [])
+            w1.close()
+            w2.close()
+
+        self.run_server(client, idle_timeout=0.3, max_clients=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
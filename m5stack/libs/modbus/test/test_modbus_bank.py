@@ -0,0 +1,122 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import sys
+
+if sys.implementation.name == "cpython":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import unittest
+from modbus.bank import RegisterBank
+from modbus.slave import ModbusSlave
+from modbus.frame import ModbusTCPFrame
+
+
+def request(func_code, register, length=None, data=None):
+    return ModbusTCPFrame(
+        transaction_id=7,
+        unit_id=1,
+        func_code=func_code,
+        register=register,
+        length=length,
+        data=data,
+        fr_type="request",
+    )
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.sl = ModbusSlave(
+            context={
+                "coils": [{"register": 10, "value": [i % 3 == 0 for i in range(20)]}],
+                "discrete_inputs": [{"register": 0, "value": [True, False, True] * 4}],
+                "holding_registers": [{"register": 100, "value": list(range(0x1000, 0x1080))}],
+                "input_registers": [{"register": 0, "value": [0xABCD, 0x0001, 0xFFFF]}],
+            }
+        )
+
+    def test_banks(self):
+        for reg_type, bank in self.sl.context.items():
+            self.assertIsInstance(bank, RegisterBank)
+            self.assertEqual(bank.bits, reg_type in ("coils", "discrete_inputs"))
+
+    def test_read_coils(self):
+        # aligned with the start of the block
+        res = self.sl.handle_message(request(1, 10, 8))
+        self.assertEqual(res.data, bytearray([0b01001001]))
+        # unaligned, crossing a byte, with a partial last byte
+        res = self.sl.handle_message(request(1, 13, 11))
+        self.assertEqual(res.data, bytearray([0b01001001, 0b00000010]))
+        # past the end of the block
+        res = self.sl.handle_message(request(1, 25, 6))
+        self.assertEqual(res.error_code, 0x02)
+
+    def test_read_discrete_inputs(self):
+        res = self.sl.handle_message(request(2, 1, 10))
+        self.assertEqual(res.data, bytearray([0b10110110, 0b00000001]))
+
+    def test_read_registers(self):
+        res = self.sl.handle_message(request(3, 100, 125))
+        self.assertEqual(len(res.data), 250)
+        self.assertEqual(res.data[:4], bytearray([0x10, 0x00, 0x10, 0x01]))
+        self.assertEqual(res.data[-2:], bytearray([0x10, 0x7C]))
+        res = self.sl.handle_message(request(4, 0, 3))
+        self.assertEqual(res.data, bytearray([0xAB, 0xCD, 0x00, 0x01, 0xFF, 0xFF]))
+        res = self.sl.handle_message(request(4, 2, 2))
+        self.assertEqual(res.error_code, 0x02)
+
+    def test_write_coils(self):
+        self.sl.handle_message(request(5, 11, data=bytearray([0xFF, 0x00])))
+        self.assertTrue(self.sl.get_coil(11))
+        res = self.sl.handle_message(request(15, 14, 10, bytearray([0xFF, 0x02])))
+        self.assertEqual(res.length, 10)
+        self.assertEqual(self.sl.context["coils"].values(14, 10), [True] * 8 + [False, True])
+        self.assertEqual(self.sl.get_coil(13), True)
+        self.assertEqual(self.sl.get_coil(24), False)
+
+    def test_write_registers(self):
+        self.sl.handle_message(request(6, 101, data=bytearray([0x12, 0x34])))
+        self.assertEqual(self.sl.get_holding_register(101), 0x1234)
+        data = bytearray([0x00, 0x01, 0x00, 0x02, 0xBE, 0xEF])
+        res = self.sl.handle_message(request(16, 224, 3, data))
+        self.assertEqual(res.length, 3)
+        self.assertEqual(
+            self.sl.context["holding_registers"].values(223, 4), [0x107B, 1, 2, 0xBEEF]
+        )
+        # the response is serialised straight from the bank
+        res = self.sl.handle_message(request(3, 224, 3))
+        self.assertEqual(res.data, data)
+
+    def test_add_remove(self):
+        bank = RegisterBank(True)
+        for r in (5, 3, 7, 4, 6):
+            bank.add(r, r % 2 == 1)
+        self.assertEqual(bank, [{"register": 3, "value": [True, False, True, False, True]}])
+        bank.remove(5)
+        self.assertEqual(
+            bank,
+            [
+                {"register": 3, "value": [True, False]},
+                {"register": 6, "value": [False, True]},
+            ],
+        )
+        self.assertFalse(bank.check(4, 3))
+        self.assertTrue(bank.check(6, 2))
+        with self.assertRaises(KeyError):
+            bank.get(5)
+
+    def test_large_map(self):
+        sl = ModbusSlave()
+        for r in range(0, 4000, 2):
+            sl.add_input_register(r, r & 0xFFFF)
+        self.assertEqual(len(sl.context["input_registers"]), 2000)
+        for r in range(1, 4000, 2):
+            sl.add_input_register(r, r & 0xFFFF)
+        self.assertEqual(len(sl.context["input_registers"]), 1)
+        res = sl.handle_message(request(4, 3000, 2))
+        self.assertEqual(res.data, bytearray([0x0B, 0xB8, 0x0B, 0xB9]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import sys
+
+if sys.implementation.name == "cpython":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import unittest
+from modbus.codec import CRC16_TABLE, RTUCodec, crc16, frame_length
+from modbus.frame import ModbusRTUFrame
+
+
+def bitwise_crc16(data):
+    crc = 0xFFFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+class Test(unittest.TestCase):
+    def test_table(self):
+        self.assertEqual(len(CRC16_TABLE), 256)
+        self.assertEqual(CRC16_TABLE.typecode, "H")
+        self.assertEqual(CRC16_TABLE[0], 0x0000)
+        self.assertEqual(CRC16_TABLE[1], 0xC0C1)
+        self.assertEqual(CRC16_TABLE[255], 0x4040)
+
+    def test_known_frames(self):
+        # CRC-16/MODBUS check value
+        self.assertEqual(crc16(b"123456789"), 0x4B37)
+        # read 10 holding registers from slave 1: 01 03 00 00 00 0A C5 CD
+        self.assertEqual(crc16(bytes([0x01, 0x03, 0x00, 0x00, 0x00, 0x0A])), 0xCDC5)
+        # read 8 coils at 0x12 from slave 1: ... 9D C9
+        self.assertEqual(crc16(bytes([0x01, 0x01, 0x00, 0x12, 0x00, 0x08])), 0xC99D)
+        # a range inside a larger buffer
+        buf = bytearray([0xAA, 0x01, 0x03, 0x00, 0x00, 0x00, 0x0A, 0xBB])
+        self.assertEqual(crc16(buf, 1, 7), 0xCDC5)
+        self.assertEqual(crc16(memoryview(buf)[1:7]), 0xCDC5)
+
+    def test_matches_bitwise(self):
+        data = bytes((i * 37 + 11) & 0xFF for i in range(300))
+        for n in (0, 1, 2, 7, 64, 300):
+            self.assertEqual(crc16(data[:n]), bitwise_crc16(data[:n]))
+
+    def test_rtu_frame_uses_table(self):
+        f = ModbusRTUFrame(device_addr=1, func_code=3, register=0, length=10, fr_type="request")
+        self.assertEqual(f.get_frame(), bytearray.fromhex("01030000000AC5CD"))
+
+    def test_frame_length(self):
+        req = bytearray.fromhex("01100001000204000A0102")
+        self.assertEqual(frame_length(req, 1), 0)
+        self.assertEqual(frame_length(req, 6), 0)
+        self.assertEqual(frame_length(req, 7), 13)
+        self.assertEqual(frame_length(bytearray.fromhex("0103040001"), 5, True), 9)
+        self.assertEqual(frame_length(bytearray.fromhex("0183"), 2, True), 5)
+
+    def test_decode_request(self):
+        codec = RTUCodec()
+        rx = bytearray(64)
+        frame = bytearray.fromhex("011000010002040A0B0C0D")
+        crc = crc16(frame)
+        frame += bytearray([crc & 0xFF, crc >> 8])
+        rx[: len(frame)] = frame
+        self.assertIsNone(codec.decode(rx, len(frame) - 1))
+        f = codec.decode(rx, len(frame))
+        self.assertIs(f, codec.frame)
+        self.assertEqual(
+            (f.device_addr, f.func_code, f.register, f.length, f.size), (1, 0x10, 1, 2, 13)
+        )
+        self.assertEqual(bytes(f.data), bytes([0x0A, 0x0B, 0x0C, 0x0D]))
+        rx[5] ^= 0xFF
+        self.assertIsNone(codec.decode(rx, len(frame)))
+
+    def test_decode_response(self):
+        codec = RTUCodec()
+        f = codec.decode(bytearray.fromhex("0103040001000ADA34") + b"\0\0", response=True)
+        self.assertIsNone(f)
+        frame = bytearray.fromhex("0103040001000A")
+        crc = crc16(frame)
+        frame += bytearray([crc & 0xFF, crc >> 8, 0x55])
+        f = codec.decode(frame, response=True)
+        self.assertEqual((f.func_code, f.size, bytes(f.data)), (3, 9, b"\x00\x01\x00\x0a"))
+        f = codec.decode(bytearray.fromhex("018302C0F1"), response=True)
+        self.assertEqual((f.func_code, f.error_code), (0x83, 0x02))
+
+    def test_encode(self):
+        codec = RTUCodec()
+        cases = [
+            dict(fr_type="request", func_code=1, register=18, length=8),
+            dict(fr_type="request", func_code=5, register=172, data=bytearray([0xFF, 0x00])),
+            dict(
+                fr_type="request",
+                func_code=15,
+                register=19,
+                length=10,
+                data=bytearray(b"\xcd\x01"),
+            ),
+            dict(fr_type="request", func_code=16, register=1, length=2, data=bytearray(4)),
+            dict(fr_type="response", func_code=3, data=bytearray([0x02, 0x2B, 0x00, 0x00])),
+            dict(fr_type="response", func_code=6, register=1, data=bytearray([0x00, 0x03])),
+            dict(fr_type="response", func_code=16, register=1, length=2),
+            dict(fr_type="response", func_code=0x81, error_code=0x02),
+        ]
+        for kwargs in cases:
+            f = ModbusRTUFrame(device_addr=0x11, **kwargs)
+            self.assertEqual(bytes(codec.encode(f)), bytes(f.get_frame()), kwargs)
+            decoded = codec.decode(bytearray(codec.encode(f)), response=f.type == "response")
+            self.assertEqual(decoded.func_code, f.func_code)
+        self.assertEqual(bytes(codec.request(1, 3, 0, 10)), bytes.fromhex("01030000000AC5CD"))
+        self.assertEqual(
+            bytes(codec.wrap(1, bytes.fromhex("030000000A"))), bytes.fromhex("01030000000AC5CD")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
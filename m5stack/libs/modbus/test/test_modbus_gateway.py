@@ -0,0 +1,215 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import sys
+
+if sys.implementation.name == "cpython":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import unittest
+import asyncio
+import struct
+from modbus.slave import ModbusSlave
+from modbus.codec import RTUCodec
+from modbus.gateway import ModbusGateway, RTUBus
+
+
+def adu(tid, unit, pdu):
+    return struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + pdu
+
+
+def read_req(tid, unit, register, quantity):
+    return adu(tid, unit, struct.pack(">BHH", 3, register, quantity))
+
+
+async def read_adu(reader):
+    head = await reader.readexactly(7)
+    tid, _, length, unit = struct.unpack(">HHHB", head)
+    return tid, unit, await reader.readexactly(length - 1)
+
+
+class RTUStandIn:
+    """RTU slaves behind a TCP socket, in place of a UART"""
+
+    def __init__(self, addresses, delay=0):
+        self.slaves = {}
+        for addr in addresses:
+            self.slaves[addr] = ModbusSlave(
+                sl_type="rtu",
+                device_address=addr,
+                context={
+                    "holding_registers": [
+                        {"register": 0, "value": [addr * 100 + i for i in range(50)]}
+                    ]
+                },
+            )
+        self.delay = delay
+        self.log = []
+
+    async def serve(self, reader, writer):
+        codec = RTUCodec()
+        buf = b""
+        while True:
+            data = await reader.read(256)
+            if not data:
+                break
+            buf += data
+            f = codec.decode(buf)
+            if f is None:
+                continue
+            buf = buf[f.size :]
+            self.log.append((f.device_addr, f.func_code))
+            slave = self.slaves.get(f.device_addr)
+            if slave is None:
+                continue
+            rsp = slave.handle_message(f)
+            await asyncio.sleep(self.delay)
+            writer.write(codec.encode(rsp))
+            await writer.drain()
+        writer.close()
+
+
+class Test(unittest.TestCase):
+    def run_gateway(self, client, standin, cache_ttl=0, timeout=300, max_queue=32):
+        async def main():
+            line = await asyncio.start_server(standin.serve, "127.0.0.1", 0)
+            r, w = await asyncio.open_connection("127.0.0.1", line.sockets[0].getsockname()[1])
+            bus = RTUBus(r, w, 115200, cache_ttl=cache_ttl, max_queue=max_queue)
+            gw = ModbusGateway(
+                "127.0.0.1",
+                0,
+                timeout=timeout,
+                device_address=200,
+                context={"holding_registers": [{"register": 0, "value": [7, 8]}]},
+            )
+            gw.add_route(1, bus)
+            gw.add_route(2, bus, 7)
+            gw.add_route(3, bus)
+            server = await gw.start()
+            port = server.sockets[0].getsockname()[1]
+            try:
+                await asyncio.wait_for(client(gw, bus, port), 10)
+            finally:
+                gw.close()
+                w.close()
+                line.close()
+                await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+
+    def test_routes_and_transaction_ids(self):
+        standin = RTUStandIn([1, 7])
+
+        async def client(gw, bus, port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            # pipelined: unit 1 and unit 2 (RTU address 7), the gateway itself, and no route
+            writer.write(read_req(100, 1, 0, 2) + read_req(101, 2, 5, 1))
+            writer.write(read_req(102, 200, 1, 1) + read_req(103, 9, 0, 1))
+            rsps = {}
+            for _ in range(4):
+                tid, unit, pdu = await read_adu(reader)
+                rsps[tid] = (unit, pdu)
+            self.assertEqual(rsps[100], (1, bytes([3, 4, 0, 100, 0, 101])))
+            self.assertEqual(rsps[101], (2, bytes([3, 2, 2, 193])))
+            self.assertEqual(rsps[102], (200, bytes([3, 2, 0, 8])))
+            self.assertEqual(rsps[103], (9, bytes([0x83, 0x0A])))
+            # a slave exception is passed through
+            writer.write(read_req(104, 1, 49, 2))
+            self.assertEqual(await read_adu(reader), (104, 1, bytes([0x83, 0x02])))
+            writer.close()
+
+        self.run_gateway(client, standin)
+        self.assertEqual(standin.log, [(1, 3), (7, 3), (1, 3)])
+
+    def test_timeout(self):
+        standin = RTUStandIn([1])
+
+        async def client(gw, bus, port):
+            gw.add_route(3, bus, timeout=100)
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(read_req(1, 3, 0, 1) + read_req(2, 1, 0, 1))
+            self.assertEqual(await read_adu(reader), (1, 3, bytes([0x83, 0x0B])))
+            self.assertEqual(await read_adu(reader), (2, 1, bytes([3, 2, 0, 100])))
+            self.assertEqual(bus.timeouts, 1)
+            writer.close()
+
+        self.run_gateway(client, standin)
+
+    def test_slow_bus_expires_queued_requests(self):
+        standin = RTUStandIn([1], delay=0.15)
+
+        async def client(gw, bus, port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            # each answer takes 150 ms: the second runs out of time on the bus,
+            # the third in the queue
+            writer.write(read_req(1, 1, 0, 1) + read_req(2, 1, 1, 1) + read_req(3, 1, 2, 1))
+            rsps = [await read_adu(reader) for _ in range(3)]
+            self.assertEqual(rsps[0], (1, 1, bytes([3, 2, 0, 100])))
+            self.assertEqual(rsps[1], (2, 1, bytes([0x83, 0x0B])))
+            self.assertEqual(rsps[2], (3, 1, bytes([0x83, 0x0B])))
+            writer.close()
+
+        self.run_gateway(client, standin, timeout=250)
+        self.assertEqual(len(standin.log), 2)
+
+    def test_writes_go_first_and_queue_limit(self):
+        standin = RTUStandIn([1], delay=0.02)
+
+        async def client(gw, bus, port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(
+                read_req(1, 1, 0, 1)
+                + read_req(2, 1, 1, 1)
+                + adu(3, 1, struct.pack(">BHH", 6, 1, 0xBEEF))
+                + read_req(4, 1, 2, 1)
+            )
+            rsps = {}
+            for _ in range(4):
+                tid, unit, pdu = await read_adu(reader)
+                rsps[tid] = pdu
+            self.assertEqual(rsps[3], bytes([6, 0, 1, 0xBE, 0xEF]))
+            self.assertEqual(rsps[4], bytes([0x83, 0x06]))
+            writer.close()
+
+        self.run_gateway(client, standin, max_queue=3)
+        self.assertEqual(standin.log, [(1, 6), (1, 3), (1, 3)])
+        self.assertEqual(standin.slaves[1].get_holding_register(1), 0xBEEF)
+
+    def test_read_cache(self):
+        standin = RTUStandIn([1], delay=0.02)
+
+        async def one(port, tid):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(read_req(tid, 1, 0, 2))
+            rsp = await read_adu(reader)
+            writer.close()
+            return rsp
+
+        async def client(gw, bus, port):
+            # the same poll from three clients at once: one bus transaction
+            rsps = await asyncio.gather(*[one(port, tid) for tid in (1, 2, 3)])
+            self.assertEqual([r[0] for r in rsps], [1, 2, 3])
+            self.assertEqual(len({r[2] for r in rsps}), 1)
+            self.assertEqual(len(standin.log), 1)
+            # answered from the cache
+            self.assertEqual((await one(port, 4))[2], bytes([3, 4, 0, 100, 0, 101]))
+            self.assertEqual(len(standin.log), 1)
+            # a write drops the cached reads of that address
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(adu(5, 1, struct.pack(">BHH", 6, 0, 42)))
+            await read_adu(reader)
+            writer.close()
+            self.assertEqual((await one(port, 6))[2], bytes([3, 4, 0, 42, 0, 101]))
+            self.assertEqual(len(standin.log), 3)
+            # and entries expire
+            await asyncio.sleep(0.3)
+            await one(port, 7)
+            self.assertEqual(len(standin.log), 4)
+            self.assertEqual(bus.hits, 3)
+
+        self.run_gateway(client, standin, cache_ttl=200)
+
+
+if __name__ == "__main__":
+    unittest.main()
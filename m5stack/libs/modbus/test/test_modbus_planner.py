@@ -0,0 +1,154 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import sys
+
+if sys.implementation.name == "cpython":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import unittest
+import struct
+from modbus.master import ModbusMaster
+from modbus.slave import ModbusSlave
+from modbus.frame import ModbusTCPFrame
+from modbus.planner import PollPlanner
+
+
+class LoopbackMaster(ModbusMaster):
+    """Answers every request from in-process slaves, one per unit id"""
+
+    def __init__(self, slaves):
+        super().__init__(ms_type="tcp")
+        self.ti = 0
+        self._verbose = False
+        self.slaves = slaves
+        self.requests = []
+
+    def _send(self, frame, timeout=2000):
+        req = ModbusTCPFrame.parse_frame(frame)
+        self.requests.append((req.unit_id, req.func_code, req.register, req.length))
+        slave = self.slaves.get(req.unit_id)
+        if slave is None:
+            return False, None
+        return True, slave.handle_message(req).get_frame()
+
+
+def slave():
+    regs = list(range(1000))
+    # 1.5 as float32 at 40, -2 as int32 at 42
+    regs[40:42] = list(struct.unpack(">HH", struct.pack(">f", 1.5)))
+    regs[42:44] = list(struct.unpack(">HH", struct.pack(">i", -2)))
+    return ModbusSlave(
+        context={
+            "coils": [{"register": 0, "value": [i % 3 == 0 for i in range(3000)]}],
+            "holding_registers": [{"register": 0, "value": regs}],
+            "input_registers": [{"register": 0, "value": [0xFFFE] * 1000}],
+        }
+    )
+
+
+class Test(unittest.TestCase):
+    def test_merge_ranges(self):
+        p = PollPlanner(None, max_gap=4)
+        for addr in (10, 11, 13, 20, 21, 30):
+            p.add("h%d" % addr, 1, "holding_registers", addr)
+        p.add("f", 1, "holding_registers", 40, "float32")
+        p.add("other_device", 2, "holding_registers", 12)
+        p.add("other_table", 1, "input_registers", 12)
+        p.add("other_period", 1, "holding_registers", 12, period=100)
+        got = [(r.device, r.table, r.start, r.count, r.period) for r in p.plan()]
+        self.assertEqual(
+            sorted(got),
+            sorted(
+                [
+                    # 13 -> 20 leaves a gap of 6 > 4; 21 -> 30 too
+                    (1, "holding_registers", 10, 4, 1000),
+                    (1, "holding_registers", 20, 2, 1000),
+                    # 30 -> 40 is a gap of 9; the float ends at 42
+                    (1, "holding_registers", 30, 1, 1000),
+                    (1, "holding_registers", 40, 2, 1000),
+                    (2, "holding_registers", 12, 1, 1000),
+                    (1, "input_registers", 12, 1, 1000),
+                    (1, "holding_registers", 12, 1, 100),
+                ]
+            ),
+        )
+
+    def test_register_limit(self):
+        p = PollPlanner(None, max_gap=10)
+        for addr in range(0, 400, 5):
+            p.add(addr, 1, "holding_registers", addr, "uint32")
+        reads = p.plan()
+        self.assertTrue(all(r.count <= 125 for r in reads))
+        self.assertEqual(
+            [(r.start, r.count) for r in reads], [(0, 122), (125, 122), (250, 122), (375, 22)]
+        )
+        # every point lies inside its read
+        for r in reads:
+            for pt in r.points:
+                self.assertTrue(
+                    r.start <= pt.address and pt.address + pt.size <= r.start + r.count
+                )
+        p = PollPlanner(None, max_gap=1000, max_registers=200)
+        p.add("a", 1, "input_registers", 0)
+        p.add("b", 1, "input_registers", 125)
+        self.assertEqual(len(p.plan()), 2)
+
+    def test_bit_limit(self):
+        p = PollPlanner(None, max_gap=8)
+        for addr in range(0, 3000, 100):
+            p.add(addr, 1, "coils", addr, "bool")
+        reads = p.plan()
+        self.assertTrue(all(r.count <= 2000 for r in reads))
+        self.assertEqual([(r.start, r.count) for r in reads], [(0, 1901), (2000, 901)])
+
+    def test_poll(self):
+        master = LoopbackMaster({1: slave(), 2: slave()})
+        p = PollPlanner(master, max_gap=8)
+        for addr in (3, 5, 9, 12, 100, 101, 110):
+            p.add("h%d" % addr, 1, "holding_registers", addr, period=1000)
+        p.add("f", 1, "holding_registers", 40, "float32", period=1000)
+        p.add("i", 1, "holding_registers", 42, "int32", period=1000)
+        p.add("neg", 2, "input_registers", 7, "int16", period=500)
+        p.add("c", 2, "coils", 9, "bool", period=500)
+        p.add("c2", 2, "coils", 10, "bool", period=500)
+        changes = []
+        p.on_change = lambda name, value: changes.append(name)
+
+        self.assertEqual(p.poll(now=0), 5)
+        self.assertEqual(
+            sorted(master.requests),
+            [(1, 3, 3, 10), (1, 3, 40, 4), (1, 3, 100, 11), (2, 1, 9, 2), (2, 4, 7, 1)],
+        )
+        self.assertEqual(p.get("h9"), 9)
+        self.assertEqual(p.get("h110"), 110)
+        self.assertEqual(p.get("f"), 1.5)
+        self.assertEqual(p.get("i"), -2)
+        self.assertEqual(p.get("neg"), -2)
+        self.assertEqual((p.get("c"), p.get("c2")), (True, False))
+        self.assertEqual(len(changes), 12)
+
+        # only the 500 ms reads are due again, and nothing changed
+        self.assertEqual(p.poll(now=500), 2)
+        self.assertEqual(p.poll(now=999), 0)
+        self.assertEqual(p.poll(now=1000), 5)
+        self.assertEqual(len(changes), 12)
+        stats = p.stats()
+        self.assertEqual(stats["transactions"], 12)
+        self.assertEqual(stats["naive"], 2 * 9 + 3 * 3)
+        self.assertEqual(stats["saved"], stats["naive"] - 12)
+
+    def test_errors(self):
+        master = LoopbackMaster({})
+        p = PollPlanner(master)
+        p.add("x", 5, "holding_registers", 0)
+        p.poll(now=0)
+        self.assertIsNone(p.get("x"))
+        self.assertEqual(p.stats()["errors"], 1)
+        with self.assertRaises(ValueError):
+            p.add("y", 1, "coils", 0, "uint16")
+
+
+if __name__ == "__main__":
+    unittest.main()
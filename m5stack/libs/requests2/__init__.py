@@ -1,4 +1,6 @@
 import socket
+import time
+import dnscache
 
 
 class Response:
@@ -6,6 +8,7 @@ class Response:
         self.raw = f
         self.encoding = "utf-8"
         self._cached = None
+        self._used = False  # the caller started reading the body
 
     def close(self):
         if self.raw:
@@ -13,8 +16,13 @@ class Response:
             self.raw = None
         self._cached = None
 
+    def __del__(self):
+        # a body nobody read must not keep its socket open
+        self.close()
+
     @property
     def content(self):
+        self._used = True
         if self._cached is None:
             try:
                 self._cached = self.raw.read()
@@ -32,29 +40,64 @@ class Response:
 
         return ujson.loads(self.content)
 
+    def readinto(self, buf):
+        """Read the next part of the body into ``buf``; returns 0 at the end."""
+        if self.raw is None:
+            return 0
+        self._used = True
+        n = self.raw.readinto(buf)
+        if not n:
+            self.close()
+        return n
+
+    def iter_content(self, chunk_size=1024, buf=None):
+        """Yield the body in pieces through one reused buffer.
+
+        Each yielded memoryview is only valid until the next step; copy it
+        with ``bytes()`` if it has to be kept.
+        """
+        if buf is None:
+            buf = bytearray(chunk_size)
+        mv = memoryview(buf)
+        while True:
+            n = self.readinto(buf)
+            if not n:
+                return
+            yield mv[:n]
+
+    def save_to(self, path, buf=None, chunk_size=1024):
+        """Stream the body to a file with a fixed buffer; returns the size.
+
+        The data goes to ``path + ".tmp"`` first and is renamed over
+        ``path`` only once the whole body has arrived.
+        """
+        import os
+
+        if buf is None:
+            buf = bytearray(chunk_size)
+        mv = memoryview(buf)
+        tmp = path + ".tmp"
+        total = 0
+        try:
+            with open(tmp, "wb") as f:
+                while True:
+                    n = self.readinto(buf)
+                    if not n:
+                        break
+                    f.write(mv[:n])
+                    total += n
+            os.rename(tmp, path)
+        except:
+            self.close()
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return total
 
-def request(
-    method,
-    url,
-    data=None,
-    json=None,
-    headers={},
-    stream=None,
-    auth=None,
-    timeout=None,
-    parse_headers=True,
-):
-    redirect = None  # redirection url, None means no redirection
-    chunked_data = data and getattr(data, "__next__", None) and not getattr(data, "__len__", None)
-
-    if auth is not None:
-        import binascii
-
-        username, password = auth
-        formated = b"{}:{}".format(username, password)
-        formated = str(binascii.b2a_base64(formated)[:-1], "ascii")
-        headers["Authorization"] = "Basic {}".format(formated)
 
+def _parse_url(url):
     try:
         proto, dummy, host, path = url.split("/", 3)
     except ValueError:
@@ -63,8 +106,6 @@ def request(
     if proto == "http:":
         port = 80
     elif proto == "https:":
-        import ssl
-
         port = 443
     else:
         raise ValueError("Unsupported protocol: " + proto)
@@ -72,13 +113,159 @@ def request(
     if ":" in host:
         host, port = host.split(":", 1)
         port = int(port)
+    return proto, host, port, path
+
+
+def _auth_header(headers, auth):
+    import binascii
+
+    username, password = auth
+    formated = b"{}:{}".format(username, password)
+    formated = str(binascii.b2a_base64(formated)[:-1], "ascii")
+    headers["Authorization"] = "Basic {}".format(formated)
 
-    ai = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
-    ai = ai[0]
 
+def _send_request(s, method, host, path, headers, data, json, version, connection):
+    data, chunked_data = _send_head(
+        s, method, host, path, headers, data, json, version, connection
+    )
+    for part in _body_parts(data, chunked_data):
+        s.write(part)
+
+
+def _send_head(s, method, host, path, headers, data, json, version, connection):
+    # writes the request line and headers; returns the body to send and
+    # whether it goes out chunked
+    chunked_data = data and getattr(data, "__next__", None) and not getattr(data, "__len__", None)
+    s.write(b"%s /%s %s\r\n" % (method, path, version))
+    if "Host" not in headers:
+        s.write(b"Host: %s\r\n" % host)
+    # Iterate over keys to avoid tuple alloc
+    for k in headers:
+        s.write(k)
+        s.write(b": ")
+        s.write(headers[k])
+        s.write(b"\r\n")
+    if json is not None:
+        assert data is None
+        import ujson
+
+        data = ujson.dumps(json)
+        s.write(b"Content-Type: application/json\r\n")
+    if data:
+        if chunked_data:
+            s.write(b"Transfer-Encoding: chunked\r\n")
+        else:
+            if getattr(data, "readinto", None):
+                # a sized stream (e.g. a multipart body) or a seekable file
+                size = len(data) if hasattr(data, "__len__") else data.seek(0, 2)
+                s.write(b"Content-Length: %d\r\n" % size)
+            else:
+                s.write(b"Content-Length: %d\r\n" % len(data))
+    s.write(b"Connection: %s\r\n\r\n" % connection)
+    return data, chunked_data
+
+
+def _body_parts(data, chunked_data):
+    # the request body, piece by piece; a yielded memoryview is only valid
+    # until the next piece is asked for
+    if not data:
+        return
+    if chunked_data:
+        for chunk in data:
+            yield b"%x\r\n" % len(chunk)
+            yield chunk
+            yield b"\r\n"
+        yield b"0\r\n\r\n"
+    elif getattr(data, "readinto", None):
+        if hasattr(data, "__len__"):
+            l = len(data)
+            to_read = 0
+        else:
+            l = data.seek(0, 2)
+            to_read = data.seek(0, 0)
+        buf = bytearray(1024)
+        mv = memoryview(buf)
+        while to_read < l:
+            r = data.readinto(buf)
+            if not r:
+                break
+            if r == 1024:
+                yield buf
+            else:
+                yield mv[:r]
+            to_read += r
+        data.close()
+    else:
+        yield data
+
+
+def _read_head(s, l, parse_headers):
+    # l is the status line, already read by the caller
+    # print(l)
+    l = l.split(None, 2)
+    if len(l) < 2:
+        # Invalid response
+        raise ValueError("HTTP error: BadStatusLine:\n%s" % l)
+    status = int(l[1])
+    reason = ""
+    if len(l) > 2:
+        reason = l[2].rstrip()
     resp_d = None
     if parse_headers is not False:
         resp_d = {}
+    redirect = None  # redirection url, None means no redirection
+    length = -1  # -1: body runs until the server closes
+    chunked = False
+    close = False
+    while True:
+        l = s.readline()
+        if not l or l == b"\r\n":
+            break
+        # print(l)
+        low = l.lower()
+        if low.startswith(b"transfer-encoding:"):
+            chunked = b"chunked" in low
+        elif low.startswith(b"content-length:"):
+            length = int(l[15:])
+        elif low.startswith(b"connection:"):
+            close = b"close" in low
+        elif l.startswith(b"Location:") and not 200 <= status <= 299:
+            if status in [301, 302, 303, 307, 308]:
+                redirect = str(l[10:-2], "utf-8")
+            else:
+                raise NotImplementedError("Redirect %d not yet supported" % status)
+        if parse_headers is False:
+            pass
+        elif parse_headers is True:
+            l = str(l, "utf-8")
+            k, v = l.split(":", 1)
+            resp_d[k] = v.strip()
+        else:
+            parse_headers(l, resp_d)
+    return status, reason, resp_d, redirect, length, chunked, close
+
+
+def request(
+    method,
+    url,
+    data=None,
+    json=None,
+    headers={},
+    stream=None,
+    auth=None,
+    timeout=None,
+    parse_headers=True,
+):
+    if auth is not None:
+        _auth_header(headers, auth)
+
+    proto, host, port, path = _parse_url(url)
+    if proto == "https:":
+        import ssl
+
+    ai = dnscache.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    ai = ai[0]
 
     s = socket.socket(ai[0], socket.SOCK_STREAM, ai[2])
 
@@ -91,84 +278,10 @@ def request(
         s.connect(ai[-1])
         if proto == "https:":
             s = ssl.wrap_socket(s, server_hostname=host)
-        s.write(b"%s /%s HTTP/1.0\r\n" % (method, path))
-        if "Host" not in headers:
-            s.write(b"Host: %s\r\n" % host)
-        # Iterate over keys to avoid tuple alloc
-        for k in headers:
-            s.write(k)
-            s.write(b": ")
-            s.write(headers[k])
-            s.write(b"\r\n")
-        if json is not None:
-            assert data is None
-            import ujson
-
-            data = ujson.dumps(json)
-            s.write(b"Content-Type: application/json\r\n")
-        if data:
-            if chunked_data:
-                s.write(b"Transfer-Encoding: chunked\r\n")
-            else:
-                if getattr(data, "readinto", None):
-                    s.write(b"Content-Length: %d\r\n" % len(data.seek(0, 2)))
-                else:
-                    s.write(b"Content-Length: %d\r\n" % len(data))
-        s.write(b"Connection: close\r\n\r\n")
-        if data:
-            if chunked_data:
-                for chunk in data:
-                    s.write(b"%x\r\n" % len(chunk))
-                    s.write(chunk)
-                    s.write(b"\r\n")
-                s.write("0\r\n\r\n")
-            else:
-                if getattr(data, "readinto", None):
-                    l = data.seek(0, 2)
-                    to_read = data.seek(0, 0)
-                    buf = bytearray(1024)
-                    while to_read < l:
-                        r = data.readinto(buf)
-                        if r == 1024:
-                            s.write(buf)
-                        else:
-                            s.write(buf[:r])
-                        to_read += r
-                    data.close()
-                else:
-                    s.write(data)
-
-        l = s.readline()
-        # print(l)
-        l = l.split(None, 2)
-        if len(l) < 2:
-            # Invalid response
-            raise ValueError("HTTP error: BadStatusLine:\n%s" % l)
-        status = int(l[1])
-        reason = ""
-        if len(l) > 2:
-            reason = l[2].rstrip()
-        while True:
-            l = s.readline()
-            if not l or l == b"\r\n":
-                break
-            # print(l)
-            if l.startswith(b"Transfer-Encoding:"):
-                if b"chunked" in l:
-                    raise ValueError("Unsupported " + str(l, "utf-8"))
-            elif l.startswith(b"Location:") and not 200 <= status <= 299:
-                if status in [301, 302, 303, 307, 308]:
-                    redirect = str(l[10:-2], "utf-8")
-                else:
-                    raise NotImplementedError("Redirect %d not yet supported" % status)
-            if parse_headers is False:
-                pass
-            elif parse_headers is True:
-                l = str(l, "utf-8")
-                k, v = l.split(":", 1)
-                resp_d[k] = v.strip()
-            else:
-                parse_headers(l, resp_d)
+        _send_request(s, method, host, path, headers, data, json, b"HTTP/1.0", b"close")
+        status, reason, resp_d, redirect, length, chunked, _ = _read_head(
+            s, s.readline(), parse_headers
+        )
     except OSError:
         s.close()
         raise
@@ -180,7 +293,10 @@ def request(
         else:
             return request(method, redirect, data, json, headers, stream)
     else:
-        resp = Response(s)
+        if method == "HEAD" or status in (204, 304):
+            length = 0
+            chunked = False
+        resp = Response(_Body(s, length, None, chunked))
         resp.status_code = status
         resp.reason = reason
         if resp_d is not None:
@@ -188,6 +304,339 @@ def request(
         return resp
 
 
+class _Body:
+    # Response body reader for Content-Length, chunked and read-until-close
+    # framing. Once the body is complete the socket is handed to release()
+    # (back to a Session pool) or closed.
+    def __init__(self, sock, length, release, chunked=False):
+        self._s = sock
+        self._left = -1 if chunked else length  # 0 once the body is complete
+        self._chunked = chunked
+        self._chunk = 0  # bytes left in the current chunk
+        self._crlf = False  # CRLF after the chunk data still to be read
+        self._release = release
+        if not length and not chunked:
+            self.close()
+
+    def _next_chunk(self):
+        s = self._s
+        if self._crlf:
+            s.read(2)
+            self._crlf = False
+        l = s.readline()
+        if not l:
+            return self._eof()
+        n = int(l.split(b";", 1)[0].strip(), 16)
+        if n == 0:
+            # skip trailers
+            while True:
+                l = s.readline()
+                if not l or l == b"\r\n":
+                    break
+            self._left = 0
+            return 0
+        self._chunk = n
+        return n
+
+    def _span(self, n):
+        # how many bytes the next read may take, 0 at the end of the body
+        if self._s is None:
+            return 0
+        if self._chunked:
+            left = self._chunk or self._next_chunk()
+        else:
+            left = self._left
+            if left < 0:
+                return n
+        if not left:
+            self.close()
+            return 0
+        return n if n < left else left
+
+    def _consumed(self, k):
+        if self._chunked:
+            self._chunk -= k
+            self._crlf = not self._chunk
+        elif self._left > 0:
+            self._left -= k
+            if not self._left:
+                self.close()
+
+    def _eof(self):
+        # connection ended: normal for read-until-close, truncation otherwise
+        self._release = None
+        self.close()
+        return 0
+
+    def readinto(self, buf):
+        n = self._span(len(buf))
+        if not n:
+            return 0
+        k = self._s.readinto(buf, n)
+        if not k:
+            return self._eof()
+        self._consumed(k)
+        return k
+
+    def read(self, n=-1):
+        if self._s is None:
+            return b""
+        if n < 0 and not self._chunked:
+            data = self._s.read(self._left) if self._left > 0 else self._s.read()
+            if self._left < 0 or len(data) < self._left:
+                # read until close, or cut short: the connection is spent
+                self._eof()
+            else:
+                self._left = 0
+                self.close()
+            return data
+        parts = []
+        while n:
+            k = self._span(n if n > 0 else 4096)
+            if not k:
+                break
+            data = self._s.read(k)
+            if not data:
+                self._eof()
+                break
+            self._consumed(len(data))
+            parts.append(data)
+            if n > 0:
+                n -= len(data)
+        return parts[0] if len(parts) == 1 else b"".join(parts)
+
+    def close(self):
+        s = self._s
+        if s is None:
+            return
+        self._s = None
+        if self._left == 0 and self._release is not None:
+            self._release(s)
+        else:
+            s.close()
+
+
+class Session:
+    """Persistent HTTP/1.1 connections, pooled per (scheme, host, port).
+
+    Idle connections older than ``idle_timeout`` seconds are closed instead
+    of reused, at most ``max_per_host`` idle connections are kept per host.
+    A reused connection the server has already dropped is detected on the
+    first read and the request is retried once on a fresh one. Counters for
+    pool hits, new connections, TLS handshakes and stale retries are kept in
+    ``stats()``.
+
+    A response whose body was never touched when the next request starts is
+    settled then: a remainder of up to ``DRAIN_MAX`` bytes is read into the
+    response (``content`` still works) and the socket goes back to the pool.
+    A longer or chunked body stays open on its own connection, which only
+    returns to the pool once the caller has read it to the end; the next
+    request opens another one.
+    """
+
+    DRAIN_MAX = 2048
+
+    def __init__(self, max_per_host=2, idle_timeout=30, headers=None):
+        self.max_per_host = max_per_host
+        self.idle_ms = int(idle_timeout * 1000)
+        self.headers = headers or {}
+        self._pool = {}  # key -> [(sock, raw_sock, last_used_ms), ...]
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.handshakes = 0
+        self.stale = 0
+        self.expired = 0
+        self._unread = []  # responses handed out with their body still open
+        self._aunread = []  # the same for AsyncSession
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0,
+            "handshakes": self.handshakes,
+            "stale": self.stale,
+            "expired": self.expired,
+            "idle": sum(len(v) for v in self._pool.values()),
+        }
+
+    def _connect(self, proto, host, port, timeout):
+        ai = dnscache.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+        raw = socket.socket(ai[0], socket.SOCK_STREAM, ai[2])
+        try:
+            if timeout is not None:
+                raw.settimeout(timeout)
+            raw.connect(ai[-1])
+            s = raw
+            if proto == "https:":
+                import ssl
+
+                s = ssl.wrap_socket(raw, server_hostname=host)
+                self.handshakes += 1
+        except:
+            raw.close()
+            raise
+        return s, raw
+
+    def _acquire(self, key, timeout):
+        idle = self._pool.get(key)
+        now = time.ticks_ms()
+        while idle:
+            s, raw, t = idle.pop()
+            if time.ticks_diff(now, t) < self.idle_ms:
+                raw.settimeout(timeout)
+                self.hits += 1
+                return s, raw, True
+            s.close()
+            self.expired += 1
+        self.misses += 1
+        s, raw = self._connect(key[0], key[1], key[2], timeout)
+        return s, raw, False
+
+    def _releaser(self, key, raw):
+        def release(s):
+            idle = self._pool.setdefault(key, [])
+            if len(idle) < self.max_per_host:
+                idle.append((s, raw, time.ticks_ms()))
+            else:
+                s.close()
+
+        return release
+
+    def close_idle(self):
+        now = time.ticks_ms()
+        for key, idle in self._pool.items():
+            keep = []
+            for item in idle:
+                if time.ticks_diff(now, item[2]) < self.idle_ms:
+                    keep.append(item)
+                else:
+                    item[0].close()
+                    self.expired += 1
+            self._pool[key] = keep
+
+    def _settle(self):
+        still_open = []
+        for resp in self._unread:
+            body = resp.raw
+            if body is None or body._s is None:
+                continue
+            if not resp._used and not body._chunked and 0 < body._left <= self.DRAIN_MAX:
+                resp.content
+            else:
+                still_open.append(resp)
+        self._unread = still_open
+
+    def close(self):
+        self._settle()
+        # responses still being read keep their connection, but it is
+        # closed at the end of the body instead of going back to the pool
+        for resp in self._unread + self._aunread:
+            if resp.raw is not None:
+                resp.raw._release = None
+        self._unread = []
+        self._aunread = []
+        for idle in self._pool.values():
+            for item in idle:
+                item[0].close()
+        self._pool = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def request(
+        self,
+        method,
+        url,
+        data=None,
+        json=None,
+        headers=None,
+        stream=None,
+        auth=None,
+        timeout=None,
+        parse_headers=True,
+    ):
+        self._settle()
+        h = self.headers.copy()
+        if headers:
+            h.update(headers)
+        if auth is not None:
+            _auth_header(h, auth)
+        proto, host, port, path = _parse_url(url)
+        key = (proto, host, port)
+        # only a body we can send again may be retried on a stale socket
+        replayable = data is None or isinstance(data, (bytes, bytearray, str))
+        self.requests += 1
+
+        retry = True
+        while True:
+            s, raw, reused = self._acquire(key, timeout)
+            try:
+                _send_request(s, method, host, path, h, data, json, b"HTTP/1.1", b"keep-alive")
+                l = s.readline()
+                if not l:
+                    raise OSError(104)  # ECONNRESET: server dropped the idle connection
+                status, reason, resp_d, redirect, length, chunked, close = _read_head(
+                    s, l, parse_headers
+                )
+            except OSError:
+                s.close()
+                if reused and retry and replayable:
+                    retry = False
+                    self.stale += 1
+                    continue
+                raise
+            except:
+                s.close()
+                raise
+            break
+
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            length = 0
+            chunked = False
+        body = _Body(s, length, None if close else self._releaser(key, raw), chunked)
+
+        if redirect:
+            if 0 < length <= 1024:
+                body.read()
+            body.close()
+            if status in [301, 302, 303]:
+                return self.request("GET", redirect, None, None, headers, stream, None, timeout)
+            else:
+                return self.request(method, redirect, data, json, headers, stream, None, timeout)
+        resp = Response(body)
+        resp.status_code = status
+        resp.reason = reason
+        if resp_d is not None:
+            resp.headers = resp_d
+        if body._s is not None:
+            self._unread.append(resp)
+        return resp
+
+    def head(self, url, **kw):
+        return self.request("HEAD", url, **kw)
+
+    def get(self, url, **kw):
+        return self.request("GET", url, **kw)
+
+    def post(self, url, **kw):
+        return self.request("POST", url, **kw)
+
+    def put(self, url, **kw):
+        return self.request("PUT", url, **kw)
+
+    def patch(self, url, **kw):
+        return self.request("PATCH", url, **kw)
+
+    def delete(self, url, **kw):
+        return self.request("DELETE", url, **kw)
+
+
 def head(url, **kw):
     return request("HEAD", url, **kw)
 
@@ -0,0 +1,447 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# asyncio flavour of requests2.
+#
+#   import asyncio
+#   from requests2.aio import aget
+#
+#   async def main():
+#       a, b = await asyncio.gather(aget(url_a, timeout=5), aget(url_b, timeout=5))
+#       print(await a.json(), await b.text())
+#
+# AsyncSession is a requests2.Session, so the blocking and the async API of
+# one session share its pool limits, idle expiry, counters and the DNS cache.
+
+import asyncio
+import socket
+import time
+import dnscache
+from . import Session, _auth_header, _body_parts, _parse_url, _read_head, _send_head
+
+_MAX_HEADER_LINES = 64
+_ssl_ctx = None
+
+
+def _ssl_context():
+    # same trust model as requests2.request(): no certificate verification
+    global _ssl_ctx
+    if _ssl_ctx is None:
+        import ssl
+
+        _ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        _ssl_ctx.verify_mode = ssl.CERT_NONE
+    return _ssl_ctx
+
+
+class _Writer:
+    # Stream.write() buffers with `out_buf += buf`, which needs bytes
+    def __init__(self, stream):
+        self._s = stream
+
+    def write(self, b):
+        self._s.write(b.encode() if isinstance(b, str) else b)
+
+
+class _Lines:
+    # header lines already read from the stream, replayed to _read_head()
+    def __init__(self, lines):
+        self._lines = lines
+        self._i = 0
+
+    def readline(self):
+        i = self._i
+        if i >= len(self._lines):
+            return b""
+        self._i = i + 1
+        return self._lines[i]
+
+
+class _ABody:
+    # async counterpart of requests2._Body
+    def __init__(self, stream, length, release, chunked, timeout):
+        self._s = stream
+        self._left = -1 if chunked else length
+        self._chunked = chunked
+        self._chunk = 0
+        self._crlf = False
+        self._release = release
+        self._timeout = timeout
+        if not length and not chunked:
+            self.close()
+
+    def _io(self, coro):
+        return coro if self._timeout is None else asyncio.wait_for(coro, self._timeout)
+
+    async def _span(self, n):
+        if self._s is None:
+            return 0
+        if self._chunked:
+            if not self._chunk:
+                s = self._s
+                if self._crlf:
+                    await self._io(s.readexactly(2))
+                    self._crlf = False
+                l = await self._io(s.readline())
+                if not l:
+                    return self._eof()
+                self._chunk = int(l.split(b";", 1)[0].strip(), 16)
+                if not self._chunk:
+                    while True:
+                        l = await self._io(s.readline())
+                        if not l or l == b"\r\n":
+                            break
+                    self._left = 0
+            left = self._chunk
+        else:
+            left = self._left
+            if left < 0:
+                return n
+        if not left:
+            self.close()
+            return 0
+        return n if n < left else left
+
+    def _consumed(self, k):
+        if self._chunked:
+            self._chunk -= k
+            self._crlf = not self._chunk
+        elif self._left > 0:
+            self._left -= k
+            if not self._left:
+                self.close()
+
+    def _eof(self):
+        self._release = None
+        self.close()
+        return 0
+
+    async def readinto(self, buf):
+        try:
+            n = await self._span(len(buf))
+            if not n:
+                return 0
+            s = self._s
+            if n < len(buf):
+                k = await self._io(s.readinto(memoryview(buf)[:n]))
+            else:
+                k = await self._io(s.readinto(buf))
+        except BaseException:
+            # timeout or cancel mid-body: the connection is unusable
+            self._eof()
+            raise
+        if not k:
+            return self._eof()
+        self._consumed(k)
+        return k
+
+    async def read(self):
+        # straight into one bytearray: sized up front when the length is
+        # known, doubled as needed otherwise
+        buf = bytearray(self._left if not self._chunked and self._left > 0 else 1024)
+        n = 0
+        while True:
+            if n == len(buf):
+                if self._s is None:
+                    break
+                buf.extend(bytearray(n))
+            k = await self.readinto(memoryview(buf)[n:])
+            if not k:
+                break
+            n += k
+        return buf if n == len(buf) else buf[:n]
+
+    def close(self):
+        s = self._s
+        if s is None:
+            return
+        self._s = None
+        if self._left == 0 and self._release is not None:
+            self._release(s)
+        else:
+            s.close()
+
+
+class AsyncResponse:
+    def __init__(self, body):
+        self.raw = body
+        self.encoding = "utf-8"
+        self._cached = None
+        self._used = False  # the caller started reading the body
+        self._draining = None  # Event while the session reads the body in
+
+    def close(self):
+        if self.raw:
+            self.raw.close()
+            self.raw = None
+
+    def __del__(self):
+        self.close()
+
+    async def _wait_drained(self):
+        self._used = True
+        if self._draining is not None:
+            await self._draining.wait()
+
+    async def _read_all(self):
+        if self._cached is None:
+            if self.raw is None:
+                raise OSError("response body closed")
+            try:
+                self._cached = await self.raw.read()
+            finally:
+                self.close()
+        return self._cached
+
+    async def read(self):
+        await self._wait_drained()
+        return await self._read_all()
+
+    async def text(self):
+        return str(await self.read(), self.encoding)
+
+    async def json(self):
+        import ujson
+
+        return ujson.loads(await self.read())
+
+    async def readinto(self, buf):
+        await self._wait_drained()
+        if self.raw is None:
+            return 0
+        n = await self.raw.readinto(buf)
+        if not n:
+            self.close()
+        return n
+
+    async def save_to(self, path, buf=None, chunk_size=1024):
+        import os
+
+        if buf is None:
+            buf = bytearray(chunk_size)
+        mv = memoryview(buf)
+        tmp = path + ".tmp"
+        total = 0
+        try:
+            with open(tmp, "wb") as f:
+                while True:
+                    n = await self.readinto(buf)
+                    if not n:
+                        break
+                    f.write(mv[:n])
+                    total += n
+            os.rename(tmp, path)
+        except BaseException:
+            self.close()
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return total
+
+
+class AsyncSession(Session):
+    """Session with awaitable requests on non-blocking streams.
+
+    ``timeout`` bounds connecting plus receiving the response head, and
+    then each read of the body. Cancelling the awaiting task closes the
+    connection instead of returning it to the pool.
+
+    Host names are resolved with the blocking ``dnscache.getaddrinfo``
+    when a new connection is opened: the port has no non-blocking
+    resolver, so the first request to a host (and the first after its
+    cache entry expires) stalls the event loop for the lookup. Pooled
+    connections and cached names do not.
+    """
+
+    async def _aacquire(self, key):
+        idle = self._pool.get(key)
+        now = time.ticks_ms()
+        while idle:
+            s, _, t = idle.pop()
+            if time.ticks_diff(now, t) < self.idle_ms:
+                self.hits += 1
+                return s, True
+            s.close()
+            self.expired += 1
+        self.misses += 1
+        return await self._aconnect(key[1], key[2], key[3]), False
+
+    async def _aconnect(self, proto, host, port):
+        # resolve through the shared cache; connect to the address so the
+        # stream does not do its own (blocking) lookup
+        ip = dnscache.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1][0]
+        if proto == "https:":
+            s, _ = await asyncio.open_connection(
+                ip, port, ssl=_ssl_context(), server_hostname=host
+            )
+            self.handshakes += 1
+        else:
+            s, _ = await asyncio.open_connection(ip, port)
+        return s
+
+    async def _asettle(self):
+        # see Session._settle: a short untouched body is read in, the rest
+        # stays open on its own connection
+        unread = self._aunread
+        self._aunread = []
+        still_open = []
+        for resp in unread:
+            body = resp.raw
+            if body is None or body._s is None:
+                continue
+            if resp._used or body._chunked or not 0 < body._left <= self.DRAIN_MAX:
+                still_open.append(resp)
+            else:
+                resp._draining = asyncio.Event()
+                try:
+                    await resp._read_all()
+                except (OSError, asyncio.TimeoutError):
+                    pass
+                finally:
+                    resp._draining.set()
+                    resp._draining = None
+        # requests made meanwhile may have added theirs
+        self._aunread = still_open + self._aunread
+
+    async def _exchange(self, key, method, host, path, h, data, json, parse_headers):
+        replayable = data is None or isinstance(data, (bytes, bytearray, str))
+        retry = True
+        while True:
+            s, reused = await self._aacquire(key)
+            try:
+                w = _Writer(s)
+                body, chunked = _send_head(
+                    w, method, host, path, h, data, json, b"HTTP/1.1", b"keep-alive"
+                )
+                # drain per piece: a large or streamed body never sits whole
+                # in the stream's output buffer
+                for part in _body_parts(body, chunked):
+                    w.write(part)
+                    await s.drain()
+                await s.drain()
+                l = await s.readline()
+                if not l:
+                    raise OSError(104)  # ECONNRESET: server dropped the idle connection
+                lines = []
+                while len(lines) < _MAX_HEADER_LINES:
+                    line = await s.readline()
+                    lines.append(line)
+                    if not line or line == b"\r\n":
+                        break
+                return s, _read_head(_Lines(lines), l, parse_headers)
+            except OSError:
+                s.close()
+                if reused and retry and replayable:
+                    retry = False
+                    self.stale += 1
+                    continue
+                raise
+            except BaseException:
+                s.close()
+                raise
+
+    async def arequest(
+        self,
+        method,
+        url,
+        data=None,
+        json=None,
+        headers=None,
+        auth=None,
+        timeout=None,
+        parse_headers=True,
+    ):
+        if self._aunread:
+            await self._asettle()
+        h = self.headers.copy()
+        if headers:
+            h.update(headers)
+        if auth is not None:
+            _auth_header(h, auth)
+        proto, host, port, path = _parse_url(url)
+        # streams and blocking sockets live in separate pool slots
+        key = ("aio", proto, host, port)
+        self.requests += 1
+
+        coro = self._exchange(key, method, host, path, h, data, json, parse_headers)
+        s, head = await (coro if timeout is None else asyncio.wait_for(coro, timeout))
+        status, reason, resp_d, redirect, length, chunked, close = head
+
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            length = 0
+            chunked = False
+        body = _ABody(s, length, None if close else self._releaser(key, s), chunked, timeout)
+
+        if redirect:
+            body.close()
+            if status in [301, 302, 303]:
+                return await self.arequest("GET", redirect, None, None, headers, None, timeout)
+            return await self.arequest(method, redirect, data, json, headers, None, timeout)
+        resp = AsyncResponse(body)
+        resp.status_code = status
+        resp.reason = reason
+        if resp_d is not None:
+            resp.headers = resp_d
+        if body._s is not None:
+            self._aunread.append(resp)
+        return resp
+
+    def ahead(self, url, **kw):
+        return self.arequest("HEAD", url, **kw)
+
+    def aget(self, url, **kw):
+        return self.arequest("GET", url, **kw)
+
+    def apost(self, url, **kw):
+        return self.arequest("POST", url, **kw)
+
+    def aput(self, url, **kw):
+        return self.arequest("PUT", url, **kw)
+
+    def apatch(self, url, **kw):
+        return self.arequest("PATCH", url, **kw)
+
+    def adelete(self, url, **kw):
+        return self.arequest("DELETE", url, **kw)
+
+
+_default = None
+
+
+def session():
+    """The process-wide AsyncSession used by the module-level functions."""
+    global _default
+    if _default is None:
+        _default = AsyncSession()
+    return _default
+
+
+def arequest(method, url, **kw):
+    return session().arequest(method, url, **kw)
+
+
+def ahead(url, **kw):
+    return session().arequest("HEAD", url, **kw)
+
+
+def aget(url, **kw):
+    return session().arequest("GET", url, **kw)
+
+
+def apost(url, **kw):
+    return session().arequest("POST", url, **kw)
+
+
+def aput(url, **kw):
+    return session().arequest("PUT", url, **kw)
+
+
+def apatch(url, **kw):
+    return session().arequest("PATCH", url, **kw)
+
+
+def adelete(url, **kw):
+    return session().arequest("DELETE", url, **kw)
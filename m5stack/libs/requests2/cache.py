@@ -0,0 +1,150 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Conditional GET on top of requests2.
+#
+#   from requests2 import cache
+#
+#   status = cache.fetch(url, "/flash/res/img/logo.png")
+#   if status == 200:
+#       ...  # new file on flash
+#   elif status == 304:
+#       ...  # file on flash is still current, nothing was downloaded
+#
+# The ETag / Last-Modified of the last 200 are kept in Validators and sent
+# back as If-None-Match / If-Modified-Since. For files they are stored next
+# to the file as <path>.meta, so they survive a reboot.
+
+import os
+import ujson
+from . import request
+
+META_SUFFIX = ".meta"
+
+
+def _header(resp, name):
+    # header names keep the server's spelling
+    h = getattr(resp, "headers", None)
+    if not h:
+        return None
+    v = h.get(name)
+    if v is not None:
+        return v
+    name = name.lower()
+    for k, v in h.items():
+        if k.lower() == name:
+            return v
+    return None
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+class Validators:
+    """ETag / Last-Modified of the last full response for one URL."""
+
+    def __init__(self, url=None, etag=None, last_modified=None):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def __bool__(self):
+        return bool(self.etag or self.last_modified)
+
+    def clear(self):
+        self.etag = None
+        self.last_modified = None
+
+    def apply(self, url, headers):
+        """Add the conditional headers for ``url`` to ``headers``."""
+        if self.url != url:
+            return headers
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def update(self, url, resp):
+        """Take the validators of a 200 response."""
+        self.url = url
+        self.etag = _header(resp, "ETag")
+        self.last_modified = _header(resp, "Last-Modified")
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                d = ujson.load(f)
+        except (OSError, ValueError):
+            self.url = None
+            self.clear()
+            return False
+        self.url = d.get("url")
+        self.etag = d.get("etag")
+        self.last_modified = d.get("last_modified")
+        return True
+
+    def save(self, path):
+        if not self:
+            remove(path)
+            return
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            ujson.dump(
+                {"url": self.url, "etag": self.etag, "last_modified": self.last_modified}, f
+            )
+        os.rename(tmp, path)
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def get(url, validators, session=None, headers={}, **kw):
+    """GET ``url``, revalidating with ``validators``.
+
+    A 304 comes back with an empty body and ``validators`` untouched; a 200
+    refreshes them. ``session`` is an optional requests2.Session to reuse
+    connections between polls.
+    """
+    h = validators.apply(url, dict(headers))
+    if session is None:
+        resp = request("GET", url, headers=h, **kw)
+    else:
+        resp = session.request("GET", url, headers=h, **kw)
+    if resp.status_code == 200:
+        validators.update(url, resp)
+    return resp
+
+
+def fetch(url, path, session=None, headers={}, buf=None, **kw):
+    """Download ``url`` to ``path`` unless the copy on flash is current.
+
+    Returns the status code: 200 when ``path`` was rewritten, 304 when it
+    was left alone, anything else when the server failed (``path`` is kept).
+    """
+    meta = path + META_SUFFIX
+    v = Validators()
+    # validators without the file they describe would turn into a 304 for
+    # content we do not have
+    if _exists(path):
+        v.load(meta)
+    resp = get(url, v, session, headers, **kw)
+    try:
+        status = resp.status_code
+        if status == 200:
+            # body first: a stale .meta only costs one full download
+            resp.save_to(path, buf)
+            v.save(meta)
+    finally:
+        resp.close()
+    return status
@@ -4,7 +4,11 @@
 
 package(
     "requests2",
-    ("__init__.py",),
+    (
+        "__init__.py",
+        "aio.py",
+        "cache.py",
+    ),
     base_path="..",
     opt=0,
 )
@@ -3,6 +3,8 @@
 # SPDX-License-Identifier: MIT
 
 from . import robust
+from .simple import Topic
+from .dispatch import TopicDispatcher
 from micropython import schedule
 
 
@@ -20,21 +22,13 @@ class MQTTClient(robust.MQTTClient):
     ):
         super().__init__(client_id, server, port, user, password, keepalive, ssl, ssl_params)
         self.set_callback(self._callback)
-        self._topics = {}
+        self.dispatcher = TopicDispatcher(schedule)
 
     def _callback(self, topic, msg):
-        if isinstance(topic, bytes):
-            handler = self._topics.get(topic.decode())
-            if handler is None:
-                handler = self._topics.get(topic)
-        elif isinstance(topic, str):
-            handler = self._topics.get(topic)
-            if handler is None:
-                handler = self._topics.get(topic.encode())
-
-        if handler is not None:
-            schedule(handler, (topic, msg))
+        self.dispatcher.dispatch(topic, msg)
 
     def subscribe(self, topic, handler, qos=0):
-        self._topics[topic] = handler
+        # one handler per filter, as before; wildcards now route too
+        self.dispatcher.remove(topic)
+        self.dispatcher.add(topic, handler)
         return super().subscribe(topic, qos)
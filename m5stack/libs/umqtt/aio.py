@@ -0,0 +1,490 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# asyncio flavour of umqtt.
+#
+#   import asyncio
+#   from umqtt.aio import MQTTClient
+#
+#   async def main():
+#       c = MQTTClient("dev1", "broker.local", keepalive=60, window=16)
+#       await c.connect()
+#       for i in range(1000):
+#           await c.publish("sensors/t", b"%d" % i, qos=1)
+#       await c.drain()
+#
+# publish() only queues the packet; a writer task sends the queue in
+# batches with one drain() each. Up to `window` QoS 1 messages may wait for
+# their PUBACK at the same time; unacknowledged ones are sent again with the
+# DUP flag after `retry_ms` and after a reconnect. A housekeeping task sends
+# PINGREQ when the link is quiet and drops the connection when the broker
+# stops answering.
+
+import asyncio
+import socket
+import time
+import dnscache
+from .simple import MQTTException
+
+_TICK_MS = 500
+# packets written per drain() so a long queue does not starve the reader
+_BATCH = 32
+
+
+def _b(s):
+    return s.encode() if isinstance(s, str) else s
+
+
+def _put_len(buf, i, n):
+    # MQTT remaining length: 7 bits per byte, LSB first
+    while n > 0x7F:
+        buf[i] = (n & 0x7F) | 0x80
+        n >>= 7
+        i += 1
+    buf[i] = n
+    return i + 1
+
+
+def _len_size(n):
+    return 1 if n < 0x80 else 2 if n < 0x4000 else 3 if n < 0x200000 else 4
+
+
+def _put_str(buf, i, s):
+    n = len(s)
+    buf[i] = n >> 8
+    buf[i + 1] = n & 0xFF
+    buf[i + 2 : i + 2 + n] = s
+    return i + 2 + n
+
+
+def _publish_packet(topic, msg, retain, qos, pid):
+    sz = 2 + len(topic) + len(msg) + (2 if qos else 0)
+    if sz > 268435455:
+        raise ValueError("message too long")
+    pkt = bytearray(1 + _len_size(sz) + sz)
+    pkt[0] = 0x30 | qos << 1 | retain
+    i = _put_str(pkt, _put_len(pkt, 1, sz), topic)
+    if qos:
+        pkt[i] = pid >> 8
+        pkt[i + 1] = pid & 0xFF
+        i += 2
+    pkt[i:] = msg
+    return pkt
+
+
+class MQTTClient:
+    """MQTT 3.1.1 client on asyncio streams.
+
+    ``window`` bounds the QoS 1 messages awaiting PUBACK, ``queue_size`` the
+    packets waiting to be written; publish() blocks only when the queue is
+    full. With ``auto_reconnect`` a lost connection is re-established in the
+    background and the queue carries on where it stopped.
+    """
+
+    DELAY = 2
+
+    def __init__(
+        self,
+        client_id,
+        server,
+        port=0,
+        user=None,
+        password=None,
+        keepalive=60,
+        ssl=False,
+        window=16,
+        queue_size=64,
+        retry_ms=5000,
+        auto_reconnect=True,
+    ):
+        if port == 0:
+            port = 8883 if ssl else 1883
+        if not 1 <= window <= 65535:
+            raise ValueError("window out of range")
+        if not 0 <= keepalive < 65536:
+            raise ValueError("keepalive out of range")
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        # True (no certificate check) or an ssl.SSLContext
+        self.ssl = ssl
+        self.window = window
+        self.queue_size = queue_size
+        self.retry_ms = retry_ms
+        self.auto_reconnect = auto_reconnect
+        self.cb = None
+        self.lw_topic = None
+        self.lw_msg = None
+        self.lw_qos = 0
+        self.lw_retain = False
+
+        self.pid = 0
+        self._stream = None
+        self._tasks = []
+        self._reconnecting = None
+        # control packets (PUBACK, SUBSCRIBE, PINGREQ, retransmits) skip the
+        # window and go out before queued publishes
+        self._ctrl = []
+        # (packet, pid); pid 0 for QoS 0
+        self._queue = []
+        # pid -> [packet, sent_ms]
+        self._inflight = {}
+        # pid -> [Event, granted qos or None]
+        self._subs = {}
+        self._wake = asyncio.Event()
+        self._space = asyncio.Event()
+        self._acked = asyncio.Event()
+        self._last_tx = 0
+        self._last_rx = 0
+        self._last_ping = 0
+
+        self.published = 0
+        self.acked = 0
+        self.retransmits = 0
+        self.received = 0
+        self.reconnects = 0
+
+    def set_callback(self, f):
+        """``f(topic, msg)`` for every incoming PUBLISH; a coroutine result is run as a task."""
+        self.cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        assert 0 <= qos <= 2
+        assert topic
+        self.lw_topic = topic
+        self.lw_msg = msg
+        self.lw_qos = qos
+        self.lw_retain = retain
+
+    def isconnected(self):
+        return self._stream is not None
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "acked": self.acked,
+            "retransmits": self.retransmits,
+            "received": self.received,
+            "reconnects": self.reconnects,
+            "inflight": len(self._inflight),
+            "queued": len(self._queue),
+        }
+
+    def _connect_packet(self, clean_session):
+        cid = _b(self.client_id)
+        sz = 10 + 2 + len(cid)
+        flags = clean_session << 1
+        if self.user is not None:
+            user, pswd = _b(self.user), _b(self.pswd)
+            sz += 2 + len(user) + 2 + len(pswd)
+            flags |= 0xC0
+        if self.lw_topic:
+            lw_topic, lw_msg = _b(self.lw_topic), _b(self.lw_msg)
+            sz += 2 + len(lw_topic) + 2 + len(lw_msg)
+            flags |= 0x4 | (self.lw_qos & 0x3) << 3 | self.lw_retain << 5
+        pkt = bytearray(1 + _len_size(sz) + sz)
+        pkt[0] = 0x10
+        i = _put_len(pkt, 1, sz)
+        pkt[i : i + 10] = b"\0\x04MQTT\x04\0\0\0"
+        pkt[i + 7] = flags
+        pkt[i + 8] = self.keepalive >> 8
+        pkt[i + 9] = self.keepalive & 0xFF
+        i = _put_str(pkt, i + 10, cid)
+        if self.lw_topic:
+            i = _put_str(pkt, i, lw_topic)
+            i = _put_str(pkt, i, lw_msg)
+        if self.user is not None:
+            i = _put_str(pkt, i, user)
+            i = _put_str(pkt, i, pswd)
+        return pkt
+
+    async def _open(self, clean_session):
+        ip = dnscache.getaddrinfo(self.server, self.port, 0, socket.SOCK_STREAM)[0][-1][0]
+        if self.ssl:
+            ctx = self.ssl
+            if ctx is True:
+                import ssl
+
+                ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                ctx.verify_mode = ssl.CERT_NONE
+            s, _ = await asyncio.open_connection(
+                ip, self.port, ssl=ctx, server_hostname=self.server
+            )
+        else:
+            s, _ = await asyncio.open_connection(ip, self.port)
+        try:
+            s.write(self._connect_packet(clean_session))
+            await s.drain()
+            resp = await s.readexactly(4)
+            if resp[0] != 0x20 or resp[1] != 0x02:
+                raise MQTTException("bad CONNACK")
+            if resp[3] != 0:
+                raise MQTTException(resp[3])
+        except BaseException:
+            s.close()
+            raise
+        return s, resp[2] & 1
+
+    async def connect(self, clean_session=True, timeout=10):
+        """Connect and start the I/O tasks; returns the session-present flag."""
+        if self._stream is not None:
+            raise MQTTException("already connected")
+        s, present = await asyncio.wait_for(self._open(clean_session), timeout)
+        self._stream = s
+        self._last_tx = self._last_rx = self._last_ping = time.ticks_ms()
+        # whatever was not acknowledged goes out again, oldest first
+        now = time.ticks_ms()
+        for pid in sorted(
+            self._inflight, key=lambda p: time.ticks_diff(self._inflight[p][1], now)
+        ):
+            self._resend(pid, now)
+        self._tasks = [
+            asyncio.create_task(self._writer(s)),
+            asyncio.create_task(self._reader(s)),
+            asyncio.create_task(self._housekeeping()),
+        ]
+        self._wake.set()
+        return present
+
+    async def reconnect(self):
+        """Connect again, retrying every DELAY seconds until it succeeds."""
+        while True:
+            try:
+                await self.connect(False)
+                self.reconnects += 1
+                return
+            except (OSError, MQTTException, asyncio.TimeoutError):
+                await asyncio.sleep(self.DELAY)
+
+    async def _reconnect(self):
+        try:
+            await self.reconnect()
+        finally:
+            self._reconnecting = None
+
+    def _down(self):
+        # called from one of the I/O tasks when the connection breaks
+        s = self._stream
+        if s is None:
+            return
+        self._stream = None
+        cur = asyncio.current_task()
+        for t in self._tasks:
+            if t is not cur:
+                t.cancel()
+        self._tasks = []
+        s.close()
+        self._ctrl = []
+        for e in self._subs.values():
+            e[0].set()
+        if self.auto_reconnect and self._reconnecting is None:
+            self._reconnecting = asyncio.create_task(self._reconnect())
+
+    async def disconnect(self):
+        self.auto_reconnect = False
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+            self._reconnecting = None
+        s = self._stream
+        if s is None:
+            return
+        self._stream = None
+        for t in self._tasks:
+            t.cancel()
+        self._tasks = []
+        try:
+            s.write(b"\xe0\0")
+            await s.drain()
+        except OSError:
+            pass
+        s.close()
+
+    def _next_pid(self):
+        while True:
+            self.pid = self.pid % 65535 + 1
+            if self.pid not in self._inflight and self.pid not in self._subs:
+                return self.pid
+
+    def _send_ctrl(self, pkt):
+        self._ctrl.append(pkt)
+        self._wake.set()
+
+    def _resend(self, pid, now):
+        e = self._inflight[pid]
+        e[0][0] |= 0x08  # DUP
+        e[1] = now
+        self._ctrl.append(e[0])
+        self.retransmits += 1
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        """Queue a message; returns its packet id (0 for QoS 0).
+
+        Waits only while the outbound queue is full.
+        """
+        if qos == 2:
+            raise ValueError("QoS 2 not supported")
+        while len(self._queue) >= self.queue_size:
+            self._space.clear()
+            await self._space.wait()
+        pid = self._next_pid() if qos else 0
+        self._queue.append((_publish_packet(_b(topic), _b(msg), retain, qos, pid), pid))
+        self.published += 1
+        self._wake.set()
+        return pid
+
+    async def drain(self, timeout=None):
+        """Wait until every queued message is written and every QoS 1 message acknowledged."""
+
+        async def idle():
+            while self._queue or self._inflight:
+                self._acked.clear()
+                await self._acked.wait()
+
+        await (idle() if timeout is None else asyncio.wait_for(idle(), timeout))
+
+    async def subscribe(self, topic, qos=0, timeout=10):
+        """Subscribe and wait for the SUBACK; returns the granted QoS."""
+        if self._stream is None:
+            raise OSError(-1)
+        topic = _b(topic)
+        pid = self._next_pid()
+        sz = 2 + 2 + len(topic) + 1
+        pkt = bytearray(1 + _len_size(sz) + sz)
+        pkt[0] = 0x82
+        i = _put_len(pkt, 1, sz)
+        pkt[i] = pid >> 8
+        pkt[i + 1] = pid & 0xFF
+        i = _put_str(pkt, i + 2, topic)
+        pkt[i] = qos
+        e = [asyncio.Event(), None]
+        self._subs[pid] = e
+        try:
+            self._send_ctrl(pkt)
+            await asyncio.wait_for(e[0].wait(), timeout)
+        finally:
+            self._subs.pop(pid, None)
+        if e[1] is None:
+            raise OSError(-1)
+        if e[1] == 0x80:
+            raise MQTTException(e[1])
+        return e[1]
+
+    async def _writer(self, s):
+        ctrl = self._ctrl
+        q = self._queue
+        inflight = self._inflight
+        try:
+            while True:
+                n = 0
+                while ctrl:
+                    s.write(ctrl.pop(0))
+                    n += 1
+                while q and n < _BATCH:
+                    pkt, pid = q[0]
+                    if pid:
+                        if len(inflight) >= self.window:
+                            break
+                        inflight[pid] = [pkt, time.ticks_ms()]
+                    q.pop(0)
+                    s.write(pkt)
+                    n += 1
+                if n:
+                    self._space.set()
+                    if not q and not inflight:
+                        self._acked.set()
+                    await s.drain()
+                    self._last_tx = time.ticks_ms()
+                    continue
+                self._wake.clear()
+                await self._wake.wait()
+        except OSError:
+            self._down()
+
+    async def _reader(self, s):
+        try:
+            while True:
+                op = (await s.readexactly(1))[0]
+                sz = 0
+                sh = 0
+                while True:
+                    b = (await s.readexactly(1))[0]
+                    sz |= (b & 0x7F) << sh
+                    if not b & 0x80:
+                        break
+                    sh += 7
+                body = await s.readexactly(sz) if sz else b""
+                self._last_rx = time.ticks_ms()
+                self._dispatch(op, body)
+        except Exception:
+            # I/O errors, a malformed packet, QoS 2: drop the connection
+            self._down()
+
+    def _dispatch(self, op, body):
+        kind = op & 0xF0
+        if kind == 0x40:  # PUBACK
+            pid = body[0] << 8 | body[1]
+            if self._inflight.pop(pid, None) is not None:
+                self.acked += 1
+                self._wake.set()
+                if not self._inflight and not self._queue:
+                    self._acked.set()
+        elif kind == 0x30:  # PUBLISH
+            n = body[0] << 8 | body[1]
+            topic = body[2 : 2 + n]
+            i = 2 + n
+            qos = op >> 1 & 3
+            if qos:
+                pid_hi, pid_lo = body[i], body[i + 1]
+                i += 2
+            self.received += 1
+            if self.cb is not None:
+                # a failing callback loses its message, not the connection
+                try:
+                    r = self.cb(topic, body[i:])
+                    if hasattr(r, "send"):
+                        asyncio.create_task(r)
+                except Exception as e:
+                    print("mqtt callback: %r" % e)
+            if qos == 1:
+                self._send_ctrl(bytes((0x40, 2, pid_hi, pid_lo)))
+            elif qos == 2:
+                raise MQTTException("QoS 2 not supported")
+        elif kind == 0x90:  # SUBACK
+            e = self._subs.get(body[0] << 8 | body[1])
+            if e is not None:
+                e[1] = body[2]
+                e[0].set()
+        elif kind == 0xD0:  # PINGRESP
+            pass
+
+    async def _housekeeping(self):
+        ka_ms = self.keepalive * 1000
+        while True:
+            await asyncio.sleep_ms(_TICK_MS)
+            now = time.ticks_ms()
+            if ka_ms:
+                if time.ticks_diff(now, self._last_rx) > ka_ms * 3 // 2:
+                    # no PINGRESP or anything else for 1.5 keepalives
+                    self._down()
+                    return
+                # ping a quiet link in either direction, at most every half keepalive
+                if (
+                    time.ticks_diff(now, self._last_tx) >= ka_ms // 2
+                    or time.ticks_diff(now, self._last_rx) >= ka_ms // 2
+                ) and time.ticks_diff(now, self._last_ping) >= ka_ms // 2:
+                    self._last_ping = self._last_tx = now
+                    self._send_ctrl(b"\xc0\0")
+            if self.retry_ms:
+                late = [
+                    pid
+                    for pid, e in self._inflight.items()
+                    if time.ticks_diff(now, e[1]) >= self.retry_ms
+                ]
+                for pid in late:
+                    self._resend(pid, now)
+                if late:
+                    self._wake.set()
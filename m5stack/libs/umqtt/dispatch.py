@@ -0,0 +1,174 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Route incoming MQTT messages to handlers by topic filter.
+#
+# Filters are compiled into a trie with one level per topic level, so a
+# message costs one dict lookup for its literal level plus one for "+" per
+# level, however many subscriptions there are:
+#
+#   d = TopicDispatcher()
+#   d.add("home/+/temp", on_temp)
+#   d.add("home/#", on_any)
+#   d.dispatch(b"home/kitchen/temp", b"21.5")  # -> on_temp and on_any
+#
+# Handlers get one (topic, msg) tuple, the form micropython.schedule() and
+# the existing subscribe callbacks use.
+
+# node: [children {level: node}, handlers for the filter ending here,
+#        handlers for "<filter>/#"]
+_CHILD = 0
+_EXACT = 1
+_MULTI = 2
+
+
+def _new():
+    return [{}, [], []]
+
+
+def _levels(topic):
+    if isinstance(topic, (bytes, bytearray, memoryview)):
+        topic = str(topic, "utf-8")
+    return topic.split("/")
+
+
+def _call(handler, arg):
+    handler(arg)
+
+
+class TopicDispatcher:
+    """Topic trie with ``+`` / ``#`` wildcards and per-handler counters.
+
+    ``invoke(handler, arg)`` runs each matched handler; pass
+    micropython.schedule to run them outside the caller's context.
+    """
+
+    def __init__(self, invoke=None):
+        self._root = _new()
+        self._invoke = _call if invoke is None else invoke
+        # filter -> list of [handler, calls, errors]
+        self._subs = {}
+        self.messages = 0
+        self.unmatched = 0
+
+    def _node(self, pattern, create):
+        node = self._root
+        for level in pattern.split("/"):
+            if level == "#":
+                return node, _MULTI
+            child = node[_CHILD].get(level)
+            if child is None:
+                if not create:
+                    return None, None
+                child = node[_CHILD][level] = _new()
+            node = child
+        return node, _EXACT
+
+    def add(self, pattern, handler):
+        """Register ``handler`` for a topic filter; adding the same pair twice is a no-op."""
+        if isinstance(pattern, (bytes, bytearray)):
+            pattern = str(pattern, "utf-8")
+        levels = pattern.split("/")
+        for i, level in enumerate(levels):
+            if level == "#" and i != len(levels) - 1:
+                raise ValueError("'#' must be the last level")
+            if ("+" in level or "#" in level) and len(level) > 1:
+                raise ValueError("wildcard must fill a whole level")
+        node, slot = self._node(pattern, True)
+        entries = self._subs.setdefault(pattern, [])
+        for e in entries:
+            if e[0] is handler:
+                return
+        entry = [handler, 0, 0]
+        entries.append(entry)
+        node[slot].append(entry)
+
+    def remove(self, pattern, handler=None):
+        """Drop one handler of a filter, or all of them when ``handler`` is None."""
+        if isinstance(pattern, (bytes, bytearray)):
+            pattern = str(pattern, "utf-8")
+        entries = self._subs.get(pattern)
+        if not entries:
+            return
+        node, slot = self._node(pattern, False)
+        keep = [e for e in entries if handler is not None and e[0] is not handler]
+        for e in entries:
+            if e not in keep:
+                node[slot].remove(e)
+        if keep:
+            self._subs[pattern] = keep
+        else:
+            del self._subs[pattern]
+            self._prune(pattern)
+
+    def _prune(self, pattern):
+        # drop empty nodes along the filter's path, deepest first
+        path = [self._root]
+        levels = pattern.split("/")
+        if levels[-1] == "#":
+            levels.pop()
+        for level in levels:
+            node = path[-1][_CHILD].get(level)
+            if node is None:
+                return
+            path.append(node)
+        for i in range(len(levels), 0, -1):
+            node = path[i]
+            if node[_CHILD] or node[_EXACT] or node[_MULTI]:
+                return
+            del path[i - 1][_CHILD][levels[i - 1]]
+
+    def __contains__(self, pattern):
+        if isinstance(pattern, (bytes, bytearray)):
+            pattern = str(pattern, "utf-8")
+        return pattern in self._subs
+
+    def patterns(self):
+        return list(self._subs)
+
+    def match(self, topic):
+        """Return the [handler, calls, errors] entries whose filter matches ``topic``."""
+        levels = _levels(topic)
+        out = []
+        n = len(levels)
+        # topics starting with "$" are not matched by a leading wildcard
+        sys_topic = levels[0][:1] == "$"
+        stack = [(self._root, 0)]
+        while stack:
+            node, i = stack.pop()
+            if not (sys_topic and i == 0):
+                out.extend(node[_MULTI])
+            if i == n:
+                out.extend(node[_EXACT])
+                continue
+            children = node[_CHILD]
+            child = children.get(levels[i])
+            if child is not None:
+                stack.append((child, i + 1))
+            if not (sys_topic and i == 0):
+                child = children.get("+")
+                if child is not None:
+                    stack.append((child, i + 1))
+        return out
+
+    def dispatch(self, topic, msg):
+        """Run every handler matching ``topic``; returns how many there were."""
+        self.messages += 1
+        entries = self.match(topic)
+        if not entries:
+            self.unmatched += 1
+            return 0
+        arg = (topic, msg)
+        for e in entries:
+            e[1] += 1
+            try:
+                self._invoke(e[0], arg)
+            except Exception:
+                e[2] += 1
+                raise
+        return len(entries)
+
+    def stats(self):
+        """Per filter, a list of (handler, calls, errors)."""
+        return {p: [tuple(e) for e in entries] for p, entries in self._subs.items()}
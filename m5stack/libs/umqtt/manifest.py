@@ -6,8 +6,11 @@ package(
     "umqtt",
     (
         "__init__.py",
+        "aio.py",
+        "dispatch.py",
         "robust.py",
         "simple.py",
+        "store.py",
     ),
     base_path="..",
     opt=0,
@@ -9,6 +9,11 @@ from . import simple
 class MQTTClient(simple.MQTTClient):
     DELAY = 2
     DEBUG = False
+    # store-and-forward, see set_store()
+    store = None
+    DRAIN_RATE = 20
+    DRAIN_BATCH = 10
+    _online = False
 
     def delay(self, i):
         utime.sleep(self.DELAY)
@@ -20,6 +25,11 @@ class MQTTClient(simple.MQTTClient):
             else:
                 print("mqtt: %r" % e)
 
+    def connect(self, clean_session=True):
+        ret = super().connect(clean_session)
+        self._online = True
+        return ret
+
     def reconnect(self):
         i = 0
         while 1:
@@ -30,7 +40,79 @@ class MQTTClient(simple.MQTTClient):
                 i += 1
                 self.delay(i)
 
+    def set_store(self, store, rate=None, batch=None):
+        """Buffer publishes in ``store`` (a umqtt.store.RingLog) while offline.
+
+        With a store publish() never waits for the broker: messages that
+        cannot be sent now are appended to the log, and service() forwards
+        them in order, at most ``rate`` per second and ``batch`` per call,
+        once the connection is back.
+        """
+        self.store = store
+        if rate is not None:
+            self.DRAIN_RATE = rate
+        if batch is not None:
+            self.DRAIN_BATCH = batch
+        self._tokens = self.DRAIN_BATCH
+        self._refill = utime.ticks_ms()
+        self._next_try = utime.ticks_ms()
+
+    def _offline(self, e, in_reconnect=False):
+        self.log(in_reconnect, e)
+        self._online = False
+        self._next_try = utime.ticks_add(utime.ticks_ms(), self.DELAY * 1000)
+        try:
+            self.sock.close()
+        except (OSError, AttributeError):
+            pass
+
+    def service(self):
+        """Reconnect when due and forward stored messages; returns how many were sent."""
+        st = self.store
+        now = utime.ticks_ms()
+        if not self._online:
+            if utime.ticks_diff(now, self._next_try) < 0:
+                return 0
+            try:
+                self.connect(False)
+            except (OSError, simple.MQTTException) as e:
+                # unreachable, or refused by the broker: the records stay
+                # in the store for the next attempt
+                self._offline(e, True)
+                return 0
+        # token bucket: DRAIN_RATE per second, bursts up to DRAIN_BATCH
+        gained = utime.ticks_diff(now, self._refill) * self.DRAIN_RATE // 1000
+        if gained:
+            self._tokens = min(self.DRAIN_BATCH, self._tokens + gained)
+            self._refill = now
+        sent = 0
+        while self._tokens > 0:
+            rec = st.peek()
+            if rec is None:
+                break
+            seq, topic, msg, retain, qos = rec
+            try:
+                # qos 1 waits for this PUBACK before the next record
+                super().publish(topic, msg, retain, qos)
+            except OSError as e:
+                self._offline(e)
+                break
+            st.ack(seq)
+            self._tokens -= 1
+            sent += 1
+        return sent
+
     def publish(self, topic, msg, retain=False, qos=0):
+        if self.store is not None:
+            if self._online and not len(self.store):
+                try:
+                    return super().publish(topic, msg, retain, qos)
+                except OSError as e:
+                    self._offline(e)
+            # keep the order: nothing overtakes what is already stored
+            self.store.append(topic, msg, retain, qos)
+            self.service()
+            return
         while 1:
             try:
                 return super().publish(topic, msg, retain, qos)
@@ -39,6 +121,10 @@ class MQTTClient(simple.MQTTClient):
             self.reconnect()
 
     def wait_msg(self):
+        if self.store is not None:
+            # errors go to publish()/service(), which park the link and
+            # keep the unacknowledged message in the store
+            return super().wait_msg()
         while 1:
             try:
                 return super().wait_msg()
@@ -47,6 +133,17 @@ class MQTTClient(simple.MQTTClient):
             self.reconnect()
 
     def check_msg(self, attempts=2):
+        if self.store is not None:
+            # never block on a dead link; service() brings it back
+            op = None
+            if self._online:
+                self.sock.setblocking(False)
+                try:
+                    op = super().wait_msg()
+                except OSError as e:
+                    self._offline(e)
+            self.service()
+            return op
         while attempts:
             self.sock.setblocking(False)
             try:
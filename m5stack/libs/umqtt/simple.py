@@ -4,13 +4,32 @@
 
 import socket
 import struct
+import dnscache
 
 
 class MQTTException(Exception):
     pass
 
 
+class Topic:
+    """A publish topic encoded once, length prefix included.
+
+    Passing it to publish() instead of a str saves encoding and copying the
+    name's length on every message.
+    """
+
+    def __init__(self, name):
+        if isinstance(name, str):
+            name = name.encode()
+        self.name = name
+        self.encoded = bytes((len(name) >> 8, len(name) & 0xFF)) + name
+
+
 class MQTTClient:
+    # size of the publish buffer; a larger packet sends its payload with a
+    # second write, straight from the caller's object
+    BUF_SIZE = 128
+
     def __init__(
         self,
         client_id,
@@ -39,6 +58,9 @@ class MQTTClient:
         self.lw_msg = None
         self.lw_qos = 0
         self.lw_retain = False
+        # short publish packets are assembled here and sent with one write
+        self._pbuf = bytearray(self.BUF_SIZE)
+        self._rbuf = bytearray(3)
 
     def _send_str(self, s):
         self.sock.write(struct.pack("!H", len(s)))
@@ -67,7 +89,7 @@ class MQTTClient:
 
     def connect(self, clean_session=True):
         self.sock = socket.socket()
-        addr = socket.getaddrinfo(self.server, self.port)[0][-1]
+        addr = dnscache.getaddrinfo(self.server, self.port)[0][-1]
         self.sock.connect(addr)
         if self.ssl:
             import ssl
@@ -126,35 +148,60 @@ class MQTTClient:
             return False
 
     def publish(self, topic, msg, retain=False, qos=0):
-        pkt = bytearray(b"\x30\0\0\0")
-        pkt[0] |= qos << 1 | retain
-        sz = 2 + len(topic) + len(msg)
+        pre = isinstance(topic, Topic)
+        if pre:
+            topic = topic.encoded
+            tl = len(topic)
+        else:
+            if isinstance(topic, str):
+                topic = topic.encode()
+            tl = len(topic) + 2
+        if isinstance(msg, str):
+            msg = msg.encode()
+        sz = tl + len(msg)
         if qos > 0:
             sz += 2
         assert sz < 2097152
+        buf = self._pbuf
+        n = sz - len(msg) + (2 if sz < 0x80 else 3 if sz < 0x4000 else 4)
+        if len(buf) < n:
+            # a topic too long for the buffer: one-off, not kept
+            buf = bytearray(n)
+        buf[0] = 0x30 | qos << 1 | retain
         i = 1
         while sz > 0x7F:
-            pkt[i] = (sz & 0x7F) | 0x80
+            buf[i] = (sz & 0x7F) | 0x80
             sz >>= 7
             i += 1
-        pkt[i] = sz
-        self.sock.write(pkt, i + 1)
-        self._send_str(topic)
+        buf[i] = sz
+        i += 1
+        if pre:
+            buf[i : i + tl] = topic
+        else:
+            buf[i] = (tl - 2) >> 8
+            buf[i + 1] = (tl - 2) & 0xFF
+            buf[i + 2 : i + tl] = topic
+        i += tl
         if qos > 0:
-            self.pid += 1
+            self.pid = self.pid % 65535 + 1
             pid = self.pid
-            struct.pack_into("!H", pkt, 0, pid)
-            self.sock.write(pkt, 2)
-        self.sock.write(msg)
+            buf[i] = pid >> 8
+            buf[i + 1] = pid & 0xFF
+            i += 2
+        if i + len(msg) <= len(buf):
+            buf[i : i + len(msg)] = msg
+            self.sock.write(buf, i + len(msg))
+        else:
+            self.sock.write(buf, i)
+            self.sock.write(msg)
         if qos == 1:
+            rb = self._rbuf
             while 1:
                 op = self.wait_msg()
                 if op == 0x40:
-                    sz = self.sock.read(1)
-                    assert sz == b"\x02"
-                    rcv_pid = self.sock.read(2)
-                    rcv_pid = rcv_pid[0] << 8 | rcv_pid[1]
-                    if pid == rcv_pid:
+                    self.sock.readinto(rb, 3)
+                    assert rb[0] == 2
+                    if pid == rb[1] << 8 | rb[2]:
                         return
         elif qos == 2:
             assert 0
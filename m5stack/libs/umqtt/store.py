@@ -0,0 +1,295 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Append-only ring log of outbound MQTT messages on the filesystem.
+#
+# Messages go to segment files <dir>/<n>.log, each up to `segment_size`
+# bytes. Segments are only ever appended to and deleted once read, so
+# every flash block is written once per pass around the ring and LittleFS
+# spreads the passes over the whole partition. When `segments` files are
+# full the oldest one is dropped (counted in `dropped`) instead of blocking
+# the producer.
+#
+# Record: magic, flags (qos | retain << 2), seq, topic length, msg length,
+# topic, msg. The read position is saved to <dir>/cursor every
+# `commit_every` acks and whenever a segment is finished, so after a reset
+# at most `commit_every` messages are sent a second time; `seq` lets the
+# receiver drop them.
+
+import os
+import struct
+
+_HDR = "<BBIHI"
+_HDR_LEN = 12
+_MAGIC = 0xA5
+
+
+def _mkdirs(path):
+    p = ""
+    for part in path.strip("/").split("/"):
+        p += "/" + part
+        try:
+            os.mkdir(p)
+        except OSError:
+            pass
+
+
+class RingLog:
+    """Fixed-size flash queue of (topic, msg, retain, qos) records."""
+
+    def __init__(
+        self, path="/flash/mqtt_log", segments=4, segment_size=16384, sync_every=1, commit_every=16
+    ):
+        if segments < 2:
+            raise ValueError("need at least 2 segments")
+        self.path = path
+        self.segments = segments
+        self.segment_size = segment_size
+        self.sync_every = sync_every
+        self.commit_every = commit_every
+        self.dropped = 0
+        self._hdr = bytearray(_HDR_LEN)
+        _mkdirs(path)
+        # segment number -> records in it
+        self._counts = {}
+        self._segs = []
+        self._w = None
+        self._w_size = 0
+        self._unsynced = 0
+        self._r = None
+        self._r_seg = None
+        self._r_off = 0
+        self._r_idx = 0
+        self._head = None
+        self._acks = 0
+        self.pending = 0
+        self.seq = 0
+        self._open()
+
+    def _seg_path(self, n):
+        return "%s/%d.log" % (self.path, n)
+
+    def _scan(self, n, off=0):
+        # number of valid records from off, end of the valid data, last seq
+        count = 0
+        last = None
+        try:
+            f = open(self._seg_path(n), "rb")
+        except OSError:
+            return 0, 0, None
+        with f:
+            f.seek(off)
+            while True:
+                h = f.read(_HDR_LEN)
+                if len(h) < _HDR_LEN:
+                    break
+                magic, _, seq, tl, ml = struct.unpack(_HDR, h)
+                if magic != _MAGIC:
+                    break
+                body = tl + ml
+                if len(f.read(body)) < body:
+                    break
+                off += _HDR_LEN + body
+                count += 1
+                last = seq
+        return count, off, last
+
+    def _open(self):
+        for name in os.listdir(self.path):
+            if name.endswith(".log"):
+                try:
+                    self._segs.append(int(name[:-4]))
+                except ValueError:
+                    pass
+        self._segs.sort()
+        seg, off, idx = None, 0, 0
+        try:
+            with open(self.path + "/cursor") as f:
+                seg, off, idx = [int(v) for v in f.read().split()]
+        except (OSError, ValueError):
+            pass
+        if seg not in self._segs:
+            seg, off, idx = None, 0, 0
+        else:
+            # read completely before the reset removed them
+            for n in [n for n in self._segs if n < seg]:
+                self._segs.remove(n)
+                os.remove(self._seg_path(n))
+        for n in self._segs:
+            count, end, last = self._scan(n)
+            self._counts[n] = count
+            if last is not None:
+                self.seq = last
+            self.pending += count - (idx if n == seg else 0)
+        if self._segs:
+            self._r_seg = seg if seg is not None else self._segs[0]
+            self._r_off = off if seg is not None else 0
+            self._r_idx = idx if seg is not None else 0
+            last_seg = self._segs[-1]
+            # a torn record at the end must not have data appended after it
+            if end != self._file_size(last_seg):
+                # one segment over the limit until the next rotation, rather
+                # than dropping unsent data at boot
+                self._new_segment(False)
+            else:
+                self._w = open(self._seg_path(last_seg), "ab")
+                self._w_size = end
+        else:
+            self._new_segment()
+            self._r_seg = self._segs[0]
+
+    def _file_size(self, n):
+        try:
+            return os.stat(self._seg_path(n))[6]
+        except OSError:
+            return 0
+
+    def _new_segment(self, evict=True):
+        if self._w is not None:
+            self._w.close()
+        n = self._segs[-1] + 1 if self._segs else 0
+        self._segs.append(n)
+        self._counts[n] = 0
+        self._w = open(self._seg_path(n), "wb")
+        self._w_size = 0
+        self._unsynced = 0
+        while evict and len(self._segs) > self.segments:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        n = self._segs.pop(0)
+        lost = self._counts.pop(n, 0)
+        if n == self._r_seg:
+            lost -= self._r_idx
+            self._close_reader()
+            self._r_seg = self._segs[0]
+            self._r_off = 0
+            self._r_idx = 0
+            self._commit()
+        self.pending -= lost
+        self.dropped += lost
+        try:
+            os.remove(self._seg_path(n))
+        except OSError:
+            pass
+
+    def _close_reader(self):
+        if self._r is not None:
+            self._r.close()
+            self._r = None
+        self._head = None
+
+    def _commit(self):
+        tmp = self.path + "/cursor.tmp"
+        with open(tmp, "w") as f:
+            f.write("%d %d %d" % (self._r_seg, self._r_off, self._r_idx))
+        os.rename(tmp, self.path + "/cursor")
+        self._acks = 0
+
+    def __len__(self):
+        return self.pending
+
+    def append(self, topic, msg, retain=False, qos=0):
+        """Store a message; returns its sequence number."""
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(msg, str):
+            msg = msg.encode()
+        size = _HDR_LEN + len(topic) + len(msg)
+        if size > self.segment_size:
+            raise ValueError("message larger than a segment")
+        if self._w_size and self._w_size + size > self.segment_size:
+            self._new_segment()
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        struct.pack_into(
+            _HDR, self._hdr, 0, _MAGIC, qos | retain << 2, self.seq, len(topic), len(msg)
+        )
+        w = self._w
+        w.write(self._hdr)
+        w.write(topic)
+        w.write(msg)
+        self._w_size += size
+        self._counts[self._segs[-1]] += 1
+        self.pending += 1
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            w.flush()
+            self._unsynced = 0
+        return self.seq
+
+    def peek(self):
+        """Return the oldest unsent record as (seq, topic, msg, retain, qos), or None."""
+        if self._head is not None:
+            return self._head
+        while self.pending:
+            if self._r_seg == self._segs[-1] and self._unsynced:
+                self._w.flush()
+                self._unsynced = 0
+            if self._r is None:
+                self._r = open(self._seg_path(self._r_seg), "rb")
+                self._r.seek(self._r_off)
+            h = self._r.read(_HDR_LEN)
+            if len(h) == _HDR_LEN:
+                magic, flags, seq, tl, ml = struct.unpack(_HDR, h)
+                if magic == _MAGIC:
+                    topic = self._r.read(tl)
+                    msg = self._r.read(ml)
+                    if len(topic) == tl and len(msg) == ml:
+                        self._head = (seq, topic, msg, bool(flags & 4), flags & 3)
+                        return self._head
+            # end of this segment's valid data
+            if self._r_seg == self._segs[-1]:
+                # reopen next time so the appends made meanwhile are visible
+                self._close_reader()
+                return None
+            self._next_segment()
+        return None
+
+    def _next_segment(self):
+        n = self._r_seg
+        lost = self._counts.get(n, 0) - self._r_idx
+        if lost > 0:
+            # torn tail left by a reset
+            self.pending -= lost
+        self._close_reader()
+        self._segs.remove(n)
+        self._counts.pop(n, None)
+        try:
+            os.remove(self._seg_path(n))
+        except OSError:
+            pass
+        self._r_seg = self._segs[0]
+        self._r_off = 0
+        self._r_idx = 0
+        self._commit()
+
+    def ack(self, seq=None):
+        """Mark the record returned by peek() as sent."""
+        head = self._head
+        if head is None or (seq is not None and seq != head[0]):
+            return
+        self._r_off += _HDR_LEN + len(head[1]) + len(head[2])
+        self._r_idx += 1
+        self._head = None
+        self.pending -= 1
+        self._acks += 1
+        if self._r_seg != self._segs[-1] and self._r_idx >= self._counts.get(self._r_seg, 0):
+            self._next_segment()
+        elif self._acks >= self.commit_every:
+            self._commit()
+
+    def flush(self):
+        """Sync pending appends and the read position to flash."""
+        if self._w is not None:
+            self._w.flush()
+            self._unsynced = 0
+        if self._acks:
+            self._commit()
+
+    def close(self):
+        self.flush()
+        self._close_reader()
+        if self._w is not None:
+            self._w.close()
+            self._w = None
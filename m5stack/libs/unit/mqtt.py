@@ -6,6 +6,7 @@
 from machine import UART
 from collections import namedtuple
 from .unit_helper import UnitError
+from umqtt.dispatch import TopicDispatcher
 import time
 import sys
 
@@ -22,7 +23,7 @@ class MQTTUnit:
         )
         self.downlink_keyword = ["+MQRECV:", "+NETUNCONNECT", "+MQUNCONNECT", "+MQCONNECT"]
         self._debug = False
-        self.mqtt_subscribe_cb_list = {}
+        self.dispatcher = TopicDispatcher()
         self.network_status = False
         self.mqtt_server_status = False
         while not self.check_modem_is_ready(1):
@@ -146,8 +147,8 @@ class MQTTUnit:
         if error:
             return False
 
-        if topic not in self.mqtt_subscribe_cb_list.keys():
-            self.mqtt_subscribe_cb_list[topic] = cb
+        if topic not in self.dispatcher:
+            self.dispatcher.add(topic, cb)
         return True
 
     def set_mqtt_publish(self, topic, message, quality):
@@ -208,8 +209,7 @@ class MQTTUnit:
         if "+MQRECV:" in buffer:
             topic = buffer.split('"')[1]
             payload = buffer.split('"')[3]
-            if topic in self.mqtt_subscribe_cb_list.keys():
-                self.mqtt_subscribe_cb_list[topic]((topic, payload))
+            self.dispatcher.dispatch(topic, payload)
         elif "+NETUNCONNECT" in buffer:
             self.network_status = False
         elif "+MQUNCONNECT" in buffer:
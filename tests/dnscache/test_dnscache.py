@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# python tests/dnscache/test_dnscache.py
+
+import os
+import sys
+import time
+
+if sys.implementation.name == "cpython":
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "m5stack", "libs")
+    )
+    # MicroPython's tick functions, for the modules under test
+    time.ticks_ms = lambda: int(time.monotonic() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+import unittest
+import dnscache
+
+
+class Resolver:
+    """Answers every name with one address and counts the lookups"""
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.lookups = 0
+
+    def getaddrinfo(self, host, port, af=0, type=0, proto=0, flags=0):
+        self.lookups += 1
+        if host.endswith(".invalid"):
+            raise OSError(-202)
+        return [(2, 1, 0, host, (self.ip, port))]
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        dnscache.invalidate()
+        dnscache.configure(ttl=300, negative_ttl=10, max_entries=32)
+
+    def test_hit_and_negative(self):
+        r = Resolver("10.0.0.1")
+        for _ in range(3):
+            ai = dnscache.getaddrinfo("broker.local", 1883, resolver=r.getaddrinfo)
+        self.assertEqual(ai[0][-1], ("10.0.0.1", 1883))
+        self.assertEqual(r.lookups, 1)
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                dnscache.getaddrinfo("gone.invalid", 80, resolver=r.getaddrinfo)
+        self.assertEqual(r.lookups, 2)
+        # another port is another entry
+        dnscache.getaddrinfo("broker.local", 8883, resolver=r.getaddrinfo)
+        self.assertEqual(r.lookups, 3)
+
+    def test_resolvers_do_not_share_entries(self):
+        wifi = Resolver("192.168.1.10")
+        modem = Resolver("100.64.0.10")
+        a = dnscache.getaddrinfo("api.local", 443, resolver=wifi.getaddrinfo)
+        b = dnscache.getaddrinfo("api.local", 443, resolver=modem.getaddrinfo)
+        self.assertEqual(a[0][-1][0], "192.168.1.10")
+        self.assertEqual(b[0][-1][0], "100.64.0.10")
+        # each bound method access is a new object: still one entry per resolver
+        dnscache.getaddrinfo("api.local", 443, resolver=modem.getaddrinfo)
+        dnscache.getaddrinfo("api.local", 443, resolver=wifi.getaddrinfo)
+        self.assertEqual((wifi.lookups, modem.lookups), (1, 1))
+        dnscache.invalidate("api.local")
+        dnscache.getaddrinfo("api.local", 443, resolver=modem.getaddrinfo)
+        self.assertEqual(modem.lookups, 2)
+
+    def test_expiry_and_bound(self):
+        r = Resolver("10.0.0.2")
+        dnscache.configure(ttl=0.05, max_entries=4)
+        dnscache.getaddrinfo("a.local", 1, resolver=r.getaddrinfo)
+        time.sleep(0.1)
+        dnscache.getaddrinfo("a.local", 1, resolver=r.getaddrinfo)
+        self.assertEqual(r.lookups, 2)
+        dnscache.configure(ttl=300)
+        for i in range(10):
+            dnscache.getaddrinfo("h%d.local" % i, 1, resolver=r.getaddrinfo)
+        self.assertLessEqual(dnscache.stats()["entries"], 4)
+
+    def test_pin(self):
+        r = Resolver("10.0.0.3")
+        dnscache.pin("ntp.local", "10.9.9.9")
+        try:
+            ai = dnscache.getaddrinfo("ntp.local", 123, resolver=r.getaddrinfo)
+            # the pinned address is handed to the resolver, never the name
+            self.assertEqual(ai[0][3], "10.9.9.9")
+        finally:
+            dnscache.unpin("ntp.local")
+
+
+if __name__ == "__main__":
+    unittest.main()
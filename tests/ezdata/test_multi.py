@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# ezdata.multi.MultiPartForm: the streamed body against content().
+#
+#   python tests/ezdata/test_multi.py
+
+import os
+import sys
+
+if sys.implementation.name == "cpython":
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "m5stack", "libs")
+    )
+    # ezdata/__init__ imports urequests for EzData, which is not tested here
+    sys.modules["urequests"] = type(sys)("urequests")
+import shutil
+import tempfile
+import unittest
+from ezdata.multi import MultiPartForm
+
+
+def stream(body, size):
+    out = bytearray()
+    buf = bytearray(size)
+    while True:
+        n = body.readinto(buf)
+        if not n:
+            return bytes(out)
+        out += buf[:n]
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def file(self, name, data):
+        path = self.dir + "/" + name
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_body_matches_content(self):
+        form = MultiPartForm()
+        form.add_field("name", "logo")
+        form.add_field("note", "température")
+        form.add_file("img", self.file("a.png", bytes(range(256)) * 12), "image/png")
+        form.add_file("empty", self.file("b.bin", b""))
+        form.add_file("one", self.file("c.txt", b"x"), "text/plain")
+        content = form.content()
+        self.assertEqual(form.content_length(), len(content))
+        self.assertTrue(content.endswith(("\r\n--%s--\r\n" % form.boundary).encode()))
+        # buffer sizes that split headers, boundaries and files anywhere
+        for size in (1, 7, 64, 1024, len(content) + 5):
+            body = form.body()
+            self.assertEqual(len(body), len(content))
+            self.assertEqual(stream(body, size), content, size)
+            body.close()
+
+    def test_only_fields_or_files(self):
+        fields = MultiPartForm()
+        fields.add_field("a", "1")
+        fields.add_field("b", "2")
+        files = MultiPartForm()
+        files.add_file("f", self.file("d.bin", b"data" * 300))
+        for form in (fields, files, MultiPartForm()):
+            body = form.body()
+            self.assertEqual(len(body), len(form.content()))
+            self.assertEqual(stream(body, 100), form.content())
+
+    def test_close_midway(self):
+        form = MultiPartForm()
+        form.add_file("f", self.file("e.bin", b"z" * 5000))
+        body = form.body()
+        buf = bytearray(512)
+        body.readinto(buf)
+        body.readinto(buf)
+        self.assertIsNotNone(body._file)
+        f = body._file
+        body.close()
+        self.assertTrue(f.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
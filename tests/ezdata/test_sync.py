@@ -0,0 +1,184 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# ezdata.sync.EzDataSync against a fake requests2.Session.
+#
+#   python tests/ezdata/test_sync.py
+
+import json
+import os
+import sys
+
+if sys.implementation.name == "cpython":
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "m5stack", "libs")
+    )
+    sys.modules["ujson"] = json
+    # ezdata/__init__ imports urequests for EzData, which is not tested here
+    sys.modules["urequests"] = type(sys)("urequests")
+import unittest
+from ezdata.sync import EzDataSync
+
+
+class Response:
+    def __init__(self, status_code, obj=None, headers=None):
+        self.status_code = status_code
+        self.content = b"" if obj is None else json.dumps(obj).encode()
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Session:
+    """Plays the ezdata API: /add stores the value, /list returns every row
+    with an ETag, and a 304 when If-None-Match still matches"""
+
+    def __init__(self):
+        self.rows = {}
+        self.version = 0
+        self.sent = []
+        self.on_post = None
+        self.fail = False
+
+    def post(self, url, data=None, headers=None):
+        d = json.loads(data)
+        self.sent.append(("add", d["name"], d["value"]))
+        if self.on_post is not None:
+            self.on_post(d)
+        if self.fail:
+            return Response(500)
+        self.version += 1
+        self.rows[d["name"]] = (d["value"], self.version)
+        return Response(200, {"code": 200})
+
+    def request(self, method, url, headers=None):
+        etag = '"%d"' % self.version
+        self.sent.append(("list", (headers or {}).get("If-None-Match")))
+        if self.fail:
+            return Response(500)
+        if headers and headers.get("If-None-Match") == etag:
+            return Response(304)
+        rows = [{"name": k, "value": v, "updateTime": t} for k, (v, t) in self.rows.items()]
+        return Response(200, {"code": 200, "data": {"rows": rows}}, {"ETag": etag})
+
+    def remote(self, key, value):
+        # another device writes the key
+        self.version += 1
+        self.rows[key] = (value, self.version)
+
+    def stats(self):
+        return {"requests": len(self.sent), "handshakes": 1}
+
+
+def adds(session):
+    return [s[1:] for s in session.sent if s[0] == "add"]
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.session = Session()
+        self.ez = EzDataSync("token", session=self.session)
+
+    def test_set_delta_and_coalescing(self):
+        ez = self.ez
+        ez.set("t", 1)
+        ez.set("t", 2)
+        ez.set("t", 3)
+        ez.set("h", 40)
+        # the latest value, before it is sent
+        self.assertEqual(ez.get("t"), 3)
+        self.assertTrue(ez.sync())
+        # one request per key with its last value
+        self.assertEqual(sorted(adds(self.session)), [("h", 40), ("t", 3)])
+        st = ez.stats()
+        self.assertEqual((st["uploads"], st["coalesced"], st["pending"]), (2, 2, 0))
+        self.session.sent = []
+        # unchanged, and changed back before the next cycle: nothing to send
+        ez.set("t", 3)
+        ez.set("h", 41)
+        ez.set("h", 40)
+        self.assertTrue(ez.sync())
+        self.assertEqual(adds(self.session), [])
+        st = ez.stats()
+        self.assertEqual((st["skipped"], st["coalesced"], st["pending"]), (1, 3, 0))
+
+    def test_upload_keeps_newer_set(self):
+        ez = self.ez
+        ez.set("t", 1)
+
+        def meanwhile(d):
+            # a set() from the app while /add is on the wire
+            self.session.on_post = None
+            ez.set("t", 2)
+
+        self.session.on_post = meanwhile
+        ez.sync()
+        self.assertEqual(ez.stats()["pending"], 1)
+        self.assertEqual(ez.get("t"), 2)
+        ez.sync()
+        self.assertEqual(adds(self.session), [("t", 1), ("t", 2)])
+        self.assertEqual(ez.stats()["pending"], 0)
+
+    def test_failed_upload_stays_pending(self):
+        ez = self.ez
+        ez.set("t", 1)
+        self.session.fail = True
+        ez.sync()
+        st = ez.stats()
+        self.assertEqual((st["pending"], st["uploads"], st["errors"]), (1, 0, 2))
+        self.session.fail = False
+        ez.sync()
+        self.assertEqual(adds(self.session), [("t", 1), ("t", 1)])
+        self.assertEqual(ez.stats()["pending"], 0)
+
+    def test_poll_skips_pending_keys(self):
+        ez = self.ez
+        seen = []
+        ez.watch("t", lambda k, v: seen.append((k, v)))
+        ez.watch("h", lambda k, v: seen.append((k, v)))
+        self.session.remote("t", 10)
+        self.session.remote("h", 40)
+        ez._poll()
+        self.assertEqual(sorted(seen), [("h", 40), ("t", 10)])
+        seen.clear()
+        # a local write is pending when the remote one is read
+        ez.set("t", 20)
+        self.session.remote("t", 11)
+        self.session.remote("h", 41)
+        ez._poll()
+        self.assertEqual(seen, [("h", 41)])
+        self.assertEqual(ez.get("t"), 20)
+        # and it wins with the next upload
+        ez.sync()
+        self.assertEqual(ez.get("t"), 20)
+        self.assertEqual(self.session.rows["t"][0], 20)
+        self.assertEqual(seen, [("h", 41)])
+
+    def test_not_modified(self):
+        ez = self.ez
+        seen = []
+        ez.watch("t", lambda k, v: seen.append(v))
+        self.session.remote("t", 10)
+        ez.sync()
+        ez.sync()
+        polls = [s[1] for s in self.session.sent if s[0] == "list"]
+        self.assertEqual(polls, [None, '"1"'])
+        st = ez.stats()
+        self.assertEqual((st["polls"], st["not_modified"], st["changes"]), (2, 1, 1))
+        self.assertEqual((seen, ez.get_update_time("t")), ([10], 1))
+        # a failed poll forgets the validators, the next one is a full read
+        self.session.fail = True
+        ez.sync()
+        self.session.fail = False
+        ez.sync()
+        polls = [s[1] for s in self.session.sent if s[0] == "list"]
+        self.assertEqual(polls[2:], ['"1"', None])
+        self.assertEqual(ez.stats()["not_modified"], 1)
+        self.assertEqual(seen, [10])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Modbus RTU CRC and frame encode/decode rate, before and after the codec.
+#
+# Runs on the device and on CPython (with m5stack/libs/modbus on sys.path):
+#
+#   PYTHONPATH=m5stack/libs/modbus python tests/modbus/bench_codec.py
+#
+# "legacy" is the previous code: CRC shifted bit by bit, the PDU built by
+# concatenating bytearrays and the CRC checked on slices of the frame.
+
+import sys
+import time
+
+from modbus.codec import RTUCodec, crc16
+from modbus.frame import ModbusRTUFrame
+
+N = 2000
+
+try:
+    _ticks = time.ticks_us
+    _diff = time.ticks_diff
+except AttributeError:
+    _ticks = lambda: int(time.perf_counter() * 1000000)
+    _diff = lambda a, b: a - b
+
+
+def legacy_crc16(data):
+    crc = 0xFFFF
+    for i in range(len(data)):
+        crc ^= data[i]
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc = crc >> 1
+    return crc
+
+
+class LegacyRTUFrame(ModbusRTUFrame):
+    def _create_frame(self):
+        self._create_pdu()
+        self.frame = bytearray([self.device_addr]) + self.pdu
+        crc = legacy_crc16(self.frame)
+        self.frame += bytearray([crc & 0xFF, crc >> 8])
+
+    @classmethod
+    def _check_both(cls, frame):
+        try:
+            if frame[1] not in [0x05, 0x06]:
+                return False
+            return legacy_crc16(frame[0:6]) == (frame[7] << 8) + frame[6]
+        except Exception:
+            return False
+
+    @classmethod
+    def _check_request(cls, frame):
+        try:
+            func_code = frame[1]
+            if func_code in [0x01, 0x02, 0x03, 0x04]:
+                return legacy_crc16(frame[0:6]) == (frame[7] << 8) + frame[6]
+            if func_code in [0x10, 0x0F]:
+                bc = frame[6]
+                if len(frame) >= 8 + bc:
+                    return legacy_crc16(frame[0 : 7 + bc]) == (frame[8 + bc] << 8) + frame[7 + bc]
+                return False
+        except Exception:
+            return False
+
+    @classmethod
+    def _check_response(cls, frame):
+        try:
+            func_code = frame[1]
+            if func_code in [0x01, 0x02, 0x03, 0x04]:
+                bc = frame[2]
+                if len(frame) >= bc + 5:
+                    return legacy_crc16(frame[0 : 3 + bc]) == (frame[4 + bc] << 8) + frame[3 + bc]
+        except Exception:
+            return False
+
+
+def rate(fn, n=N):
+    fn()
+    t0 = _ticks()
+    for _ in range(n):
+        fn()
+    return n * 1000000 // max(_diff(_ticks(), t0), 1)
+
+
+def main():
+    print("modbus rtu codec, %d iterations (%s)" % (N, sys.platform))
+
+    block = bytes(range(256))
+    print("%-30s %8d KB/s" % ("crc legacy", rate(lambda: legacy_crc16(block), N // 10) // 4))
+    print("%-30s %8d KB/s" % ("crc table", rate(lambda: crc16(block), N // 10) // 4))
+
+    # read 125 holding registers: the request and its 255 byte response
+    kw = dict(device_addr=1, func_code=3, fr_type="response", data=bytearray(250))
+    print("%-30s %8d frames/s" % ("encode legacy", rate(lambda: LegacyRTUFrame(**kw).get_frame())))
+    print(
+        "%-30s %8d frames/s"
+        % ("encode ModbusRTUFrame", rate(lambda: ModbusRTUFrame(**kw).get_frame()))
+    )
+    codec = RTUCodec()
+    f = ModbusRTUFrame(**kw)
+    print("%-30s %8d frames/s" % ("encode RTUCodec", rate(lambda: codec.encode(f))))
+
+    req = bytes(ModbusRTUFrame(device_addr=1, func_code=3, register=0, length=125).get_frame())
+    rsp = bytes(ModbusRTUFrame(**kw).get_frame())
+    rx = bytearray(256)
+    rx[: len(rsp)] = rsp
+    for name, frame in (("request", req), ("response", rsp)):
+        print(
+            "%-30s %8d frames/s"
+            % ("decode %s legacy" % name, rate(lambda: LegacyRTUFrame.parse_frame(frame)))
+        )
+        print(
+            "%-30s %8d frames/s"
+            % ("decode %s ModbusRTUFrame" % name, rate(lambda: ModbusRTUFrame.parse_frame(frame)))
+        )
+    print("%-30s %8d frames/s" % ("decode request RTUCodec", rate(lambda: codec.decode(req))))
+    print(
+        "%-30s %8d frames/s"
+        % ("decode response RTUCodec", rate(lambda: codec.decode(rx, len(rsp), True)))
+    )
+
+
+main()
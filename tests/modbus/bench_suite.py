@@ -0,0 +1,260 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Modbus hot paths on CPython, one JSON object per line.
+#
+#   PYTHONPATH=m5stack/libs/modbus python tests/modbus/bench_suite.py > base.jsonl
+#   PYTHONPATH=m5stack/libs/modbus python tests/modbus/bench_suite.py --compare base.jsonl
+#
+# Every line is {"bench", "value", "unit", "better"}; "better" is "higher"
+# for rates and "lower" for times. With --compare, a result more than
+# --tolerance (default 0.2) worse than the same bench in the baseline is
+# reported on stderr and the exit status is 1.
+#
+# Covered: CRC throughput, RTU/TCP frame encode and decode rate, slave
+# handle_message latency on small, large and fragmented contexts, the
+# asyncio TCP server with N loopback clients (one request in flight per
+# client, and pipelined), and the master's poll cycle against a local
+# server, point by point and through PollPlanner.
+
+import argparse
+import asyncio
+import json
+import struct
+import sys
+import threading
+import time
+
+from modbus.aio import AsyncModbusTCPServer
+from modbus.codec import RTUCodec, crc16
+from modbus.frame import ModbusRTUFrame, ModbusTCPFrame
+from modbus.master import ModbusTCPClient
+from modbus.planner import PollPlanner
+from modbus.slave import ModbusSlave
+
+N = 2000
+RESULTS = []
+
+
+def emit(bench, value, unit, better="higher"):
+    r = {"bench": bench, "value": round(value, 3), "unit": unit, "better": better}
+    RESULTS.append(r)
+    print(json.dumps(r))
+    sys.stdout.flush()
+
+
+def rate(fn, n=N):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / max(time.perf_counter() - t0, 1e-9)
+
+
+def bench_crc():
+    block = bytes(range(256))
+    emit("crc16.256B", rate(lambda: crc16(block), N // 4) * 256 / 1024, "KB/s")
+
+
+def bench_frames():
+    rsp = dict(device_addr=1, func_code=3, fr_type="response", data=bytearray(250))
+    emit("rtu.encode.fc3_125", rate(lambda: ModbusRTUFrame(**rsp).get_frame()), "frames/s")
+    codec = RTUCodec()
+    f = ModbusRTUFrame(**rsp)
+    emit("rtu.codec_encode.fc3_125", rate(lambda: codec.encode(f)), "frames/s")
+    rtu = bytes(ModbusRTUFrame(**rsp).get_frame())
+    emit("rtu.decode.fc3_125", rate(lambda: ModbusRTUFrame.parse_frame(rtu)), "frames/s")
+    emit("rtu.codec_decode.fc3_125", rate(lambda: codec.decode(rtu, None, True)), "frames/s")
+
+    tcp = dict(transaction_id=1, unit_id=1, func_code=3, fr_type="response", data=bytearray(250))
+    emit("tcp.encode.fc3_125", rate(lambda: ModbusTCPFrame(**tcp).get_frame()), "frames/s")
+    req = bytes(
+        ModbusTCPFrame(
+            transaction_id=1, unit_id=1, func_code=3, register=0, length=125
+        ).get_frame()
+    )
+    emit("tcp.decode.fc3_req", rate(lambda: ModbusTCPFrame.parse_frame(req)), "frames/s")
+
+
+def _latency(slave, req, n=N):
+    slave.handle_message(req)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        slave.handle_message(req)
+    return (time.perf_counter() - t0) * 1e6 / n
+
+
+def bench_handle_message():
+    contexts = {
+        "125": [{"register": 0, "value": [0] * 125}],
+        "10000": [{"register": 0, "value": [0] * 10000}],
+        # 1000 blocks of 8 registers, 2 apart
+        "frag1000": [{"register": i * 10, "value": [0] * 8} for i in range(1000)],
+    }
+    for name, regs in contexts.items():
+        slave = ModbusSlave(
+            context={
+                "holding_registers": regs,
+                "coils": [{"register": 0, "value": [False] * 2000}],
+            }
+        )
+        last = regs[-1]["register"] + len(regs[-1]["value"])
+        count = min(125, len(regs[-1]["value"]))
+        start = last - count
+        read = ModbusTCPFrame(
+            transaction_id=1, unit_id=1, func_code=3, register=start, length=count
+        )
+        emit("slave.read_holding.%s" % name, _latency(slave, read), "us", "lower")
+        data = bytearray(count * 2)
+        write = ModbusTCPFrame(
+            transaction_id=1, unit_id=1, func_code=16, register=start, length=count, data=data
+        )
+        emit("slave.write_multiple.%s" % name, _latency(slave, write), "us", "lower")
+    slave = ModbusSlave(context={"coils": [{"register": 0, "value": [False] * 2000}]})
+    read = ModbusTCPFrame(transaction_id=1, unit_id=1, func_code=1, register=3, length=2000 - 8)
+    emit("slave.read_coils.2000", _latency(slave, read), "us", "lower")
+
+
+async def _client(port, requests, depth):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    req = struct.pack(">HHHBBHH", 1, 0, 6, 1, 3, 0, 10)
+    done = 0
+    while done < requests:
+        k = min(depth, requests - done)
+        writer.write(req * k)
+        await reader.readexactly(29 * k)
+        done += k
+    writer.close()
+
+
+async def _server_rate(clients, depth, requests):
+    srv = AsyncModbusTCPServer(
+        "127.0.0.1",
+        0,
+        max_clients=clients,
+        context={"holding_registers": [{"register": 0, "value": list(range(100))}]},
+    )
+    server = await srv.start()
+    port = server.sockets[0].getsockname()[1]
+    t0 = time.perf_counter()
+    await asyncio.gather(*[_client(port, requests, depth) for _ in range(clients)])
+    elapsed = time.perf_counter() - t0
+    srv.close()
+    await asyncio.sleep(0.01)
+    return clients * requests / elapsed
+
+
+def bench_tcp_server(clients=(1, 4, 16), requests=500):
+    for n in clients:
+        for depth in (1, 8):
+            value = asyncio.run(_server_rate(n, depth, requests))
+            emit("tcp_server.clients%d.depth%d" % (n, depth), value, "req/s")
+
+
+def bench_master_poll(points=40, cycles=50):
+    srv = AsyncModbusTCPServer(
+        "127.0.0.1", 0, context={"holding_registers": [{"register": 0, "value": list(range(500))}]}
+    )
+    ready = threading.Event()
+    loop = asyncio.new_event_loop()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        srv._port = loop.run_until_complete(srv.start()).sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    ready.wait()
+    master = ModbusTCPClient("127.0.0.1", srv._port)
+    master.connect()
+    # points spread over 200 registers, 5 apart
+    addresses = [i * 5 for i in range(points)]
+
+    t0 = time.perf_counter()
+    for _ in range(cycles):
+        for a in addresses:
+            master.read_holding_registers(1, a, 1)
+    emit(
+        "master.poll_cycle.per_point.%d" % points,
+        (time.perf_counter() - t0) * 1e3 / cycles,
+        "ms",
+        "lower",
+    )
+
+    planner = PollPlanner(master, max_gap=8)
+    for a in addresses:
+        planner.add(a, 1, "holding_registers", a)
+    # a few round trips per cycle: run more of them for a stable figure
+    t0 = time.perf_counter()
+    for i in range(cycles * 10):
+        planner.poll(now=i * 1000)
+    emit(
+        "master.poll_cycle.planner.%d" % points,
+        (time.perf_counter() - t0) * 1e3 / (cycles * 10),
+        "ms",
+        "lower",
+    )
+
+    assert planner.errors == 0
+    master.disconnect()
+    # let the server see the connection close before its loop stops
+    while srv.clients:
+        time.sleep(0.01)
+    loop.call_soon_threadsafe(srv.close)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(1)
+
+
+BENCHES = {
+    "crc": bench_crc,
+    "frames": bench_frames,
+    "slave": bench_handle_message,
+    "tcp_server": bench_tcp_server,
+    "master": bench_master_poll,
+}
+
+
+def compare(results, baseline, tolerance):
+    base = {}
+    with open(baseline) as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                base[r["bench"]] = r
+    worse = 0
+    for r in results:
+        b = base.get(r["bench"])
+        if b is None or not b["value"]:
+            continue
+        change = r["value"] / b["value"] - 1
+        if r["better"] == "lower":
+            change = -change
+        if change < -tolerance:
+            worse += 1
+            print(
+                "regression %s: %s -> %s %s" % (r["bench"], b["value"], r["value"], r["unit"]),
+                file=sys.stderr,
+            )
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="modbus benchmarks, JSON lines on stdout")
+    parser.add_argument("only", nargs="*", help="benches to run: " + ", ".join(BENCHES))
+    parser.add_argument("--compare", help="JSON lines of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    for name in args.only:
+        if name not in BENCHES:
+            parser.error("unknown bench %s" % name)
+
+    for name in args.only or BENCHES:
+        BENCHES[name]()
+    if args.compare and compare(RESULTS, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+main()
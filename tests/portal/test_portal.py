@@ -0,0 +1,141 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Smoke test of the captive portal driven by poll(), as the launcher does.
+#
+#   python tests/portal/test_portal.py
+
+import os
+import sys
+import time
+
+if sys.implementation.name == "cpython":
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "m5stack", "fs")
+        + "/user/libs"
+    )
+    # MicroPython's tick functions, for the module under test
+    time.ticks_ms = lambda: int(time.monotonic() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+
+    class WLAN:
+        """The access point, always up"""
+
+        def __init__(self, interface):
+            self._config = {"essid": ""}
+
+        def active(self, flag=None):
+            return True
+
+        def config(self, *args, **kwargs):
+            if args:
+                return self._config[args[0]]
+            self._config.update(kwargs)
+
+        def ifconfig(self, conf=None):
+            return conf or ("192.168.4.1", "255.255.255.0", "192.168.4.1", "192.168.4.1")
+
+    sys.modules["network"] = type(sys)("network")
+    sys.modules["network"].__dict__.update(WLAN=WLAN, AP_IF=1, AUTH_OPEN=0)
+import asyncio
+import http.client
+import socket
+import struct
+import threading
+import unittest
+import portal
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        self.portal = p = portal.CaptivePortal(html_path="/nonexistent/settings.html")
+        p.http.port = 0
+        p.dns.port = 0
+
+        async def echo(req, resp):
+            buf = bytearray(64)
+            n = await req.read_body(memoryview(buf))
+            await resp.text(b"200 OK", bytes(buf[:n]).upper())
+
+        p.route(b"/echo", echo, (b"POST",))
+        # MicroPython's run_until_complete() only takes a coroutine, and there
+        # asyncio.sleep() returns a plain generator: it must not be passed in
+        run = asyncio.get_event_loop().run_until_complete
+        self.ticks = 0
+
+        def run_until_complete(coro):
+            self.assertTrue(asyncio.iscoroutine(coro), coro)
+            self.assertIsNot(coro.cr_code, asyncio.sleep.__code__)
+            self.ticks += 1
+            return run(coro)
+
+        asyncio.get_event_loop().run_until_complete = run_until_complete
+        p.start(run_forever=False)
+
+    def tearDown(self):
+        self.portal.stop()
+        # let the cancelled connection tasks finish
+        for _ in range(5):
+            self.portal._tick()
+        asyncio.get_event_loop().close()
+
+    def drive(self, client):
+        # the launcher's main loop: poll() between other work until the client is done
+        out = {}
+        t = threading.Thread(target=lambda: out.update(result=client()))
+        t.start()
+        deadline = time.time() + 5
+        while t.is_alive() and time.time() < deadline:
+            self.portal.poll()
+            time.sleep(0.001)
+        t.join(0)
+        self.assertFalse(t.is_alive())
+        return out["result"]
+
+    def test_http_keep_alive(self):
+        port = self.portal.http.server.sockets[0].getsockname()[1]
+
+        def client():
+            c = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            c.request("GET", "/generate_204")
+            page = c.getresponse()
+            first = (page.status, b"Captive Portal" in page.read())
+            c.request("POST", "/echo", body=b"hello portal")
+            r = c.getresponse()
+            second = (r.status, r.read())
+            c.close()
+            return first, second
+
+        first, second = self.drive(client)
+        # captive checks get the page, on one keep-alive connection with the POST
+        self.assertEqual(first, (200, True))
+        self.assertEqual(second, (200, b"HELLO PORTAL"))
+        self.assertEqual(self.portal.http.requests, 2)
+        self.assertGreater(self.ticks, 1)
+
+    def test_dns_answers_with_the_portal_address(self):
+        port = self.portal.dns.sock.getsockname()[1]
+
+        def client():
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.settimeout(5)
+            name = b"".join(bytes([len(p)]) + p for p in b"connectivitycheck.example".split(b"."))
+            s.sendto(
+                b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00" + name + b"\0\0\1\0\1",
+                ("127.0.0.1", port),
+            )
+            data = s.recv(512)
+            s.close()
+            return data
+
+        data = self.drive(client)
+        self.assertEqual(data[:2], b"\x12\x34")
+        self.assertEqual(struct.unpack(">H", data[6:8])[0], 1)
+        self.assertEqual(data[-4:], bytes([192, 168, 4, 1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
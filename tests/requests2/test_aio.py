@@ -0,0 +1,245 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# requests2.aio.AsyncSession against scripted streams.
+#
+#   python tests/requests2/test_aio.py
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import asyncio
+import io
+import unittest
+from test_session import ServerStandIn, response
+import requests2
+from requests2 import aio
+
+# the CPython bytes wrapper test_session installs, for the async path too
+aio._send_head = requests2._send_head
+
+CHUNKED = (
+    b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+    b"6\r\nhello \r\n8;ext=1\r\nchunked \r\n5\r\nworld\r\n0\r\nX-Trailer: 1\r\n\r\n"
+)
+
+
+class StreamStandIn:
+    """One asyncio connection: plays back `script`, and hangs on any read
+    at or past offset `stall`"""
+
+    def __init__(self, script, stall=None):
+        self._in = io.BytesIO(script)
+        self._stall = stall
+        self.sent = b""
+        self.drains = 0
+        self.closed = False
+
+    async def _wait(self):
+        if self._stall is not None and self._in.tell() >= self._stall:
+            await asyncio.sleep(3600)
+
+    def _limit(self, n):
+        if self._stall is None:
+            return n
+        return min(n, self._stall - self._in.tell())
+
+    def write(self, buf):
+        self.sent += bytes(buf)
+
+    async def drain(self):
+        self.drains += 1
+
+    async def readline(self):
+        await self._wait()
+        return self._in.readline()
+
+    async def readexactly(self, n):
+        await self._wait()
+        data = self._in.read(n)
+        if len(data) < n:
+            raise EOFError
+        return data
+
+    async def readinto(self, buf):
+        await self._wait()
+        data = self._in.read(self._limit(len(buf)))
+        buf[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+
+class Session(aio.AsyncSession):
+    """New streams get the next of `streams` (script or (script, stall)),
+    new blocking connections the next of `scripts`"""
+
+    def __init__(self, streams=(), scripts=(), **kw):
+        super().__init__(**kw)
+        self.streams = list(streams)
+        self.scripts = list(scripts)
+        self.conns = []
+
+    async def _aconnect(self, proto, host, port):
+        script = self.streams.pop(0)
+        s = StreamStandIn(*script) if isinstance(script, tuple) else StreamStandIn(script)
+        self.conns.append(s)
+        return s
+
+    def _connect(self, proto, host, port, timeout):
+        s = ServerStandIn(self.scripts.pop(0))
+        self.conns.append(s)
+        return s, s
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+class Test(unittest.TestCase):
+    def test_chunked_and_reuse(self):
+        async def main():
+            s = Session([CHUNKED + response(b"two")])
+            r = await s.aget("http://api.local/a")
+            self.assertEqual(await r.read(), b"hello chunked world")
+            self.assertEqual(await (await s.aget("http://api.local/b")).text(), "two")
+            self.assertEqual(len(s.conns), 1)
+            self.assertEqual(s.stats()["hits"], 1)
+
+        run(main())
+
+    def test_chunked_readinto(self):
+        async def main():
+            s = Session([CHUNKED])
+            r = await s.aget("http://api.local/")
+            buf = bytearray(4)
+            parts = []
+            while True:
+                n = await r.readinto(buf)
+                if not n:
+                    break
+                parts.append(bytes(buf[:n]))
+            self.assertEqual(parts, [b"hell", b"o ", b"chun", b"ked ", b"worl", b"d"])
+            self.assertEqual(s.stats()["idle"], 1)
+
+        run(main())
+
+    def test_stale_retry(self):
+        async def main():
+            s = Session([response(b"one"), response(b"two")])
+            await (await s.aget("http://api.local/")).read()
+            self.assertEqual(await (await s.aget("http://api.local/")).read(), b"two")
+            self.assertTrue(s.conns[0].closed)
+            self.assertEqual(s.stats()["stale"], 1)
+
+        run(main())
+
+    def test_unread_responses(self):
+        big = b"z" * (aio.AsyncSession.DRAIN_MAX + 1)
+
+        async def main():
+            s = Session([response(b"small") + response(big), CHUNKED])
+            small = await s.aget("http://api.local/a")
+            # the small body is read in and the connection reused
+            a = await s.aget("http://api.local/b")
+            self.assertEqual(len(s.conns), 1)
+            b = await s.aget("http://api.local/c")
+            # a is too long to read in: it keeps its connection, b gets another
+            self.assertEqual(len(s.conns), 2)
+            self.assertEqual(await b.text(), "hello chunked world")
+            self.assertEqual(await a.read(), big)
+            self.assertEqual(await small.read(), b"small")
+            self.assertEqual(s.stats()["idle"], 2)
+
+        run(main())
+
+    def test_timeout_waiting_for_head(self):
+        async def main():
+            s = Session([(b"", 0)])
+            with self.assertRaises(asyncio.TimeoutError):
+                await s.aget("http://api.local/", timeout=0.05)
+            self.assertTrue(s.conns[0].closed)
+            self.assertEqual(s.stats()["idle"], 0)
+
+        run(main())
+
+    def test_timeout_mid_body(self):
+        async def main():
+            script = response(b"x" * 100)
+            s = Session([(script, len(script) - 50), response(b"next")])
+            r = await s.aget("http://api.local/", timeout=0.05)
+            with self.assertRaises(asyncio.TimeoutError):
+                await r.read()
+            # the half-read connection is closed, not pooled
+            self.assertTrue(s.conns[0].closed)
+            self.assertEqual(await (await s.aget("http://api.local/")).read(), b"next")
+            self.assertEqual(len(s.conns), 2)
+
+        run(main())
+
+    def test_cancel_mid_body(self):
+        async def main():
+            script = CHUNKED
+            s = Session([(script, len(script) - 20)])
+            r = await s.aget("http://api.local/")
+            task = asyncio.create_task(r.read())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertTrue(s.conns[0].closed)
+            self.assertEqual(s.stats()["idle"], 0)
+
+        run(main())
+
+    def test_request_body_is_drained_per_piece(self):
+        class Upload:
+            # a sized readinto stream, like ezdata's multipart body
+            def __init__(self):
+                self._f = io.BytesIO(b"u" * 2500)
+
+            def __len__(self):
+                return 2500
+
+            def readinto(self, buf):
+                return self._f.readinto(buf)
+
+            def close(self):
+                pass
+
+        async def main():
+            s = Session([response(b"ok") + response(b"ok")])
+            await (await s.apost("http://api.local/", data=Upload())).read()
+            conn = s.conns[0]
+            # 1024 + 1024 + 452, then the final drain
+            self.assertEqual(conn.drains, 4)
+            self.assertTrue(conn.sent.endswith(b"\r\n\r\n" + b"u" * 2500))
+            conn.sent = b""
+            await (await s.apost("http://api.local/", data=iter([b"ab", b"cde"]))).read()
+            self.assertTrue(conn.sent.endswith(b"2\r\nab\r\n3\r\ncde\r\n0\r\n\r\n"))
+
+        run(main())
+
+    def test_shared_pool_with_blocking_requests(self):
+        s = Session([response(b"async1") + response(b"async2")], [response(b"sync1")])
+
+        async def aget():
+            return await (await s.aget("http://api.local/")).read()
+
+        self.assertEqual(s.get("http://api.local/").content, b"sync1")
+        # streams and sockets are not interchangeable: separate slots
+        self.assertEqual(run(aget()), b"async1")
+        self.assertEqual(len(s.conns), 2)
+        self.assertEqual(run(aget()), b"async2")
+        st = s.stats()
+        # one set of counters and limits for both
+        self.assertEqual((st["requests"], st["misses"], st["hits"], st["idle"]), (3, 2, 1, 2))
+        s.close()
+        self.assertTrue(all(c.closed for c in s.conns))
+
+
+if __name__ == "__main__":
+    unittest.main()
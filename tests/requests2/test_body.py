@@ -0,0 +1,125 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# requests2 response body framing: Content-Length, chunked, read until close.
+#
+#   python tests/requests2/test_body.py
+
+import os
+import sys
+
+if sys.implementation.name == "cpython":
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "m5stack", "libs")
+    )
+import io
+import tempfile
+import unittest
+from requests2 import Response, _Body
+
+CHUNKED = b"6\r\nhello \r\n8;ext=1\r\nchunked \r\n5\r\nworld\r\n0\r\nX-Trailer: 1\r\n\r\n"
+
+
+class SocketStandIn:
+    """Serves `data`; reads are complete up to EOF, as on a blocking socket"""
+
+    def __init__(self, data):
+        self._in = io.BytesIO(data)
+        self.closed = False
+
+    def readline(self):
+        return self._in.readline()
+
+    def read(self, n=-1):
+        return self._in.read(n)
+
+    def readinto(self, buf, n=None):
+        data = self._in.read(len(buf) if n is None else n)
+        buf[: len(data)] = data
+        return len(data)
+
+    def rest(self):
+        return self._in.read()
+
+    def close(self):
+        self.closed = True
+
+
+def body(data, length=-1, chunked=False):
+    sock = SocketStandIn(data)
+    released = []
+    return _Body(sock, length, released.append, chunked), sock, released
+
+
+class Test(unittest.TestCase):
+    def test_chunked(self):
+        b, sock, released = body(CHUNKED + b"NEXT", chunked=True)
+        self.assertEqual(Response(b).content, b"hello chunked world")
+        # extensions and trailers consumed, the socket handed back at the end
+        self.assertEqual(released, [sock])
+        self.assertEqual(sock.rest(), b"NEXT")
+
+    def test_chunked_readinto(self):
+        b, sock, released = body(CHUNKED, chunked=True)
+        r = Response(b)
+        buf = bytearray(4)
+        parts = []
+        while True:
+            n = r.readinto(buf)
+            if not n:
+                break
+            parts.append(bytes(buf[:n]))
+        # a read never runs past the end of a chunk
+        self.assertEqual(parts, [b"hell", b"o ", b"chun", b"ked ", b"worl", b"d"])
+        self.assertEqual(released, [sock])
+
+    def test_iter_content_reuses_one_buffer(self):
+        buf = bytearray(5)
+        b, sock, released = body(b"0123456789abc", length=13)
+        views = list(Response(b).iter_content(buf=buf))
+        self.assertTrue(all(v.obj is buf for v in views))
+        self.assertEqual([len(v) for v in views], [5, 5, 3])
+        self.assertEqual(released, [sock])
+
+    def test_content_length(self):
+        b, sock, released = body(b"abcdefNEXT", length=6)
+        self.assertEqual(b.read(4), b"abcd")
+        self.assertEqual(b.read(), b"ef")
+        self.assertEqual(released, [sock])
+        self.assertEqual(sock.rest(), b"NEXT")
+        # a body cut short is not handed back
+        b, sock, released = body(b"abc", length=6)
+        self.assertEqual(b.read(), b"abc")
+        self.assertEqual(released, [])
+        self.assertTrue(sock.closed)
+
+    def test_read_until_close(self):
+        b, sock, released = body(b"all of it")
+        self.assertEqual(Response(b).content, b"all of it")
+        self.assertEqual(released, [])
+        self.assertTrue(sock.closed)
+
+    def test_truncated_chunk(self):
+        b, sock, released = body(b"a\r\nshort", chunked=True)
+        self.assertEqual(Response(b).content, b"short")
+        self.assertEqual(released, [])
+        self.assertTrue(sock.closed)
+
+    def test_save_to(self):
+        d = tempfile.mkdtemp()
+        path = d + "/file.bin"
+        try:
+            b, sock, released = body(CHUNKED, chunked=True)
+            self.assertEqual(Response(b).save_to(path, buf=bytearray(8)), 19)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"hello chunked world")
+            self.assertEqual(os.listdir(d), ["file.bin"])
+        finally:
+            for name in os.listdir(d):
+                os.remove(d + "/" + name)
+            os.rmdir(d)
+
+
+if __name__ == "__main__":
+    unittest.main()
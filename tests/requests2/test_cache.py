@@ -0,0 +1,141 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# requests2.cache conditional GETs, against scripted connections.
+#
+#   python tests/requests2/test_cache.py
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import shutil
+import tempfile
+import unittest
+from test_session import ServerStandIn, Session, response
+
+if sys.implementation.name == "cpython":
+    import json
+
+    sys.modules["ujson"] = json
+from requests2 import cache
+
+V1 = b'ETag: "v1"\r\nLast-Modified: Mon, 01 Jan 2024 00:00:00 GMT\r\n'
+
+
+class BrokenServer(ServerStandIn):
+    """Plays back `script` and fails any read past offset `fail_at`"""
+
+    def __init__(self, script, fail_at):
+        super().__init__(script)
+        self._fail_at = fail_at
+
+    def readinto(self, buf, n=None):
+        if self._in.tell() >= self._fail_at:
+            raise OSError(116)  # ETIMEDOUT
+        n = min(len(buf) if n is None else n, self._fail_at - self._in.tell())
+        return super().readinto(buf, n)
+
+
+class FlakySession(Session):
+    """Scripts given as (script, fail_at) get a BrokenServer"""
+
+    def _connect(self, proto, host, port, timeout):
+        script = self.scripts[0]
+        if not isinstance(script, tuple):
+            return super()._connect(proto, host, port, timeout)
+        self.scripts.pop(0)
+        s = BrokenServer(*script)
+        self.conns.append(s)
+        return s, s
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = self.dir + "/logo.png"
+        self.url = "http://cdn.local/logo.png"
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_meta_round_trip(self):
+        s = Session(response(b"image", headers=V1))
+        self.assertEqual(cache.fetch(self.url, self.path, s), 200)
+        self.assertEqual(read(self.path), b"image")
+        self.assertNotIn(b"If-None-Match", s.conns[0].sent)
+        v = cache.Validators()
+        self.assertTrue(v.load(self.path + cache.META_SUFFIX))
+        self.assertEqual(
+            (v.url, v.etag, v.last_modified),
+            (self.url, '"v1"', "Mon, 01 Jan 2024 00:00:00 GMT"),
+        )
+        # validators of another URL are not sent
+        self.assertEqual(v.apply("http://cdn.local/other.png", {}), {})
+        # a 200 without validators removes the .meta
+        s.scripts.append(response(b"image2"))
+        s.idle_ms = 0
+        self.assertEqual(cache.fetch(self.url, self.path, s), 200)
+        self.assertFalse(os.path.exists(self.path + cache.META_SUFFIX))
+        self.assertFalse(cache.Validators().load(self.path + cache.META_SUFFIX))
+
+    def test_not_modified(self):
+        s = Session(response(b"image", headers=V1) + response(status=b"304 Not Modified"))
+        cache.fetch(self.url, self.path, s)
+        meta = read(self.path + cache.META_SUFFIX)
+        self.assertEqual(cache.fetch(self.url, self.path, s), 304)
+        sent = s.conns[0].sent
+        self.assertIn(b'If-None-Match: "v1"\r\n', sent)
+        self.assertIn(b"If-Modified-Since: Mon, 01 Jan 2024 00:00:00 GMT\r\n", sent)
+        # the file and its validators are left alone
+        self.assertEqual(read(self.path), b"image")
+        self.assertEqual(read(self.path + cache.META_SUFFIX), meta)
+        self.assertEqual(len(s.conns), 1)
+
+    def test_not_modified_get(self):
+        s = Session(response(b"data", headers=V1) + response(status=b"304 Not Modified"))
+        v = cache.Validators()
+        self.assertEqual(cache.get(self.url, v, s).content, b"data")
+        r = cache.get(self.url, v, s, headers={"Accept": "*/*"})
+        self.assertEqual((r.status_code, r.content), (304, b""))
+        self.assertEqual(v.etag, '"v1"')
+        sent = s.conns[0].sent
+        self.assertIn(b'If-None-Match: "v1"\r\n', sent)
+        self.assertIn(b"Accept: */*\r\n", sent)
+
+    def test_no_file_no_validators(self):
+        s = Session(response(b"image", headers=V1), response(b"again", headers=V1))
+        cache.fetch(self.url, self.path, s)
+        os.remove(self.path)
+        s.idle_ms = 0
+        # a .meta without its file must not turn into a 304
+        self.assertEqual(cache.fetch(self.url, self.path, s), 200)
+        self.assertNotIn(b"If-None-Match", s.conns[1].sent)
+        self.assertEqual(read(self.path), b"again")
+
+    def test_failure_keeps_file(self):
+        s = FlakySession(response(b"image", headers=V1))
+        cache.fetch(self.url, self.path, s)
+        meta = read(self.path + cache.META_SUFFIX)
+        s.idle_ms = 0
+        # a server error
+        s.scripts.append(response(b"oops", b"500 Internal Server Error"))
+        self.assertEqual(cache.fetch(self.url, self.path, s), 500)
+        # the connection breaking in the middle of the new body
+        new = response(b"new image", headers=b'ETag: "v2"\r\n')
+        s.scripts.append((new, len(new) - 4))
+        with self.assertRaises(OSError):
+            cache.fetch(self.url, self.path, s)
+        self.assertEqual(read(self.path), b"image")
+        self.assertEqual(read(self.path + cache.META_SUFFIX), meta)
+        self.assertEqual(sorted(os.listdir(self.dir)), ["logo.png", "logo.png.meta"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# requests2.Session connection pool, against scripted connections.
+#
+#   python tests/requests2/test_session.py
+
+import os
+import sys
+import time
+
+if sys.implementation.name == "cpython":
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "m5stack", "libs")
+    )
+    # MicroPython's tick functions, for the modules under test
+    time.ticks_ms = lambda: int(time.monotonic() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+import io
+import unittest
+import requests2
+
+if sys.implementation.name == "cpython":
+    # MicroPython's b"%s" % str inserts the text, CPython's raises
+    _send_head = requests2._send_head
+
+    def _bytes(v):
+        return v.encode() if isinstance(v, str) else v
+
+    def _send_head_bytes(s, method, host, path, headers, *args):
+        headers = {_bytes(k): _bytes(v) for k, v in headers.items()}
+        return _send_head(s, _bytes(method), _bytes(host), _bytes(path), headers, *args)
+
+    requests2._send_head = _send_head_bytes
+
+
+def response(body=b"", status=b"200 OK", headers=b""):
+    return b"HTTP/1.1 %s\r\nContent-Length: %d\r\n%s\r\n%s" % (status, len(body), headers, body)
+
+
+class ServerStandIn:
+    """One connection: plays back `script`, keeps what the client sent"""
+
+    def __init__(self, script):
+        self._in = io.BytesIO(script)
+        self.sent = b""
+        self.closed = False
+
+    def settimeout(self, t):
+        pass
+
+    def write(self, buf, n=None):
+        self.sent += bytes(buf if n is None else buf[:n])
+        return len(buf) if n is None else n
+
+    def readline(self):
+        return self._in.readline()
+
+    def read(self, n=-1):
+        return self._in.read(n)
+
+    def readinto(self, buf, n=None):
+        data = self._in.read(len(buf) if n is None else n)
+        buf[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+
+class Session(requests2.Session):
+    """Each new connection gets the next script"""
+
+    def __init__(self, *scripts, **kw):
+        super().__init__(**kw)
+        self.scripts = list(scripts)
+        self.conns = []
+
+    def _connect(self, proto, host, port, timeout):
+        s = ServerStandIn(self.scripts.pop(0))
+        self.conns.append(s)
+        return s, s
+
+
+class Test(unittest.TestCase):
+    def test_reuse(self):
+        s = Session(response(b"one") + response(b"two"))
+        self.assertEqual(s.get("http://api.local/a").content, b"one")
+        r = s.post("http://api.local/b", data=b"x=1", headers={"X-Id": "7"})
+        self.assertEqual(r.content, b"two")
+        self.assertEqual(len(s.conns), 1)
+        sent = s.conns[0].sent
+        self.assertEqual(sent.count(b"HTTP/1.1\r\n"), 2)
+        self.assertEqual(sent.count(b"Connection: keep-alive\r\n"), 2)
+        self.assertIn(b"X-Id: 7\r\n", sent)
+        self.assertTrue(sent.endswith(b"x=1"))
+        st = s.stats()
+        self.assertEqual((st["hits"], st["misses"], st["idle"]), (1, 1, 1))
+        # another host is another pool slot
+        s.scripts.append(response(b"three"))
+        s.get("http://other.local/").content
+        self.assertEqual(len(s.conns), 2)
+        s.close()
+        self.assertTrue(all(c.closed for c in s.conns))
+
+    def test_stale_retry(self):
+        # the server dropped the first connection after one response
+        s = Session(response(b"one"), response(b"two"))
+        s.get("http://api.local/").content
+        self.assertEqual(s.get("http://api.local/").content, b"two")
+        self.assertTrue(s.conns[0].closed)
+        self.assertFalse(s.conns[1].closed)
+        st = s.stats()
+        self.assertEqual((st["stale"], st["hits"], st["misses"]), (1, 1, 2))
+
+    def test_no_retry_for_a_streamed_body(self):
+        s = Session(response(b"one"), response(b"two"))
+        s.get("http://api.local/").content
+        with self.assertRaises(OSError):
+            s.post("http://api.local/", data=iter([b"a", b"b"]))
+        self.assertEqual(len(s.conns), 1)
+
+    def test_close_and_expiry(self):
+        s = Session(response(b"bye", headers=b"Connection: close\r\n"), response(b"hi"))
+        s.get("http://api.local/").content
+        self.assertTrue(s.conns[0].closed)
+        self.assertEqual(s.stats()["idle"], 0)
+        s.get("http://api.local/").content
+        s.idle_ms = 0
+        s.scripts.append(response(b"again"))
+        self.assertEqual(s.get("http://api.local/").content, b"again")
+        self.assertEqual(s.stats()["expired"], 1)
+        self.assertEqual(len(s.conns), 3)
+
+    def test_unread_body_is_settled(self):
+        big = b"x" * (requests2.Session.DRAIN_MAX + 1)
+        s = Session(response(b"small") + response(big) + response(b"next"), response(b"fresh"))
+        small = s.get("http://api.local/a")
+        # the small body is read in, the socket reused
+        large = s.get("http://api.local/b")
+        self.assertEqual(small.content, b"small")
+        self.assertEqual(len(s.conns), 1)
+        # the large one stays open on its connection, the next request gets another
+        self.assertEqual(s.get("http://api.local/c").content, b"fresh")
+        self.assertEqual(len(s.conns), 2)
+        self.assertFalse(s.conns[0].closed)
+        self.assertEqual(large.content, big)
+        # read to the end, it is back in the pool
+        self.assertEqual(s.get("http://api.local/d").content, b"next")
+        self.assertEqual(len(s.conns), 2)
+
+    def test_two_responses_open(self):
+        chunked = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n0\r\n\r\n"
+        big = b"y" * (requests2.Session.DRAIN_MAX * 2)
+        s = Session(chunked + response(b"after"), response(big))
+        a = s.get("http://api.local/a")
+        b = s.get("http://api.local/b")
+        self.assertEqual(len(s.conns), 2)
+        # read in the other order than they were made
+        self.assertEqual(b.content, big)
+        self.assertEqual(a.content, b"abc")
+        self.assertEqual(s.stats()["idle"], 2)
+        self.assertEqual(s.get("http://api.local/c").content, b"after")
+        # a response still open when the session closes is not pooled afterwards
+        s.scripts.append(response(big))
+        c = s.get("http://other.local/d")
+        s.close()
+        self.assertEqual(c.content, big)
+        self.assertTrue(s.conns[-1].closed)
+        self.assertEqual(s.stats()["idle"], 0)
+
+    def test_redirect(self):
+        s = Session(
+            response(b"moved", b"302 Found", b"Location: http://api.local/new\r\n")
+            + response(b"here")
+        )
+        r = s.get("http://api.local/old")
+        self.assertEqual((r.status_code, r.content), (200, b"here"))
+        self.assertIn(b"GET /new HTTP/1.1", s.conns[0].sent)
+        self.assertEqual(len(s.conns), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
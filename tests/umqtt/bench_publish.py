@@ -0,0 +1,146 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# umqtt publish throughput and heap use per message.
+#
+# The broker is an in-memory stand-in: it swallows the packets and answers
+# every QoS 1 PUBLISH with a PUBACK, so only the client's work is measured.
+# Runs on the device and on CPython (with m5stack/libs on sys.path):
+#
+#   python tests/umqtt/bench_publish.py
+#
+# "legacy" is the previous publish(): one write per packet field. Heap per
+# message is the growth of gc.mem_alloc() with the collector disabled, so it
+# is only reported on MicroPython. The stand-in's writes are nearly free;
+# on a real socket, and on TLS where each write is a record, the write
+# count dominates.
+
+import gc
+import struct
+import sys
+import time
+
+from umqtt.simple import MQTTClient, Topic
+
+N = 2000
+PAYLOAD = b"t=23.5,h=41.0,p=1013.2"
+
+try:
+    _ticks = time.ticks_us
+    _diff = time.ticks_diff
+except AttributeError:
+    _ticks = lambda: int(time.perf_counter() * 1000000)
+    _diff = lambda a, b: a - b
+
+
+class BrokerStandIn:
+    def __init__(self, client):
+        self.client = client
+        self.writes = 0
+        self.bytes = 0
+        self._ack = bytearray(b"\x40\x02\0\0")
+        self._pos = 4
+        self._pending = False
+
+    def setblocking(self, flag):
+        pass
+
+    def write(self, buf, n=None):
+        n = len(buf) if n is None else n
+        self.writes += 1
+        self.bytes += n
+        if buf[0] & 0xF6 == 0x32:
+            # QoS 1 PUBLISH header: a PUBACK for the client's last id follows
+            self._pending = True
+        return n
+
+    def _next(self):
+        if self._pending and self._pos == 4:
+            pid = self.client.pid
+            self._ack[2] = pid >> 8 & 0xFF
+            self._ack[3] = pid & 0xFF
+            self._pos = 0
+            self._pending = False
+
+    def read(self, n):
+        self._next()
+        out = self._ack[self._pos : self._pos + n]
+        self._pos += len(out)
+        return bytes(out)
+
+    def readinto(self, buf, n=None):
+        self._next()
+        n = len(buf) if n is None else n
+        buf[:n] = self._ack[self._pos : self._pos + n]
+        self._pos += n
+        return n
+
+
+class LegacyClient(MQTTClient):
+    def publish(self, topic, msg, retain=False, qos=0):
+        pkt = bytearray(b"\x30\0\0\0")
+        pkt[0] |= qos << 1 | retain
+        sz = 2 + len(topic) + len(msg)
+        if qos > 0:
+            sz += 2
+        i = 1
+        while sz > 0x7F:
+            pkt[i] = (sz & 0x7F) | 0x80
+            sz >>= 7
+            i += 1
+        pkt[i] = sz
+        self.sock.write(pkt, i + 1)
+        self._send_str(topic)
+        if qos > 0:
+            self.pid += 1
+            pid = self.pid
+            struct.pack_into("!H", pkt, 0, pid)
+            self.sock.write(pkt, 2)
+        self.sock.write(msg)
+        if qos == 1:
+            while 1:
+                op = self.wait_msg()
+                if op == 0x40:
+                    assert self.sock.read(1) == b"\x02"
+                    rcv_pid = self.sock.read(2)
+                    if pid == rcv_pid[0] << 8 | rcv_pid[1]:
+                        return
+
+
+def run(name, cls, topic, qos):
+    c = cls("bench", "localhost")
+    c.sock = BrokerStandIn(c)
+    c.cb = lambda t, m: None
+    for _ in range(10):
+        c.publish(topic, PAYLOAD, qos=qos)
+    c.sock.writes = 0
+    mem_alloc = getattr(gc, "mem_alloc", None)
+    gc.collect()
+    if mem_alloc:
+        gc.disable()
+        h0 = mem_alloc()
+    t0 = _ticks()
+    for _ in range(N):
+        c.publish(topic, PAYLOAD, qos=qos)
+    dt = _diff(_ticks(), t0)
+    if mem_alloc:
+        heap = "%7.1f" % ((mem_alloc() - h0) / N)
+        gc.enable()
+    else:
+        heap = "    n/a"
+    print(
+        "%-22s qos%d %8d msg/s %5.1f writes/msg %s B heap/msg"
+        % (name, qos, N * 1000000 // max(dt, 1), c.sock.writes / N, heap)
+    )
+
+
+def main():
+    print("umqtt publish, %d msgs, %d byte payload (%s)" % (N, len(PAYLOAD), sys.platform))
+    for qos in (0, 1):
+        run("legacy", LegacyClient, b"sensors/env", qos)
+        run("buffered bytes topic", MQTTClient, b"sensors/env", qos)
+        run("buffered Topic", MQTTClient, Topic("sensors/env"), qos)
+
+
+main()
@@ -0,0 +1,265 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# umqtt.aio.MQTTClient against an in-memory broker stand-in.
+#
+#   python tests/umqtt/test_aio.py
+
+import os
+import sys
+import time
+
+if sys.implementation.name == "cpython":
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "m5stack", "libs")
+    )
+    # MicroPython's tick functions, for the modules under test
+    time.ticks_ms = lambda: int(time.monotonic() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+    sys.modules["utime"] = time
+    # umqtt/__init__ imports micropython.schedule
+    sys.modules["micropython"] = type(sys)("micropython")
+    sys.modules["micropython"].schedule = lambda f, arg: f(arg)
+import asyncio
+
+if sys.implementation.name == "cpython":
+    asyncio.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
+import io
+import unittest
+from umqtt import aio
+
+
+class BrokerStandIn:
+    """One connection: answers CONNECT and PINGREQ, keeps what the client
+    sent, and acknowledges QoS 1 publishes only while `ack` is set"""
+
+    def __init__(self, ack=True):
+        self.ack = ack
+        self.pong = True
+        self.packets = []
+        self.closed = False
+        self._out = bytearray()
+        self._data = asyncio.Event()
+
+    def publishes(self):
+        # (pid, dup, payload) of every PUBLISH
+        out = []
+        for op, body in self.packets:
+            if op & 0xF0 == 0x30:
+                i = 2 + (body[0] << 8 | body[1])
+                pid = body[i] << 8 | body[i + 1] if op & 0x06 else 0
+                out.append((pid, bool(op & 0x08), body[i + 2 if pid else i :]))
+        return out
+
+    def send(self, pkt):
+        self._out += pkt
+        self._data.set()
+
+    def puback(self, pid):
+        self.send(bytes((0x40, 2, pid >> 8, pid & 0xFF)))
+
+    def write(self, buf):
+        # the client writes whole packets
+        pkt = bytes(buf)
+        i = 1
+        while pkt[i] & 0x80:
+            i += 1
+        op, body = pkt[0], pkt[i + 1 :]
+        self.packets.append((op, body))
+        if op == 0x10:
+            self.send(b"\x20\x02\0\0")
+        elif op == 0xC0 and self.pong:
+            self.send(b"\xd0\0")
+        elif op & 0xF6 == 0x32 and self.ack:
+            self.puback(self.publishes()[-1][0])
+
+    async def drain(self):
+        if self.closed:
+            raise OSError(32)  # EPIPE
+
+    async def readexactly(self, n):
+        while len(self._out) < n:
+            if self.closed:
+                raise EOFError
+            self._data.clear()
+            await self._data.wait()
+        data = bytes(self._out[:n])
+        self._out = self._out[n:]
+        return data
+
+    def close(self):
+        self.closed = True
+        self._data.set()
+
+
+class Client(aio.MQTTClient):
+    """Each connection gets a new BrokerStandIn(ack=self.ack)"""
+
+    DELAY = 0
+    ack = True
+
+    def __init__(self, *args, **kw):
+        super().__init__("c", "broker.local", *args, **kw)
+        self.conns = []
+
+    async def _open(self, clean_session):
+        s = BrokerStandIn(self.ack)
+        self.conns.append(s)
+        s.write(self._connect_packet(clean_session))
+        await s.readexactly(4)
+        return s, 0
+
+
+async def until(cond):
+    while not cond():
+        await asyncio.sleep(0.001)
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+class Test(unittest.TestCase):
+    def test_window_fills(self):
+        async def main():
+            c = Client(window=4)
+            c.ack = False
+            await c.connect()
+            for i in range(10):
+                await c.publish("t", b"%d" % i, qos=1)
+            b = c.conns[0]
+            await until(lambda: len(b.publishes()) == 4)
+            await asyncio.sleep(0.01)
+            # the rest waits in the queue for a PUBACK
+            self.assertEqual(len(b.publishes()), 4)
+            st = c.stats()
+            self.assertEqual((st["inflight"], st["queued"]), (4, 6))
+            with self.assertRaises(asyncio.TimeoutError):
+                await c.drain(0.02)
+            await c.disconnect()
+
+        run(main())
+
+    def test_puback_frees_a_slot(self):
+        async def main():
+            c = Client(window=2)
+            c.ack = False
+            await c.connect()
+            pids = [await c.publish("t", b"%d" % i, qos=1) for i in range(5)]
+            b = c.conns[0]
+            await until(lambda: len(b.publishes()) == 2)
+            # an unknown id frees nothing
+            b.puback(999)
+            b.puback(pids[1])
+            await until(lambda: len(b.publishes()) == 3)
+            self.assertEqual([p[0] for p in b.publishes()], pids[:3])
+            self.assertEqual(c.stats()["acked"], 1)
+            b.ack = True
+            for pid in (pids[0], pids[2]):
+                b.puback(pid)
+            await c.drain(1)
+            self.assertEqual([p[2] for p in b.publishes()], [b"%d" % i for i in range(5)])
+            st = c.stats()
+            self.assertEqual((st["acked"], st["inflight"], st["queued"]), (5, 0, 0))
+            await c.disconnect()
+
+        run(main())
+
+    def test_retransmit_after_reconnect(self):
+        async def main():
+            c = Client()
+            c.ack = False
+            await c.connect()
+            pids = [await c.publish("t", b"%d" % i, qos=1) for i in range(3)]
+            await c.publish("t", b"q0")
+            first = c.conns[0]
+            await until(lambda: len(first.publishes()) == 4)
+            c.ack = True
+            first.close()
+            await c.drain(1)
+            self.assertEqual(len(c.conns), 2)
+            second = c.conns[1]
+            # the session is resumed, not cleaned
+            self.assertEqual(second.packets[0][0], 0x10)
+            self.assertFalse(second.packets[0][1][7] & 0x02)
+            # only the unacknowledged QoS 1 messages, flagged DUP, same ids
+            self.assertEqual(
+                second.publishes(), [(pid, True, b"%d" % i) for i, pid in enumerate(pids)]
+            )
+            st = c.stats()
+            self.assertEqual((st["reconnects"], st["retransmits"], st["acked"]), (1, 3, 3))
+            await c.disconnect()
+
+        run(main())
+
+    def test_failing_callback(self):
+        async def main():
+            c = Client()
+            got = []
+
+            def cb(topic, msg):
+                if msg == b"bad":
+                    raise ValueError(msg)
+                got.append((topic, msg))
+
+            c.set_callback(cb)
+            await c.connect()
+            b = c.conns[0]
+            for pid, msg in ((1, b"bad"), (2, b"good")):
+                b.send(bytes((0x32, 2 + 3 + 2 + len(msg), 0, 3)) + b"a/b" + bytes((0, pid)) + msg)
+            out = io.StringIO()
+            stdout, sys.stdout = sys.stdout, out
+            try:
+                await until(lambda: got)
+            finally:
+                sys.stdout = stdout
+            self.assertIn("mqtt callback", out.getvalue())
+            self.assertEqual(got, [(b"a/b", b"good")])
+            # both are acknowledged and the connection stays up
+            await until(lambda: len([p for p in b.packets if p[0] == 0x40]) == 2)
+            self.assertEqual([p[1] for p in b.packets if p[0] == 0x40], [b"\0\1", b"\0\2"])
+            self.assertTrue(c.isconnected())
+            self.assertEqual(len(c.conns), 1)
+            self.assertEqual(c.stats()["received"], 2)
+            await c.disconnect()
+
+        run(main())
+
+    def test_keepalive_and_housekeeping(self):
+        async def main():
+            tick, aio._TICK_MS = aio._TICK_MS, 5
+            try:
+                c = Client(keepalive=1, retry_ms=50)
+                await c.connect()
+                b = c.conns[0]
+                # a quiet link is pinged and the answer keeps it up
+                now = time.ticks_ms()
+                c._last_tx = c._last_rx = c._last_ping = time.ticks_add(now, -600)
+                await until(lambda: c._last_rx != time.ticks_add(now, -600))
+                self.assertEqual([p[0] for p in b.packets].count(0xC0), 1)
+                self.assertTrue(c.isconnected())
+                # a late PUBACK means the message goes out again
+                b.ack = False
+                pid = await c.publish("t", b"x", qos=1)
+                await until(lambda: len(b.publishes()) == 2)
+                self.assertEqual(b.publishes(), [(pid, False, b"x"), (pid, True, b"x")])
+                b.puback(pid)
+                await c.drain(1)
+                self.assertEqual(c.stats()["retransmits"], 1)
+                # a broker that stops answering is dropped and reconnected
+                b.pong = False
+                c._last_rx = time.ticks_add(time.ticks_ms(), -1600)
+                await until(lambda: len(c.conns) == 2 and c.isconnected())
+                self.assertTrue(b.closed)
+                self.assertEqual(c.stats()["reconnects"], 1)
+                await c.disconnect()
+            finally:
+                aio._TICK_MS = tick
+
+        run(main())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# umqtt.dispatch.TopicDispatcher filter matching.
+#
+#   python tests/umqtt/test_dispatch.py
+
+import os
+import sys
+import time
+
+if sys.implementation.name == "cpython":
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "m5stack", "libs")
+    )
+    sys.modules["utime"] = time
+    # umqtt/__init__ imports micropython.schedule
+    sys.modules["micropython"] = type(sys)("micropython")
+    sys.modules["micropython"].schedule = lambda f, arg: f(arg)
+import unittest
+from umqtt.dispatch import TopicDispatcher
+
+
+class Test(unittest.TestCase):
+    def matches(self, pattern, topic):
+        d = TopicDispatcher()
+        d.add(pattern, print)
+        return len(d.match(topic)) == 1
+
+    def test_wildcards(self):
+        cases = [
+            ("a/b/c", "a/b/c", True),
+            ("a/b/c", "a/b", False),
+            ("a/b", "a/b/c", False),
+            ("a/+/c", "a/x/c", True),
+            ("a/+/c", "a/x/y/c", False),
+            ("a/+", "a/", True),  # an empty level is a level
+            ("+/+", "a/b", True),
+            ("+", "a/b", False),
+            ("a/#", "a", True),  # "#" includes the parent level
+            ("a/#", "a/b/c/d", True),
+            ("a/#", "b/a", False),
+            ("#", "a/b", True),
+            ("+/b/#", "x/b", True),
+            ("/+", "/a", True),
+            # "$" topics are not matched by a leading wildcard
+            ("#", "$SYS/uptime", False),
+            ("+/uptime", "$SYS/uptime", False),
+            ("$SYS/#", "$SYS/uptime", True),
+            ("$SYS/+", "$SYS/uptime", True),
+        ]
+        for pattern, topic, expected in cases:
+            self.assertEqual(self.matches(pattern, topic), expected, (pattern, topic))
+            self.assertEqual(self.matches(pattern, topic.encode()), expected, (pattern, topic))
+
+    def test_invalid_filters(self):
+        d = TopicDispatcher()
+        for pattern in ("a/#/b", "a/b#", "a+/b", "a/+b"):
+            with self.assertRaises(ValueError):
+                d.add(pattern, print)
+        self.assertEqual(d.patterns(), [])
+
+    def test_dispatch_and_stats(self):
+        got = []
+        d = TopicDispatcher()
+        temp = lambda arg: got.append(("temp", arg[0]))
+        anything = lambda arg: got.append(("any", arg[0]))
+        d.add("home/+/temp", temp)
+        d.add("home/#", anything)
+        d.add("home/#", anything)  # a repeated pair is ignored
+        self.assertEqual(d.dispatch(b"home/kitchen/temp", b"21.5"), 2)
+        self.assertEqual(
+            sorted(got), [("any", b"home/kitchen/temp"), ("temp", b"home/kitchen/temp")]
+        )
+        self.assertEqual(d.dispatch("garden/temp", b"9"), 0)
+        self.assertEqual((d.messages, d.unmatched), (2, 1))
+        self.assertEqual(d.stats()["home/#"], [(anything, 1, 0)])
+
+        def broken(arg):
+            raise RuntimeError
+
+        d.add("home/kitchen/temp", broken)
+        with self.assertRaises(RuntimeError):
+            d.dispatch("home/kitchen/temp", b"22")
+        self.assertEqual(d.stats()["home/kitchen/temp"], [(broken, 1, 1)])
+
+    def test_remove_prunes(self):
+        d = TopicDispatcher()
+        a = lambda arg: None
+        b = lambda arg: None
+        d.add("x/y/z", a)
+        d.add("x/y/z", b)
+        d.add("x/#", a)
+        d.remove("x/y/z", a)
+        # b for the filter itself, a through "x/#"
+        handlers = [e[0] for e in d.match("x/y/z")]
+        self.assertEqual(len(handlers), 2)
+        self.assertIn(a, handlers)
+        self.assertIn(b, handlers)
+        d.remove("x/y/z")
+        self.assertNotIn("x/y/z", d)
+        d.remove("x/#", a)
+        self.assertEqual(d.patterns(), [])
+        # nothing left behind in the trie
+        self.assertEqual(d._root[0], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
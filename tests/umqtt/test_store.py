@@ -0,0 +1,156 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# umqtt.store.RingLog and the store-and-forward path of umqtt.robust.
+#
+#   python tests/umqtt/test_store.py
+
+import os
+import sys
+import time
+
+if sys.implementation.name == "cpython":
+    sys.path.append(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "m5stack", "libs")
+    )
+    # MicroPython's tick functions, for the modules under test
+    time.ticks_ms = lambda: int(time.monotonic() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+    sys.modules["utime"] = time
+    # umqtt/__init__ imports micropython.schedule
+    sys.modules["micropython"] = type(sys)("micropython")
+    sys.modules["micropython"].schedule = lambda f, arg: f(arg)
+import shutil
+import tempfile
+import unittest
+from umqtt import robust
+from umqtt.simple import MQTTException
+from umqtt.store import RingLog
+
+
+def drain(log):
+    out = []
+    while True:
+        rec = log.peek()
+        if rec is None:
+            return out
+        out.append(bytes(rec[2]))
+        log.ack(rec[0])
+
+
+class BrokerStandIn:
+    """Takes QoS 0 PUBLISH packets and keeps their payloads"""
+
+    def __init__(self):
+        self.msgs = []
+        self.closed = False
+
+    def write(self, buf, n=None):
+        n = len(buf) if n is None else n
+        pkt = bytes(buf[:n])
+        i = 1
+        while pkt[i] & 0x80:
+            i += 1
+        tl = pkt[i + 1] << 8 | pkt[i + 2]
+        self.msgs.append(pkt[i + 3 + tl :])
+        return n
+
+    def close(self):
+        self.closed = True
+
+
+class Client(robust.MQTTClient):
+    """Connects to a BrokerStandIn; the first `refuse` attempts get CONNACK 5"""
+
+    refuse = 0
+
+    def connect(self, clean_session=True):
+        self.sock = BrokerStandIn()
+        if self.refuse:
+            self.refuse -= 1
+            raise MQTTException(5)
+        self._online = True
+        return 0
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = self.dir + "/log"
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_order_and_reopen(self):
+        log = RingLog(self.path, segments=3, segment_size=200, commit_every=4)
+        for i in range(10):
+            log.append("t", b"%d" % i, qos=1)
+        self.assertEqual(len(log), 10)
+        got = []
+        for _ in range(5):
+            rec = log.peek()
+            got.append(bytes(rec[2]))
+            log.ack(rec[0])
+        log.close()
+        log = RingLog(self.path, segments=3, segment_size=200, commit_every=4)
+        self.assertEqual(len(log), 5)
+        got += drain(log)
+        self.assertEqual(got, [b"%d" % i for i in range(10)])
+        # sequence numbers carry on after a reopen
+        seq = log.seq
+        log.append("t", b"x")
+        self.assertEqual(log.peek()[0], seq + 1)
+        log.close()
+
+    def test_wrap_drops_oldest(self):
+        log = RingLog(self.path, segments=3, segment_size=200)
+        for i in range(100):
+            log.append("topic", b"m%d" % i)
+        self.assertGreater(log.dropped, 0)
+        self.assertEqual(len(log) + log.dropped, 100)
+        got = drain(log)
+        # what is left is the newest, still in order
+        self.assertEqual(got, [b"m%d" % i for i in range(100 - len(got), 100)])
+        self.assertLessEqual(len([n for n in os.listdir(self.path) if n.endswith(".log")]), 3)
+        log.close()
+
+    def test_torn_tail(self):
+        log = RingLog(self.path, segments=3, segment_size=200)
+        for i in range(3):
+            log.append("t", b"%d" % i)
+        log.close()
+        segs = sorted(int(n[:-4]) for n in os.listdir(self.path) if n.endswith(".log"))
+        with open("%s/%d.log" % (self.path, segs[-1]), "ab") as f:
+            f.write(b"\xa5\x00\x01")  # a reset in the middle of a header
+        log = RingLog(self.path, segments=3, segment_size=200)
+        self.assertEqual(drain(log), [b"0", b"1", b"2"])
+        log.append("t", b"3")
+        self.assertEqual(drain(log), [b"3"])
+        log.close()
+
+    def test_refused_connect_keeps_records(self):
+        c = Client("c", "broker.local")
+        c.DELAY = 60
+        c.refuse = 3
+        c.set_store(RingLog(self.path), rate=1000, batch=50)
+        # the first publish tries to connect, the rest wait for DELAY
+        for i in range(5):
+            c.publish("t", b"%d" % i)
+        while True:
+            # the refused connection is closed, nothing left the store
+            self.assertTrue(c.sock.closed)
+            self.assertEqual(len(c.store), 5)
+            c._next_try = time.ticks_ms()
+            if not c.refuse:
+                break
+            self.assertEqual(c.service(), 0)
+        self.assertEqual(c.service(), 5)
+        self.assertEqual(c.sock.msgs, [b"%d" % i for i in range(5)])
+        self.assertEqual(len(c.store), 0)
+        c.store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
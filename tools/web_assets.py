@@ -0,0 +1,96 @@
+# SPDX-FileCopyrightText: 2024 M5Stack Technology CO LTD
+#
+# SPDX-License-Identifier: MIT
+
+# Precompress the web pages served by the on-device captive portal.
+#
+# For every .html/.js/.css file under the given directories this writes, next
+# to the source:
+#   <name>.gz    minified and gzip-compressed copy (deterministic, mtime=0)
+#   <name>.etag  quoted ETag of the .gz, e.g. "3f2a9c01d4e5b6a7"
+#
+# libs/portal.py serves <name>.gz with Content-Encoding: gzip when the client
+# accepts it and answers If-None-Match with 304 using <name>.etag.
+#
+# usage: python3 web_assets.py [--clean] <dir> [<dir> ...]
+
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import sys
+
+EXTENSIONS = (".html", ".htm", ".js", ".css")
+
+_HTML_COMMENT = re.compile(rb"<!--(?!\[if).*?-->", re.S)
+_CSS_COMMENT = re.compile(rb"/\*.*?\*/", re.S)
+_STYLE = re.compile(rb"(<style\b[^>]*>)(.*?)(</style>)", re.S | re.I)
+# blocks whose content must be kept verbatim
+_VERBATIM = re.compile(rb"(<(pre|textarea)\b.*?</\2>)", re.S | re.I)
+
+
+def _strip_lines(text: bytes) -> bytes:
+    # Only indentation, trailing blanks and empty lines are dropped. Newlines
+    # are kept so JavaScript automatic semicolon insertion still works.
+    return b"\n".join(ln.strip() for ln in text.splitlines() if ln.strip())
+
+
+def minify(name: str, data: bytes) -> bytes:
+    ext = os.path.splitext(name)[1].lower()
+    if ext == ".css":
+        return _strip_lines(_CSS_COMMENT.sub(b"", data))
+    if ext == ".js":
+        return _strip_lines(data)
+    data = _STYLE.sub(lambda m: m.group(1) + _CSS_COMMENT.sub(b"", m.group(2)) + m.group(3), data)
+    out = []
+    pos = 0
+    for m in _VERBATIM.finditer(data):
+        out.append(_strip_lines(_HTML_COMMENT.sub(b"", data[pos : m.start()])))
+        out.append(m.group(1))
+        pos = m.end()
+    out.append(_strip_lines(_HTML_COMMENT.sub(b"", data[pos:])))
+    return b"\n".join(x for x in out if x)
+
+
+def build(path: str) -> tuple:
+    with open(path, "rb") as f:
+        src = f.read()
+    gz = gzip.compress(minify(path, src), compresslevel=9, mtime=0)
+    etag = '"{}"'.format(hashlib.sha1(gz).hexdigest()[:16])
+    with open(path + ".gz", "wb") as f:
+        f.write(gz)
+    with open(path + ".etag", "w") as f:
+        f.write(etag)
+    return len(src), len(gz), etag
+
+
+def walk(dirs):
+    for top in dirs:
+        for root, _, files in os.walk(top):
+            for name in sorted(files):
+                if name.lower().endswith(EXTENSIONS):
+                    yield os.path.join(root, name)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Precompress captive portal web assets")
+    parser.add_argument("dirs", nargs="+", help="directories to scan")
+    parser.add_argument("--clean", action="store_true", help="remove generated files")
+    args = parser.parse_args(argv)
+
+    for path in walk(args.dirs):
+        if args.clean:
+            for ext in (".gz", ".etag"):
+                try:
+                    os.remove(path + ext)
+                except FileNotFoundError:
+                    pass
+            continue
+        raw, packed, etag = build(path)
+        print("{}: {} -> {} bytes ({}%) {}".format(path, raw, packed, packed * 100 // raw, etag))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())